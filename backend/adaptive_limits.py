@@ -0,0 +1,115 @@
+import time
+import logging
+from typing import Dict, Any, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveRateLimit:
+    """
+    Per-minute request limit for one provider key, learned AIMD style
+    
+    - 429 / quota error: the limit is multiplied by decrease_factor, at most
+      once per decrease_cooldown so the 429s of calls already in flight
+      count as one signal
+    - success: once increase_interval has passed since the last change, the
+      limit grows by increase_step, up to max_factor times the configured limit
+    
+    The configured limit is registered by the rate limiter; keys without
+    one (uncapped) are not adapted.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        decrease_factor: float = 0.5,
+        increase_step: float = 1.0,
+        increase_interval: float = 60.0,
+        decrease_cooldown: float = 10.0,
+        min_limit: float = 1.0,
+        max_factor: float = 1.0
+    ):
+        self.name = name
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.increase_interval = increase_interval
+        self.decrease_cooldown = decrease_cooldown
+        self.min_limit = min_limit
+        self.max_factor = max_factor
+        
+        self.configured: Optional[float] = None
+        self.learned: Optional[float] = None
+        self.last_change_at = 0.0
+        self.last_decrease_at = 0.0
+        
+        self.decreases = 0
+        self.increases = 0
+    
+    def configure(self, configured_limit: float):
+        """Register the configured limit the learned one starts from"""
+        if self.configured != configured_limit:
+            self.configured = configured_limit
+            self.learned = configured_limit
+    
+    @property
+    def limit(self) -> Optional[float]:
+        return self.learned
+    
+    def record_rate_limited(self):
+        """Multiplicative decrease after a 429 or quota error"""
+        if self.learned is None:
+            return
+        
+        current_time = time.time()
+        if current_time - self.last_decrease_at < self.decrease_cooldown:
+            return
+        
+        previous = self.learned
+        self.learned = max(self.min_limit, self.learned * self.decrease_factor)
+        self.last_decrease_at = current_time
+        self.last_change_at = current_time
+        self.decreases += 1
+        logger.warning(f"📉 {self.name} rate limited - learned limit {previous:.1f} -> {self.learned:.1f}/min")
+    
+    def record_success(self):
+        """Additive increase, once per increase_interval of successful calls"""
+        if self.learned is None:
+            return
+        
+        ceiling = self.configured * self.max_factor
+        current_time = time.time()
+        if self.learned >= ceiling or current_time - self.last_change_at < self.increase_interval:
+            return
+        
+        self.learned = min(ceiling, self.learned + self.increase_step)
+        self.last_change_at = current_time
+        self.increases += 1
+        logger.info(f"📈 {self.name} learned limit raised to {self.learned:.1f}/min")
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get learned limit state for status endpoints"""
+        return {
+            "configured_rate_limit": self.configured,
+            "learned_rate_limit": round(self.learned, 2) if self.learned is not None else None,
+            "decreases": self.decreases,
+            "increases": self.increases
+        }
+
+# Global registry (one learned limit per provider key name)
+adaptive_limits: Dict[str, AdaptiveRateLimit] = {}
+
+def get_adaptive_limit(provider_name: str) -> AdaptiveRateLimit:
+    """Get the learned limit of a provider, creating it from Config on first use"""
+    adaptive = adaptive_limits.get(provider_name)
+    if adaptive is None:
+        adaptive = AdaptiveRateLimit(
+            provider_name,
+            decrease_factor=Config.ADAPTIVE_LIMIT_DECREASE_FACTOR,
+            increase_step=Config.ADAPTIVE_LIMIT_INCREASE_STEP,
+            increase_interval=Config.ADAPTIVE_LIMIT_INCREASE_INTERVAL_SECONDS,
+            decrease_cooldown=Config.ADAPTIVE_LIMIT_DECREASE_COOLDOWN_SECONDS,
+            min_limit=Config.ADAPTIVE_LIMIT_MIN_PER_MINUTE,
+            max_factor=Config.ADAPTIVE_LIMIT_MAX_FACTOR
+        )
+        adaptive_limits[provider_name] = adaptive
+    return adaptive
@@ -1,13 +1,115 @@
 import google.generativeai as genai
-import requests
+import google.ai.generativelanguage as glm
+import httpx
+import asyncio
+import functools
+import json
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable
+from config import Config
+from circuit_breaker import get_circuit_breaker
+from adaptive_limits import get_adaptive_limit
+from mock_provider import MockProfile, MockOutcome, get_recording_store
+from model_router import estimate_tokens
+from call_ledger import record_call
+from rate_limiter import reconcile_token_usage
 
 logger = logging.getLogger(__name__)
 
+# Provider types served through the OpenAI-style chat completions API
+CHAT_COMPLETIONS_PROVIDERS = {"groq", "openai_compatible"}
+
+# HTTP statuses worth retrying (rate limits and transient server errors)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class AIProviderError(Exception):
+    """A provider call failed; carries what callers need to decide on a retry"""
+    
+    def __init__(
+        self, 
+        provider_name: str, 
+        message: str, 
+        status_code: Optional[int] = None, 
+        retry_after: Optional[float] = None,
+        retryable: Optional[bool] = None
+    ):
+        super().__init__(f"{provider_name}: {message}")
+        self.provider_name = provider_name
+        self.status_code = status_code
+        self.retry_after = retry_after
+        
+        # Network errors and timeouts (no status) are retryable by default
+        if retryable is None:
+            retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+        self.retryable = retryable
+    
+    @property
+    def is_rate_limited(self) -> bool:
+        return self.status_code == 429
+    
+    @property
+    def is_availability_failure(self) -> bool:
+        """5xx, timeouts and connection errors - the provider itself is unhealthy (counted by the circuit breaker)"""
+        return self.retryable and not self.is_rate_limited
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+def gemini_error_to_provider_error(provider_name: str, error: Exception) -> AIProviderError:
+    """Map a google.api_core error to AIProviderError, keeping the status and retry delay"""
+    status_code = getattr(error, "code", None)
+    if not isinstance(status_code, int):
+        status_code = None
+    
+    # Quota errors carry a RetryInfo detail with the suggested delay
+    retry_after = None
+    for detail in getattr(error, "details", None) or []:
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None:
+            retry_after = retry_delay.seconds + retry_delay.nanos / 1e9
+            break
+    
+    return AIProviderError(provider_name, str(error), status_code=status_code, retry_after=retry_after)
+
+def read_gemini_usage(response, usage: Dict[str, int]):
+    """Copy token counts from a Gemini response's usage metadata into usage"""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata and metadata.prompt_token_count:
+        usage["prompt_tokens"] = metadata.prompt_token_count
+        usage["completion_tokens"] = metadata.candidates_token_count
+
+def read_chat_completions_usage(payload: Dict[str, Any], usage: Dict[str, int]):
+    """Copy token counts from a chat completions response or stream chunk into usage"""
+    reported = payload.get("usage") or (payload.get("x_groq") or {}).get("usage")
+    if reported and reported.get("prompt_tokens"):
+        usage["prompt_tokens"] = reported["prompt_tokens"]
+        usage["completion_tokens"] = reported.get("completion_tokens", 0)
+
+def feed_chunks(text: str, on_chunk: Optional[Callable[[str], bool]]) -> str:
+    """Pass a complete response to on_chunk line by line, as if streamed; returns the text consumed"""
+    if not on_chunk:
+        return text
+    
+    consumed = []
+    for line in text.splitlines(keepends=True):
+        consumed.append(line)
+        if on_chunk(line):
+            break
+    return "".join(consumed).strip()
+
 class AIClientWrapper:
     """
-    Unified wrapper for multiple AI providers (Gemini, Groq, Hugging Face)
+    Unified wrapper for multiple AI providers (Gemini, Groq, OpenAI-compatible, Hugging Face)
     Provides consistent interface regardless of underlying provider
     """
     
@@ -22,100 +124,476 @@ class AIClientWrapper:
         self.api_key = provider_config["api_key"]
         self.model = provider_config["model"]
         self.name = provider_config["name"]
+        self.max_concurrency = provider_config.get("max_concurrency", Config.GEMINI_MAX_CONCURRENCY_PER_KEY)
+        
+        # Latencies of recent successful calls (seconds), used for hedging delays
+        self.latencies = deque(maxlen=Config.LATENCY_WINDOW_SIZE)
+        
+        # Prompt / completion tokens of successful calls (provider-reported where available)
+        self.token_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_calls": 0, "last_prompt_tokens": 0}
+        
+        # Error-rate / latency tracking that can take this provider out of rotation
+        self.circuit_breaker = get_circuit_breaker(self.name)
+        
+        # Per-minute limit learned from 429s (used by the rate limiter)
+        self.adaptive_limit = get_adaptive_limit(self.name)
         
         # Initialize provider-specific clients
         if self.provider == "gemini":
-            genai.configure(api_key=self.api_key)
-            self.client = genai.GenerativeModel(self.model)
+            self.client = create_gemini_model(self.name, self.api_key, self.model)
+            # Models routed to on this key, sharing its service client
+            self.gemini_models = {self.model: self.client}
         elif self.provider == "groq":
             self.base_url = "https://api.groq.com/openai/v1/chat/completions"
             self.headers = {
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
             }
+        elif self.provider == "openai_compatible":
+            # Any OpenAI-style chat completions server (vLLM, llama.cpp, Ollama, ...)
+            self.base_url = f"{provider_config['base_url'].rstrip('/')}/chat/completions"
+            self.headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
         elif self.provider == "huggingface":
             self.base_url = f"https://api-inference.huggingface.co/models/{self.model}"
             self.headers = {
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
             }
+        elif self.provider == "mock":
+            self.mock_profile = MockProfile.from_config(provider_config)
         
         logger.info(f"AI client initialized for {self.name} ({self.provider})")
     
-    async def generate_content(self, prompt: str) -> Optional[str]:
+    async def generate_content(self, prompt: str, purpose: str = "generate") -> Optional[str]:
         """
         Generate content using the configured provider
         
         Args:
             prompt: The input prompt
+            purpose: What the call is for, as recorded in the call ledger
             
         Returns:
             Generated text or None if failed
         """
         try:
-            if self.provider == "gemini":
-                return await self._generate_gemini(prompt)
-            elif self.provider == "groq":
-                return await self._generate_groq(prompt)
-            elif self.provider == "huggingface":
-                return await self._generate_huggingface(prompt)
-            else:
-                logger.error(f"Unsupported provider: {self.provider}")
-                return None
-                
+            return await self.generate(prompt, purpose=purpose)
         except Exception as e:
             logger.error(f"Error generating content with {self.name}: {e}")
             return None
     
-    async def _generate_gemini(self, prompt: str) -> Optional[str]:
-        """Generate content using Gemini"""
+    async def generate(
+        self, 
+        prompt: str, 
+        on_chunk: Optional[Callable[[str], bool]] = None,
+        json_schema: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        purpose: str = "generate",
+        fallback: bool = False,
+        reserved_tokens: int = 0
+    ) -> str:
+        """
+        Generate content, raising AIProviderError on failure
+        
+        Unlike generate_content, the error carries the HTTP status and any
+        Retry-After hint so callers can decide whether and where to retry.
+        
+        With on_chunk the response is streamed: on_chunk is called with each
+        chunk of text and the stream is closed early once it returns True.
+        Providers without streaming ignore on_chunk.
+        
+        With json_schema the provider is asked for JSON output (Gemini
+        response schema, chat completions JSON mode); it is not combined
+        with on_chunk.
+        
+        model overrides the configured model for this call (model routing).
+        
+        In record mode responses are saved to the recording store; in replay
+        mode they are served from it and the provider is never called.
+        
+        Every call is written to the call ledger with its purpose; fallback
+        marks calls made because another call failed or was slow (retries,
+        failovers, hedges).
+        
+        reserved_tokens is what the call's rate-limiter slot reserved; the
+        key's token budget is corrected by the difference to actual usage.
+        """
+        recording_store = get_recording_store()
+        json_mode = json_schema is not None
+        usage: Dict[str, int] = {}
+        start_time = time.perf_counter()
+        
         try:
-            response = self.client.generate_content(prompt)
-            if response.text and response.text.strip():
-                logger.info(f"Gemini ({self.name}) generated response: {len(response.text)} chars")
-                return response.text.strip()
+            if recording_store.mode == "replay":
+                result = await self._replay(prompt, json_mode, on_chunk)
+            elif self.provider == "mock":
+                result = await self._generate_mock(prompt, json_mode, on_chunk)
+            elif self.provider == "gemini" and on_chunk:
+                result = await self._stream_gemini(prompt, on_chunk, model, usage)
+            elif self.provider == "gemini":
+                result = await self._generate_gemini(prompt, json_schema, model, usage)
+            elif self.provider in CHAT_COMPLETIONS_PROVIDERS and on_chunk:
+                result = await self._stream_chat_completions(prompt, on_chunk, model, usage)
+            elif self.provider in CHAT_COMPLETIONS_PROVIDERS:
+                result = await self._generate_chat_completions(prompt, json_schema, model, usage)
+            else:
+                raise AIProviderError(self.name, f"Unsupported provider: {self.provider}", retryable=False)
+        except asyncio.CancelledError:
+            # e.g. the losing call of a hedged pair; the provider may still have spent quota on it
+            record_call(
+                provider=self.provider, key_name=self.name, purpose=purpose, model=model or self.model,
+                outcome="cancelled", latency=time.perf_counter() - start_time,
+                prompt_tokens=estimate_tokens(prompt), fallback=fallback
+            )
+            self.circuit_breaker.record_ignored()
+            reconcile_token_usage(self.name, reserved_tokens, estimate_tokens(prompt))
+            raise
+        except Exception as e:
+            latency = time.perf_counter() - start_time
+            error = e if isinstance(e, AIProviderError) else AIProviderError(self.name, str(e))
+            if error.is_availability_failure:
+                self.circuit_breaker.record_failure(latency)
             else:
-                logger.warning(f"Gemini ({self.name}) returned empty response")
-                return None
+                # 429s go to the learned limit and Retry-After; content errors say nothing about availability
+                self.circuit_breaker.record_ignored()
+            if error.is_rate_limited:
+                self.adaptive_limit.record_rate_limited()
+            record_call(
+                provider=self.provider, key_name=self.name, purpose=purpose, model=model or self.model,
+                outcome="rate_limited" if error.is_rate_limited else "error", status_code=error.status_code,
+                latency=latency, prompt_tokens=estimate_tokens(prompt), fallback=fallback
+            )
+            reconcile_token_usage(self.name, reserved_tokens, 0)
+            if error is e:
+                raise
+            raise error from e
+        
+        latency = time.perf_counter() - start_time
+        self.latencies.append(latency)
+        self.circuit_breaker.record_success(latency)
+        self.adaptive_limit.record_success()
+        prompt_tokens = self._record_usage(prompt, usage)
+        record_call(
+            provider=self.provider, key_name=self.name, purpose=purpose, model=model or self.model,
+            outcome="ok", latency=latency, prompt_tokens=prompt_tokens,
+            response_tokens=usage.get("completion_tokens", 0), fallback=fallback
+        )
+        reconcile_token_usage(
+            self.name, reserved_tokens, prompt_tokens + usage.get("completion_tokens", estimate_tokens(result))
+        )
+        
+        if recording_store.mode == "record":
+            recording_store.record(self.name, prompt, json_mode, result, latency)
+        return result
+    
+    def _record_usage(self, prompt: str, usage: Dict[str, int]) -> int:
+        """Record the tokens of a successful call, estimating the prompt when the provider did not report it"""
+        prompt_tokens = usage.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+            self.token_usage["estimated_calls"] += 1
+        
+        self.token_usage["calls"] += 1
+        self.token_usage["prompt_tokens"] += prompt_tokens
+        self.token_usage["completion_tokens"] += usage.get("completion_tokens", 0)
+        self.token_usage["last_prompt_tokens"] = prompt_tokens
+        logger.debug(f"{self.name} call used {prompt_tokens} prompt tokens")
+        return prompt_tokens
+    
+    def get_token_usage(self) -> Dict[str, Any]:
+        """Get token counts of successful calls"""
+        calls = self.token_usage["calls"]
+        return {
+            **self.token_usage,
+            "average_prompt_tokens": round(self.token_usage["prompt_tokens"] / calls) if calls else 0
+        }
+    
+    async def _generate_mock(self, prompt: str, json_mode: bool, on_chunk: Optional[Callable[[str], bool]]) -> str:
+        """Generate a canned response with the mock profile's latency and injected failures"""
+        latency, outcome = self.mock_profile.sample()
+        await asyncio.sleep(latency)
+        
+        if outcome == MockOutcome.RATE_LIMITED:
+            raise AIProviderError(
+                self.name, "Mock rate limit", 
+                status_code=429, 
+                retry_after=self.mock_profile.retry_after_seconds
+            )
+        if outcome == MockOutcome.ERROR:
+            raise AIProviderError(self.name, "Mock server error", status_code=503)
+        
+        return feed_chunks(self.mock_profile.render(prompt, json_mode), on_chunk)
+    
+    async def _replay(self, prompt: str, json_mode: bool, on_chunk: Optional[Callable[[str], bool]]) -> str:
+        """Serve a recorded response for the prompt"""
+        recording_store = get_recording_store()
+        entry = recording_store.lookup(prompt, json_mode)
+        if entry is None:
+            raise AIProviderError(self.name, "No recorded response for prompt", retryable=False)
+        
+        if recording_store.replay_latency:
+            await asyncio.sleep(entry["latency_seconds"])
+        
+        return feed_chunks(entry["response"], on_chunk)
+    
+    def _get_gemini_model(self, model: Optional[str] = None):
+        """Get the Gemini model object for this key, creating routed models on first use"""
+        model = model or self.model
+        gemini_model = self.gemini_models.get(model)
+        if gemini_model is None:
+            gemini_model = create_gemini_model(self.name, self.api_key, model)
+            self.gemini_models[model] = gemini_model
+        return gemini_model
+    
+    async def _generate_gemini(
+        self, 
+        prompt: str, 
+        json_schema: Optional[Dict[str, Any]] = None, 
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """Generate content using Gemini"""
+        generation_config = None
+        if json_schema is not None:
+            generation_config = {
+                "response_mime_type": "application/json",
+                "response_schema": json_schema
+            }
+        
+        try:
+            response = await run_gemini_call(
+                self.name, self._get_gemini_model(model).generate_content, prompt,
+                generation_config=generation_config,
+                max_concurrency=self.max_concurrency
+            )
         except Exception as e:
             logger.error(f"Gemini ({self.name}) generation failed: {e}")
-            return None
+            raise gemini_error_to_provider_error(self.name, e) from e
+        
+        try:
+            text = response.text
+        except ValueError as e:
+            # Blocked or candidate-less responses have no text
+            raise AIProviderError(self.name, f"Gemini returned no text: {e}", retryable=False) from e
+        
+        if usage is not None:
+            read_gemini_usage(response, usage)
+        
+        if text and text.strip():
+            logger.info(f"Gemini ({self.name}) generated response: {len(text)} chars")
+            return text.strip()
+        
+        logger.warning(f"Gemini ({self.name}) returned empty response")
+        raise AIProviderError(self.name, "Gemini returned empty response", retryable=False)
     
-    async def _generate_groq(self, prompt: str) -> Optional[str]:
-        """Generate content using Groq"""
+    async def _stream_gemini(
+        self, 
+        prompt: str, 
+        on_chunk: Callable[[str], bool], 
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """
+        Stream content from Gemini, stopping once on_chunk returns True
+        
+        If the call is cancelled (e.g. the losing call of a hedged pair) the
+        stream is cancelled too, so the executor thread stops reading and
+        frees the key's concurrency slot instead of draining the response.
+        """
+        cancel_event = threading.Event()
+        stream_holder: Dict[str, Any] = {}
         try:
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
+            text, stopped_early = await run_gemini_call(
+                self.name, self._stream_gemini_sync, self._get_gemini_model(model), prompt, on_chunk,
+                {} if usage is None else usage, cancel_event, stream_holder,
+                max_concurrency=self.max_concurrency
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            cancel_gemini_stream(stream_holder.get("response"))
+            raise
+        except Exception as e:
+            logger.error(f"Gemini ({self.name}) streaming failed: {e}")
+            raise gemini_error_to_provider_error(self.name, e) from e
+        
+        if text and text.strip():
+            logger.info(f"Gemini ({self.name}) streamed response: {len(text)} chars"
+                       f"{' (stopped early)' if stopped_early else ''}")
+            return text.strip()
+        
+        logger.warning(f"Gemini ({self.name}) returned empty stream")
+        raise AIProviderError(self.name, "Gemini returned empty response", retryable=False)
+    
+    def _stream_gemini_sync(
+        self,
+        gemini_model,
+        prompt: str,
+        on_chunk: Callable[[str], bool],
+        usage: Dict[str, int],
+        cancel_event: threading.Event,
+        stream_holder: Dict[str, Any]
+    ):
+        """
+        Iterate a Gemini stream (blocking - runs on the Gemini executor)
+        
+        The response is published in stream_holder so the caller can cancel
+        it from the event loop; cancel_event is checked between chunks.
+        """
+        response = gemini_model.generate_content(prompt, stream=True)
+        stream_holder["response"] = response
+        parts = []
+        
+        if cancel_event.is_set():
+            cancel_gemini_stream(response)
+            return "", True
+        
+        try:
+            for chunk in response:
+                if cancel_event.is_set():
+                    cancel_gemini_stream(response)
+                    return "".join(parts), True
+                
+                # Every chunk carries the prompt token count
+                read_gemini_usage(chunk, usage)
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text (e.g. safety-only) carry nothing to parse
+                    continue
+                
+                parts.append(text)
+                if on_chunk(text):
+                    # Cancel the underlying gRPC stream so no more tokens are generated
+                    cancel_gemini_stream(response)
+                    return "".join(parts), True
+        except Exception:
+            # A stream cancelled from the event loop ends with an error; nobody is waiting for it
+            if cancel_event.is_set():
+                return "".join(parts), True
+            raise
+        
+        return "".join(parts), False
+    
+    def _chat_completions_request(self, prompt: str, model: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+        """Build a chat completions request body (Groq and OpenAI-compatible servers)"""
+        data = {
+            "model": model or self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+        data.update(extra)
+        return data
+    
+    async def _generate_chat_completions(
+        self, 
+        prompt: str, 
+        json_schema: Optional[Dict[str, Any]] = None, 
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """Generate content using a chat completions API (Groq, OpenAI-compatible)"""
+        data = self._chat_completions_request(prompt, model)
+        if json_schema is not None:
+            # JSON mode guarantees valid JSON; the prompt describes the shape
+            data["response_format"] = {"type": "json_object"}
+        
+        try:
+            response = await get_http_client().post(
                 self.base_url,
                 headers=self.headers,
-                json=data,
-                timeout=30
+                json=data
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                if content and content.strip():
-                    logger.info(f"Groq ({self.name}) generated response: {len(content)} chars")
-                    return content.strip()
-                else:
-                    logger.warning(f"Groq ({self.name}) returned empty content")
-                    return None
-            else:
-                logger.error(f"Groq ({self.name}) API error: {response.status_code} - {response.text}")
-                return None
+        except httpx.HTTPError as e:
+            logger.error(f"{self.provider} ({self.name}) generation failed: {e}")
+            raise AIProviderError(self.name, f"{self.provider} request failed: {e!r}") from e
+        
+        if response.status_code != 200:
+            logger.error(f"{self.provider} ({self.name}) API error: {response.status_code} - {response.text}")
+            raise AIProviderError(
+                self.name,
+                f"{self.provider} API error: {response.status_code}",
+                status_code=response.status_code,
+                retry_after=parse_retry_after(response.headers.get("retry-after"))
+            )
+        
+        result = response.json()
+        if usage is not None:
+            read_chat_completions_usage(result, usage)
+        content = result["choices"][0]["message"]["content"]
+        if content and content.strip():
+            logger.info(f"{self.provider} ({self.name}) generated response: {len(content)} chars")
+            return content.strip()
+        
+        logger.warning(f"{self.provider} ({self.name}) returned empty content")
+        raise AIProviderError(self.name, f"{self.provider} returned empty content", retryable=False)
+    
+    async def _stream_chat_completions(
+        self, 
+        prompt: str, 
+        on_chunk: Callable[[str], bool], 
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """
+        Stream content from a chat completions API (server-sent events), stopping once on_chunk returns True
+        
+        Token usage is only reported in the final chunk, so it is missing when the stream is stopped early.
+        """
+        data = self._chat_completions_request(prompt, model, stream=True)
+        
+        parts = []
+        stopped_early = False
+        
+        try:
+            async with get_http_client().stream("POST", self.base_url, headers=self.headers, json=data) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"{self.provider} ({self.name}) API error: {response.status_code} - {body.decode(errors='replace')}")
+                    raise AIProviderError(
+                        self.name,
+                        f"{self.provider} API error: {response.status_code}",
+                        status_code=response.status_code,
+                        retry_after=parse_retry_after(response.headers.get("retry-after"))
+                    )
                 
-        except Exception as e:
-            logger.error(f"Groq ({self.name}) generation failed: {e}")
-            return None
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    
+                    event = json.loads(payload)
+                    if usage is not None:
+                        read_chat_completions_usage(event, usage)
+                    
+                    choices = event.get("choices") or []
+                    text = choices[0].get("delta", {}).get("content") if choices else None
+                    if not text:
+                        continue
+                    
+                    parts.append(text)
+                    if on_chunk(text):
+                        # Leaving the stream context closes the connection and ends generation
+                        stopped_early = True
+                        break
+        except httpx.HTTPError as e:
+            logger.error(f"{self.provider} ({self.name}) streaming failed: {e}")
+            raise AIProviderError(self.name, f"{self.provider} request failed: {e!r}") from e
+        
+        content = "".join(parts)
+        if content.strip():
+            logger.info(f"{self.provider} ({self.name}) streamed response: {len(content)} chars"
+                       f"{' (stopped early)' if stopped_early else ''}")
+            return content.strip()
+        
+        logger.warning(f"{self.provider} ({self.name}) returned empty content")
+        raise AIProviderError(self.name, f"{self.provider} returned empty content", retryable=False)
     
     # async def _generate_huggingface(self, prompt: str) -> Optional[str]:
     #     """Generate content using Hugging Face"""
@@ -201,6 +679,14 @@ class AIClientWrapper:
     #         logger.error(f"HuggingFace ({self.name}) generation failed: {e}")
     #         return None
     
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Get the observed latency percentile in seconds, or None without samples"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+    
     async def test_connection(self) -> Dict[str, Any]:
         """
         Test the connection to the AI provider
@@ -211,7 +697,7 @@ class AIClientWrapper:
         test_prompt = "Generate a simple test response: 'AI connection working'"
         
         try:
-            result = await self.generate_content(test_prompt)
+            result = await self.generate_content(test_prompt, purpose="connection_test")
             
             if result and "working" in result.lower():
                 return {
@@ -237,6 +723,59 @@ class AIClientWrapper:
                 "error": str(e)
             }
 
+    async def probe(self) -> Dict[str, Any]:
+        """
+        Cheap connectivity check that spends no generation quota
+        
+        Gemini keys fetch the model's metadata, chat completions servers list
+        their models and Hugging Face looks up the model card. Probes are not
+        counted by the circuit breaker or the latency window.
+        """
+        start_time = time.perf_counter()
+        
+        try:
+            if self.provider == "mock":
+                method = "mock"
+            elif self.provider == "gemini":
+                method = "model_metadata"
+                await probe_gemini_key(self.name, self.api_key, self.model, self.max_concurrency)
+            elif self.provider in CHAT_COMPLETIONS_PROVIDERS:
+                method = "model_list"
+                models_url = self.base_url.rsplit("/chat/completions", 1)[0] + "/models"
+                response = await get_http_client().get(
+                    models_url, headers=self.headers, timeout=Config.PROVIDER_PROBE_TIMEOUT_SECONDS
+                )
+                if response.status_code != 200:
+                    raise AIProviderError(self.name, f"HTTP {response.status_code}", status_code=response.status_code)
+            elif self.provider == "huggingface":
+                method = "model_metadata"
+                response = await get_http_client().get(
+                    f"https://huggingface.co/api/models/{self.model}",
+                    headers=self.headers, timeout=Config.PROVIDER_PROBE_TIMEOUT_SECONDS
+                )
+                if response.status_code != 200:
+                    raise AIProviderError(self.name, f"HTTP {response.status_code}", status_code=response.status_code)
+            else:
+                raise AIProviderError(self.name, f"Unsupported provider: {self.provider}", retryable=False)
+        except Exception as e:
+            return {
+                "status": "error",
+                "provider": self.provider,
+                "name": self.name,
+                "model": self.model,
+                "error": str(e),
+                "latency_ms": round((time.perf_counter() - start_time) * 1000, 1)
+            }
+        
+        return {
+            "status": "working",
+            "provider": self.provider,
+            "name": self.name,
+            "model": self.model,
+            "probe": method,
+            "latency_ms": round((time.perf_counter() - start_time) * 1000, 1)
+        }
+
 class AIProviderManager:
     """
     Manages multiple AI provider clients
@@ -258,11 +797,178 @@ class AIProviderManager:
         """Get AI client by provider name"""
         return self.clients.get(provider_name)
     
+    def get_health_status(self) -> Dict[str, Any]:
+        """Get circuit breaker state and health score for every provider"""
+        return {
+            name: client.circuit_breaker.get_status()
+            for name, client in self.clients.items()
+        }
+    
+    def get_token_usage(self) -> Dict[str, Any]:
+        """Get token counts of successful calls for every provider"""
+        return {
+            name: client.get_token_usage()
+            for name, client in self.clients.items()
+        }
+    
     async def test_all_connections(self) -> Dict[str, Any]:
-        """Test connections to all providers"""
-        results = {}
-        
-        for name, client in self.clients.items():
-            results[name] = await client.test_connection()
-        
-        return results
\ No newline at end of file
+        """Probe all providers concurrently"""
+        results = await asyncio.gather(*(client.probe() for client in self.clients.values()))
+        return dict(zip(self.clients.keys(), results))
+
+# Shared HTTP client (one connection pool for the whole application)
+http_client: Optional[httpx.AsyncClient] = None
+
+def initialize_http_client() -> httpx.AsyncClient:
+    """Create the shared async HTTP client used for provider calls"""
+    global http_client
+    
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            timeout=httpx.Timeout(
+                Config.HTTP_TIMEOUT_SECONDS,
+                connect=Config.HTTP_CONNECT_TIMEOUT_SECONDS
+            )
+        )
+        logger.info(f"Shared HTTP client initialized "
+                   f"(max {Config.HTTP_MAX_CONNECTIONS} connections, "
+                   f"{Config.HTTP_MAX_KEEPALIVE_CONNECTIONS} keep-alive)")
+    
+    return http_client
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client, creating it on first use"""
+    if http_client is None or http_client.is_closed:
+        return initialize_http_client()
+    return http_client
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections"""
+    global http_client
+    
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+        logger.info("Shared HTTP client closed")
+
+# Per-key Gemini service clients (never rely on the process-global genai.configure)
+gemini_service_clients: Dict[str, glm.GenerativeServiceClient] = {}
+
+def get_gemini_service_client(key_name: str, api_key: str) -> glm.GenerativeServiceClient:
+    """Get the isolated Gemini service client that owns one API key"""
+    client = gemini_service_clients.get(key_name)
+    if client is None:
+        client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        gemini_service_clients[key_name] = client
+        logger.info(f"Gemini service client created for {key_name}")
+    return client
+
+# Per-key Gemini model metadata clients, used for connectivity probes
+gemini_model_clients: Dict[str, glm.ModelServiceClient] = {}
+
+def get_gemini_model_client(key_name: str, api_key: str) -> glm.ModelServiceClient:
+    """Get the model metadata client for one Gemini API key"""
+    client = gemini_model_clients.get(key_name)
+    if client is None:
+        client = glm.ModelServiceClient(client_options={"api_key": api_key})
+        gemini_model_clients[key_name] = client
+    return client
+
+async def probe_gemini_key(key_name: str, api_key: str, model_name: str, max_concurrency: Optional[int] = None):
+    """Check a Gemini key by fetching model metadata (no generation quota is used)"""
+    client = get_gemini_model_client(key_name, api_key)
+    try:
+        await run_gemini_call(
+            key_name, client.get_model,
+            name=f"models/{model_name}",
+            timeout=Config.PROVIDER_PROBE_TIMEOUT_SECONDS,
+            max_concurrency=max_concurrency
+        )
+    except Exception as e:
+        raise gemini_error_to_provider_error(key_name, e) from e
+
+def create_gemini_model(key_name: str, api_key: str, model_name: str) -> genai.GenerativeModel:
+    """Create a GenerativeModel bound to its own API key"""
+    model = genai.GenerativeModel(model_name)
+    # The SDK falls back to the global default client only when _client is unset
+    model._client = get_gemini_service_client(key_name, api_key)
+    return model
+
+# Bounded thread pool for the blocking Gemini SDK, with a concurrency cap per API key
+gemini_executor: Optional[ThreadPoolExecutor] = None
+gemini_key_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def get_gemini_executor() -> ThreadPoolExecutor:
+    """Get the shared Gemini executor, creating it on first use"""
+    global gemini_executor
+    
+    if gemini_executor is None:
+        gemini_executor = ThreadPoolExecutor(
+            max_workers=Config.GEMINI_EXECUTOR_MAX_WORKERS,
+            thread_name_prefix="gemini"
+        )
+        logger.info(f"Gemini executor initialized with {Config.GEMINI_EXECUTOR_MAX_WORKERS} workers")
+    
+    return gemini_executor
+
+def get_gemini_semaphore(key_name: str, max_concurrency: Optional[int] = None) -> asyncio.Semaphore:
+    """Get the concurrency cap for one Gemini API key"""
+    semaphore = gemini_key_semaphores.get(key_name)
+    if semaphore is None:
+        limit = max_concurrency or Config.GEMINI_MAX_CONCURRENCY_PER_KEY
+        semaphore = asyncio.Semaphore(limit)
+        gemini_key_semaphores[key_name] = semaphore
+        logger.info(f"Gemini concurrency cap for {key_name}: {limit}")
+    return semaphore
+
+async def run_gemini_call(
+    key_name: str,
+    func: Callable,
+    *args,
+    max_concurrency: Optional[int] = None,
+    **kwargs
+):
+    """
+    Run a blocking Gemini SDK call off the event loop
+    
+    At most max_concurrency calls per key are in flight; extra callers wait
+    on the key's semaphore instead of occupying executor threads. If the
+    caller is cancelled (e.g. a losing hedged request) the key's slot stays
+    taken until the thread actually finishes.
+    """
+    semaphore = get_gemini_semaphore(key_name, max_concurrency)
+    await semaphore.acquire()
+    
+    try:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            get_gemini_executor(),
+            functools.partial(func, *args, **kwargs)
+        )
+    except Exception:
+        semaphore.release()
+        raise
+    
+    future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.shield(future)
+
+def cancel_gemini_stream(response):
+    """Cancel the gRPC stream behind a streaming Gemini response (safe from any thread)"""
+    stream = getattr(response, "_iterator", None)
+    if hasattr(stream, "cancel"):
+        stream.cancel()
+
+def shutdown_gemini_executor():
+    """Shut down the Gemini executor"""
+    global gemini_executor
+    
+    if gemini_executor is not None:
+        gemini_executor.shutdown(wait=False, cancel_futures=True)
+        gemini_executor = None
+        gemini_key_semaphores.clear()
+        logger.info("Gemini executor shut down")
@@ -1,22 +1,102 @@
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable, Awaitable
 import logging
 import re
 import math
+import time
+import asyncio
 from dateutil import parser
 from pymongo import DESCENDING
 
 from config import Config
 from database import get_database
 from models import SessionStatus
-from rate_limiter import get_followup_rate_limiter, get_weekly_report_rate_limiter
+from rate_limiter import (
+    get_followup_rate_limiter, get_weekly_report_rate_limiter, estimate_request_tokens, reconcile_token_usage
+)
 from quality_score import get_quality_scorer
-from ai_client import AIClientWrapper, AIProviderManager
+from single_flight import SingleFlight
+from question_parser import (
+    IncrementalQuestionParser, parse_numbered_question, parse_questions_json, FOLLOWUP_QUESTIONS_SCHEMA
+)
+from retry_policy import get_retry_policy, get_retry_budget
+from mock_provider import get_recording_store
+from model_router import ModelRouter, estimate_tokens
+from prompt_compaction import HistoryCompactor, truncate_to_tokens
+from question_cache import QuestionCache, make_cache_key
+from followup_batcher import FollowupBatcher, BATCH_QUESTIONS_SCHEMA, build_batch_prompt, split_batch_response
+from ai_client import (
+    AIClientWrapper, AIProviderManager, AIProviderError, run_gemini_call, create_gemini_model, probe_gemini_key,
+    gemini_error_to_provider_error, read_gemini_usage
+)
+from call_ledger import record_call
+from adaptive_limits import get_adaptive_limit
+from circuit_breaker import get_circuit_breaker
 
 logger = logging.getLogger(__name__)
 
+# Prompt templates are built once at import time and only formatted per request
+FOLLOWUP_PROMPT_BODY = """You're helping a supervisor create simple, easy-to-answer follow-up questions for an intern's daily work update.
+
+**Today's Work:** {today_work_update}
+**What They Planned (from yesterday):** {yesterday_plans}
+**Current Challenges:** {current_challenges}
+**Recent Work History:** {seven_day_history}
+
+Generate exactly 3 simple questions that:
+1. Are easy to answer with 1-2 sentences
+2. Sound friendly and conversational to understand progress without being demanding
+3. Focus on today's work specifically 
+4. When says they completed a task,ask them to describe the steps they followed in a general but specific-enough way, so we can understand how the work was approached and verify it was actually done
+7. If {yesterday_plans} exists verify {today_work_update} matches {yesterday_plans} naturally .
+
+Avoid questions about:
+- Feelings or emotions
+- Complex technical details
+- Long explanations
+
+"""
+
+FOLLOWUP_PROMPT_TEMPLATE = FOLLOWUP_PROMPT_BODY + """Format your response as:
+1. [First simple question] 
+2. [Second simple question]
+3. [Third simple question]"""
+
+# Structured output mode: same instructions, answer as a JSON object
+FOLLOWUP_JSON_PROMPT_TEMPLATE = FOLLOWUP_PROMPT_BODY + """Respond only with JSON in this format:
+{{"questions": ["First simple question", "Second simple question", "Third simple question"]}}"""
+
+WEEKLY_REPORT_PROMPT_TEMPLATE = """You are generating a comprehensive weekly report for an intern's progress and performance.
+
+**Intern ID:** {intern_id}
+**Week Period:** {start_date} to {end_date}
+
+**WORK UPDATES THIS WEEK:**
+{work_summary}
+
+**FOLLOW-UP SESSIONS THIS WEEK:**
+{followup_summary}
+
+Generate a professional weekly report that includes:
+
+1. **Executive Summary** - Overall performance and progress
+2. **Daily Work Breakdown** - What was accomplished each day
+3. **Key Achievements** - Major completions and successes
+4. **Challenges & Blockers** - Issues faced and how they were addressed
+5. **Areas for Improvement** - Constructive feedback based on work quality
+6. **Plans for Next Week** - Recommendations and expected outcomes
+7. **Manager Notes** - Any concerns or praise worth highlighting
+
+Make the report:
+- Professional but supportive in tone
+- Specific with examples from the work updates
+- Constructive in feedback
+- Actionable in recommendations
+- Suitable for sharing with managers and the intern
+
+Format the report in clear sections with appropriate headings."""
+
 class AIFollowupService:
     def __init__(self):
         """Initialize AI service with multiple providers and quality scoring"""
@@ -33,17 +113,80 @@ class AIFollowupService:
         # Initialize AI provider manager for followup questions
         self.provider_manager = AIProviderManager(self.config.AI_PROVIDERS_CONFIG)
         
+        # Weekly report models, reused across requests (one per weekly key and model)
+        self.weekly_models: Dict[Tuple[str, str], Any] = {}
+        
+        # Recent history is compacted to the smallest budget among the follow-up provider
+        # types, since the prompt is built before a key is chosen
+        self.history_compactor = HistoryCompactor(
+            token_budget=min(
+                (Config.get_history_token_budget(client.provider) for client in self.provider_manager.clients.values()),
+                default=Config.PROMPT_HISTORY_TOKEN_BUDGET
+            ),
+            max_field_tokens=Config.PROMPT_FIELD_MAX_TOKENS
+        )
+        
+        # Generated questions cached by normalized update and plans (plus optional recent history and intern)
+        self.question_cache = QuestionCache(
+            max_entries=self.config.FOLLOWUP_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.config.FOLLOWUP_CACHE_TTL_SECONDS,
+            shared_enabled=self.config.FOLLOWUP_CACHE_SHARED_ENABLED,
+            collection_name=self.config.FOLLOWUP_CACHE_COLLECTION
+        )
+        
+        # Prompt-size-aware model routing
+        self.model_router = ModelRouter.from_config(self.config.MODEL_ROUTING_ENABLED, self.config.MODEL_ROUTING_RULES)
+        
+        # Hedged request counters
+        self.hedge_stats = {"hedged_calls": 0, "hedge_wins": 0, "hedge_skipped_no_quota": 0}
+        
+        # Identical concurrent follow-up prompts share one upstream call
+        self.followup_single_flight = SingleFlight("followup_generation")
+        
+        # Requests arriving within a short window share one multi-request call (one RPM slot)
+        self.followup_batcher = FollowupBatcher(
+            "followup_batching",
+            run_batch=self._generate_followup_batch,
+            run_single=self._generate_followup_with_available_provider,
+            window_seconds=self.config.FOLLOWUP_BATCH_WINDOW_MS / 1000,
+            max_batch_size=self.config.FOLLOWUP_BATCH_MAX_SIZE
+        )
+        
+        # Streaming counters (calls that stopped once three questions were parsed)
+        self.streaming_stats = {"streamed_calls": 0, "early_stops": 0, "chars_received": 0}
+        
+        # Response parsing counters (how often questions had to be padded with defaults)
+        self.parse_stats = {"responses_parsed": 0, "json_parsed": 0, "text_parser_fallbacks": 0, "padded_with_defaults": 0}
+        
+        # Retry counters for follow-up generation
+        self.retry_stats = {"retries": 0, "rate_limit_failovers": 0, "retry_successes": 0, "retries_exhausted": 0}
+        
+        # Cached connectivity check results for /api/ai/test (concurrent refreshes share one check)
+        self.connection_status: Optional[Dict[str, Any]] = None
+        self.connection_checked_at: Optional[float] = None
+        self.connection_check_flight = SingleFlight("connection_checks")
+        
+        # Generations that missed the follow-up latency budget and finish in the background
+        self.upgrade_tasks: Set[asyncio.Task] = set()
+        self.upgrade_stats = {"deadline_fallbacks": 0, "upgrades_applied": 0, "upgrades_skipped": 0, "upgrades_failed": 0}
+        
         logger.info("AI Followup Service initialized with multiple AI providers")
         
     async def process_work_update_with_quality_check(
         self, 
         work_description: str, 
         intern_id: str, 
-        update_date: str = None
+        update_date: str = None,
+        latency_budget: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Main method: Check work quality and decide if follow-up is needed
         
+        With latency_budget (seconds), default questions are returned if AI
+        questions are not ready in time. Generation carries on in the
+        background and its task is returned as "pending_generation"; pass
+        it to schedule_question_upgrade once the session is stored.
+        
         Returns:
             Dict containing decision, score, and follow-up data if needed
         """
@@ -68,46 +211,60 @@ class AIFollowupService:
             # Step 2: If follow-up needed, try to generate AI questions
             logger.info(f"Low quality work update (score: {result['quality_score']}) - generating follow-up")
             
-            # Get available provider
-            available_provider = await self.followup_rate_limiter.get_available_provider(record_call=True)
-            if available_provider:
-                # Generate AI follow-up questions using available provider
-                try:
-                    questions = await self._generate_ai_followup_questions_multi_provider(
-                        intern_id, 
-                        work_description, 
-                        available_provider
-                    )
-
+            generation_task = asyncio.ensure_future(self._generate_followup_for_update(intern_id, work_description))
+            
+            try:
+                if latency_budget:
+                    done, _ = await asyncio.wait({generation_task}, timeout=latency_budget)
+                    if not done:
+                        # Answer now with default questions; the session can be upgraded later
+                        self.upgrade_stats["deadline_fallbacks"] += 1
+                        result["followup_data"] = {
+                            "questions": self._get_default_questions(),
+                            "session_id": None,
+                            "type": "deadline_fallback",
+                            "provider_name": "fallback"
+                        }
+                        result["fallback_used"] = True
+                        result["pending_generation"] = generation_task
+                        # Mark a late failure retrieved even if no upgrade is ever scheduled
+                        generation_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                        logger.info(f"AI questions not ready within {latency_budget}s - using default questions for now")
+                        return result
+                
+                generation = await generation_task
+                
+                if generation:
+                    questions, available_provider = generation
                     result["followup_data"] = {
-                        "questions": questions,
+                        "questions": list(questions),
                         "session_id": None,  # Will be set when session is created
                         "type": f"ai_generated_{available_provider['provider']}",
                         "provider_name": available_provider['name']
                     }
                     logger.info(f"AI follow-up questions generated using {available_provider['name']}")
-                    
-                except Exception as e:
-                    logger.error(f"AI question generation failed with {available_provider['name']}: {e}")
-                    # Fall back to default questions
+                else:
+                    # All providers are rate limited - use default questions
                     result["followup_data"] = {
                         "questions": self._get_default_questions(),
                         "session_id": None,
-                        "type": "default_fallback",
+                        "type": "rate_limited_fallback",
                         "provider_name": "fallback"
                     }
                     result["fallback_used"] = True
-                    logger.info("Using default questions due to AI generation failure")
-            else:
-                # All providers are rate limited - use default questions
+                    logger.info("Using default questions due to provider rate limits")
+                    
+            except Exception as e:
+                logger.error(f"AI question generation failed: {e}")
+                # Fall back to default questions
                 result["followup_data"] = {
                     "questions": self._get_default_questions(),
                     "session_id": None,
-                    "type": "rate_limited_fallback",
+                    "type": "default_fallback",
                     "provider_name": "fallback"
                 }
                 result["fallback_used"] = True
-                logger.info("Using default questions due to provider rate limits")
+                logger.info("Using default questions due to AI generation failure")
             
             return result
             
@@ -127,48 +284,411 @@ class AIFollowupService:
                 "fallback_used": True
             }
     
-    async def _generate_ai_followup_questions_multi_provider(
+    async def _generate_followup_for_update(
         self, 
         intern_id: str, 
-        work_description: str,
-        provider_config: Dict[str, str]
-    ) -> List[str]:
+        work_description: str
+    ) -> Optional[Tuple[List[str], Dict[str, str]]]:
         """
-        Generate AI follow-up questions using any available provider
+        Generate the follow-up questions for a work update, from the question
+        cache when the same (normalized) update and plans were answered recently
         """
-        # Get AI client for the provider
-        client = self.provider_manager.get_client(provider_config['name'])
-        if not client:
-            logger.error(f"No client found for provider: {provider_config['name']}")
-            return self._get_default_questions()
+        recent_docs = await self._get_recent_work_history(intern_id)
+        
+        cache_key = None
+        if self.config.FOLLOWUP_CACHE_ENABLED:
+            cache_key = self._make_question_cache_key(intern_id, work_description, recent_docs)
+            cached = await self.question_cache.get(cache_key)
+            if cached:
+                logger.info(f"Follow-up questions served from cache (originally from {cached[1]['name']})")
+                return cached
+        
+        # Build the prompt first so identical in-flight requests can share one upstream call
+        prompt = self._build_followup_prompt(intern_id, work_description, recent_docs)
+        generation = await self._generate_followup(prompt)
+        
+        # Only fully AI-generated questions are worth caching, not ones padded with defaults
+        if cache_key and generation and self._is_fully_ai_generated(generation[0]):
+            self.question_cache.put(cache_key, list(generation[0]), generation[1])
+        return generation
+    
+    def _make_question_cache_key(self, intern_id: str, work_description: str, recent_docs: List[Dict[str, Any]]) -> str:
+        """
+        Cache key: the current update, yesterday's plans and the
+        FOLLOWUP_CACHE_HISTORY_DEPTH most recent history entries, scoped to
+        the intern when FOLLOWUP_CACHE_PER_INTERN is set
+        """
+        yesterday_plans = truncate_to_tokens(
+            self._extract_yesterday_plans_from_recent_docs(recent_docs), self.config.PROMPT_FIELD_MAX_TOKENS
+        )
+        history_entries = []
+        for doc in recent_docs[:self.config.FOLLOWUP_CACHE_HISTORY_DEPTH]:
+            history_entries.append(" ".join(
+                doc.get(field, '') or '' for field in ('description', 'task', 'challenges', 'progress', 'plans', 'blockers')
+            ))
+        return make_cache_key(
+            work_description, yesterday_plans, history_entries,
+            intern_id=intern_id if self.config.FOLLOWUP_CACHE_PER_INTERN else None
+        )
+    
+    def _is_fully_ai_generated(self, questions: List[str]) -> bool:
+        """Whether none of the questions is a default question (padding after a short response)"""
+        defaults = set(self._get_default_questions())
+        return bool(questions) and not any(question in defaults for question in questions)
+    
+    def schedule_question_upgrade(
+        self, 
+        generation_task: asyncio.Future, 
+        apply_upgrade: Callable[[Dict[str, Any]], Awaitable[bool]]
+    ):
+        """
+        Hand late AI questions to apply_upgrade once a background generation finishes
         
+        apply_upgrade gets the new follow-up data and returns whether it was
+        applied (False when e.g. the intern has already answered).
+        """
+        task = asyncio.create_task(self._apply_question_upgrade(generation_task, apply_upgrade))
+        self.upgrade_tasks.add(task)
+        task.add_done_callback(self.upgrade_tasks.discard)
+    
+    async def _apply_question_upgrade(
+        self, 
+        generation_task: asyncio.Future, 
+        apply_upgrade: Callable[[Dict[str, Any]], Awaitable[bool]]
+    ):
+        try:
+            generation = await generation_task
+            if not generation:
+                self.upgrade_stats["upgrades_skipped"] += 1
+                return
+            
+            questions, provider = generation
+            applied = await apply_upgrade({
+                "questions": list(questions),
+                "type": f"ai_generated_{provider['provider']}",
+                "provider_name": provider['name']
+            })
+            self.upgrade_stats["upgrades_applied" if applied else "upgrades_skipped"] += 1
+            logger.info(f"Late AI questions from {provider['name']} {'applied' if applied else 'not applied'}")
+            
+        except Exception as e:
+            self.upgrade_stats["upgrades_failed"] += 1
+            logger.error(f"Background follow-up question upgrade failed: {e}")
+    
+    def _build_followup_prompt(self, intern_id: str, work_description: str, recent_docs: List[Dict[str, Any]]) -> str:
+        """Build the follow-up prompt from the current update and recent history"""
         # Build work update data for context
         work_update_data = {
             "description": work_description,
             "user_id": intern_id
         }
         
-        # Get context and generate questions
-        recent_docs = await self._get_recent_work_history(intern_id)
         current_context = self._build_current_work_context(work_update_data)
         history_context = self._build_work_history_context(recent_docs) if recent_docs else ""
         
-        prompt = self._build_ai_prompt(current_context, history_context, recent_docs)
+        return self._build_ai_prompt(current_context, history_context, recent_docs)
+    
+    async def _generate_followup(self, prompt: str) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Generate questions for a prompt, sharing one upstream call among identical in-flight prompts"""
+        if self.config.FOLLOWUP_BATCHING_ENABLED:
+            generate = self.followup_batcher.submit
+        else:
+            generate = self._generate_followup_with_available_provider
+        
+        if self.config.SINGLE_FLIGHT_ENABLED:
+            return await self.followup_single_flight.do(SingleFlight.make_key(prompt), lambda: generate(prompt))
+        return await generate(prompt)
+    
+    async def _generate_followup_batch(self, prompts: List[str]) -> List[Optional[Tuple[List[str], Dict[str, str]]]]:
+        """
+        Generate questions for several prompts with one provider call
+        
+        The prompts are sent as one multi-request prompt asking for JSON
+        results by request id. Returns one entry per prompt; prompts the
+        response did not answer cleanly (or all of them, if the call fails
+        or no provider has quota) are None and get their own call.
+        """
+        unanswered: List[Optional[Tuple[List[str], Dict[str, str]]]] = [None] * len(prompts)
+        
+        batch_prompt = build_batch_prompt(prompts)
+        reservation = await self.followup_rate_limiter.reserve_provider(tokens=estimate_request_tokens(batch_prompt))
+        if not reservation:
+            return unanswered
+        available_provider = reservation.provider
+        client = self.provider_manager.get_client(available_provider['name'])
+        if not client:
+            await reservation.cancel()
+            return unanswered
+        await reservation.commit()
+        
+        model = self.model_router.route("followup", client.provider, batch_prompt)
+        logger.info(f"Sending batch of {len(prompts)} follow-up requests to {available_provider['name']}")
+        
+        try:
+            response_text = await client.generate(
+                batch_prompt, json_schema=BATCH_QUESTIONS_SCHEMA, model=model, purpose="followup_batch",
+                reserved_tokens=reservation.tokens
+            )
+        except AIProviderError as e:
+            if e.is_rate_limited:
+                policy = get_retry_policy(available_provider['provider'])
+                await self.followup_rate_limiter.defer_provider(
+                    available_provider['name'],
+                    min(e.retry_after if e.retry_after is not None else policy.max_delay, policy.max_retry_after)
+                )
+            logger.warning(f"Batched follow-up call to {available_provider['name']} failed: {e}")
+            return unanswered
+        
+        return [
+            (questions, available_provider) if questions else None
+            for questions in split_batch_response(response_text, len(prompts))
+        ]
+    
+    async def _generate_followup_with_available_provider(
+        self, 
+        prompt: str
+    ) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """
+        Take a provider slot and generate questions for the prompt, retrying
+        transient failures
+        
+        - 429: the key is deferred (for its Retry-After, if given) and the
+          retry goes straight to a different provider
+        - 5xx / timeouts: exponential backoff with jitter, then a fresh slot
+        
+        Every retry is taken from the global retry budget and must fit in
+        RETRY_MAX_TOTAL_SECONDS. When every provider is at its rate limit,
+        the call queues for up to FOLLOWUP_SLOT_WAIT_SECONDS for a slot.
+        Returns None if none frees up; raises AIProviderError when retries
+        are exhausted.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.RETRY_MAX_TOTAL_SECONDS
+        retry_budget = get_retry_budget()
+        retry_budget.record_request()
+        
+        exclude: List[str] = []
+        tokens = estimate_request_tokens(prompt)
+        attempt = 0
+        last_error: Optional[AIProviderError] = None
+        
+        while True:
+            attempt += 1
+            reservation = await self.followup_rate_limiter.acquire(
+                timeout=min(self.config.FOLLOWUP_SLOT_WAIT_SECONDS, deadline - loop.time()),
+                exclude=exclude,
+                tokens=tokens
+            )
+            if not reservation:
+                if last_error:
+                    self.retry_stats["retries_exhausted"] += 1
+                    raise last_error
+                return None
+            await reservation.commit()
+            available_provider = reservation.provider
+            
+            try:
+                generation = await self._generate_ai_followup_questions_multi_provider(
+                    prompt, available_provider, fallback=attempt > 1, reserved_tokens=reservation.tokens
+                )
+                if attempt > 1:
+                    self.retry_stats["retry_successes"] += 1
+                return generation
+            except AIProviderError as e:
+                last_error = e
+                policy = get_retry_policy(available_provider['provider'])
+                if not e.retryable or attempt >= policy.max_attempts:
+                    if e.retryable:
+                        self.retry_stats["retries_exhausted"] += 1
+                    raise
+                
+                if e.is_rate_limited:
+                    # Quota is per key, so another provider can serve the retry right away
+                    await self.followup_rate_limiter.defer_provider(
+                        available_provider['name'], 
+                        min(e.retry_after if e.retry_after is not None else policy.max_delay, policy.max_retry_after)
+                    )
+                    exclude.append(available_provider['name'])
+                    delay = 0.0
+                else:
+                    delay = policy.get_delay(attempt, e.retry_after)
+                
+                if delay is None or loop.time() + delay > deadline or not retry_budget.can_retry():
+                    self.retry_stats["retries_exhausted"] += 1
+                    raise
+                
+                self.retry_stats["retries"] += 1
+                if e.is_rate_limited:
+                    self.retry_stats["rate_limit_failovers"] += 1
+                logger.warning(f"{available_provider['name']} failed ({e.status_code or 'no status'}) - "
+                              f"retry {attempt}/{policy.max_attempts - 1} in {delay:.2f}s")
+                if delay:
+                    await asyncio.sleep(delay)
+    
+    async def _generate_ai_followup_questions_multi_provider(
+        self, 
+        prompt: str,
+        provider_config: Dict[str, str],
+        fallback: bool = False,
+        reserved_tokens: int = 0
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Generate AI follow-up questions using any available provider
+        
+        Returns the questions and the provider that produced them (which
+        differs from provider_config when a hedged call wins). Retryable
+        provider errors are raised for the caller's retry loop. fallback
+        marks a retry in the call ledger; reserved_tokens is what
+        provider_config's slot reserved.
+        """
+        # Get AI client for the provider
+        client = self.provider_manager.get_client(provider_config['name'])
+        if not client:
+            logger.error(f"No client found for provider: {provider_config['name']}")
+            return self._get_default_questions(), provider_config
         
         logger.info(f"Sending request to {provider_config['name']} ({provider_config['provider']})")
-        response_text = await client.generate_content(prompt)
+        try:
+            if self.config.HEDGING_ENABLED:
+                response_text, provider_config = await self._generate_hedged(
+                    prompt, provider_config, fallback, reserved_tokens
+                )
+            else:
+                response_text = await self._call_provider(client, prompt, fallback, reserved_tokens)
+        except AIProviderError as e:
+            if e.retryable:
+                raise
+            logger.error(f"{provider_config['name']} failed: {e}")
+            response_text = None
         
         if response_text and response_text.strip():
-            questions = self._parse_questions_from_response(response_text)
+            questions = self._parse_questions(response_text)
             if len(questions) >= 3:
                 logger.info(f"Successfully generated {len(questions)} AI questions using {provider_config['name']}")
-                return questions
+                return questions, provider_config
             else:
                 logger.warning(f"{provider_config['name']} generated only {len(questions)} questions, using defaults")
-                return self._get_default_questions()
+                return self._get_default_questions(), provider_config
         else:
             logger.error(f"{provider_config['name']} response was null or empty")
-            return self._get_default_questions()
+            return self._get_default_questions(), provider_config
+    
+    async def _call_provider(
+        self,
+        client: AIClientWrapper,
+        prompt: str,
+        fallback: bool = False,
+        reserved_tokens: int = 0
+    ) -> str:
+        """
+        Send a follow-up prompt to one provider
+        
+        In structured output mode the provider is asked for JSON matching
+        FOLLOWUP_QUESTIONS_SCHEMA. Otherwise, when streaming is enabled, the
+        response is parsed as it arrives and the stream is closed as soon as
+        three questions are complete.
+        """
+        model = self.model_router.route("followup", client.provider, prompt)
+        
+        if self.config.STRUCTURED_OUTPUT_ENABLED:
+            return await client.generate(
+                prompt, json_schema=FOLLOWUP_QUESTIONS_SCHEMA, model=model, purpose="followup", fallback=fallback,
+                reserved_tokens=reserved_tokens
+            )
+        
+        if not self.config.STREAMING_ENABLED:
+            return await client.generate(
+                prompt, model=model, purpose="followup", fallback=fallback, reserved_tokens=reserved_tokens
+            )
+        
+        parser = IncrementalQuestionParser(target=3)
+        response_text = await client.generate(
+            prompt, on_chunk=parser.feed, model=model, purpose="followup", fallback=fallback,
+            reserved_tokens=reserved_tokens
+        )
+        
+        self.streaming_stats["streamed_calls"] += 1
+        self.streaming_stats["chars_received"] += len(response_text)
+        if parser.is_complete:
+            self.streaming_stats["early_stops"] += 1
+        return response_text
+    
+    def _get_hedge_delay(self, client: AIClientWrapper) -> float:
+        """Delay before hedging: the provider's observed percentile latency, or the fixed default"""
+        delay = self.config.HEDGE_DELAY_SECONDS
+        if len(client.latencies) >= self.config.HEDGE_MIN_SAMPLES:
+            observed = client.latency_percentile(self.config.HEDGE_DELAY_PERCENTILE)
+            if observed is not None:
+                delay = observed
+        return max(self.config.HEDGE_MIN_DELAY_SECONDS, delay)
+    
+    async def _generate_hedged(
+        self, 
+        prompt: str, 
+        primary_provider: Dict[str, str],
+        fallback: bool = False,
+        reserved_tokens: int = 0
+    ) -> Tuple[str, Dict[str, str]]:
+        """
+        Send the prompt to the primary provider and, if it has not answered
+        within the hedge delay, to a second provider with spare quota.
+        
+        The first successful response wins and the other call is cancelled.
+        The hedge slot is taken through the rate limiter, so hedging never
+        sends a key over its quota. If every call fails, the primary's
+        error is raised.
+        """
+        primary_client = self.provider_manager.get_client(primary_provider['name'])
+        delay = self._get_hedge_delay(primary_client)
+        
+        primary_task = asyncio.create_task(self._call_provider(primary_client, prompt, fallback, reserved_tokens))
+        task_providers = {primary_task: primary_provider}
+        
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done:
+                return primary_task.result(), primary_provider
+            
+            hedge_reservation = await self.followup_rate_limiter.reserve_provider(
+                exclude=[primary_provider['name']],
+                tokens=estimate_request_tokens(prompt)
+            )
+            hedge_provider = hedge_reservation.provider if hedge_reservation else None
+            hedge_client = self.provider_manager.get_client(hedge_provider['name']) if hedge_provider else None
+            if hedge_reservation and not hedge_client:
+                await hedge_reservation.cancel()
+            if not hedge_client:
+                self.hedge_stats["hedge_skipped_no_quota"] += 1
+                logger.info(f"{primary_provider['name']} slow after {delay:.2f}s but no provider has spare quota to hedge")
+                return await primary_task, primary_provider
+            
+            self.hedge_stats["hedged_calls"] += 1
+            logger.info(f"{primary_provider['name']} slow after {delay:.2f}s - hedging with {hedge_provider['name']}")
+            
+            await hedge_reservation.commit()
+            hedge_task = asyncio.create_task(
+                self._call_provider(hedge_client, prompt, fallback=True, reserved_tokens=hedge_reservation.tokens)
+            )
+            task_providers[hedge_task] = hedge_provider
+            pending = set(task_providers)
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception():
+                        continue
+                    winner = task_providers[task]
+                    if task is hedge_task:
+                        self.hedge_stats["hedge_wins"] += 1
+                    logger.info(f"Hedged call won by {winner['name']}")
+                    return task.result(), winner
+        finally:
+            for task in task_providers:
+                if not task.done():
+                    task.cancel()
+        
+        # Both calls failed - surface the primary's error
+        raise primary_task.exception()
     
     async def generate_weekly_report(
         self, 
@@ -180,13 +700,6 @@ class AIFollowupService:
         Generate AI-powered weekly report using Gemini
         """
         try:
-            # Get available provider for weekly reports (Gemini only)
-            provider = await self.weekly_rate_limiter.wait_if_needed()
-            
-            # Configure genai with weekly report API key
-            genai.configure(api_key=provider['api_key'])
-            model = genai.GenerativeModel(provider['model'])
-            
             # Fetch weekly data
             weekly_data = await self._fetch_weekly_data(intern_id, start_date, end_date)
             
@@ -200,8 +713,62 @@ class AIFollowupService:
             # Build weekly report prompt
             prompt = self._build_weekly_report_prompt(weekly_data, start_date, end_date)
             
-            logger.info(f"Generating weekly report for intern {intern_id} using {provider['name']}")
-            response = model.generate_content(prompt)
+            # Get available provider for weekly reports (Gemini only), sized to the prompt's tokens
+            reserved_tokens = estimate_request_tokens(prompt)
+            provider = await self.weekly_rate_limiter.wait_if_needed(tokens=reserved_tokens)
+            
+            # Model bound to the weekly report API key only, sized to the prompt
+            model_name = self.model_router.route("weekly", provider['provider'], prompt) or provider['model']
+            model = self._get_weekly_model(provider, model_name)
+            
+            logger.info(f"Generating weekly report for intern {intern_id} using {provider['name']} ({model_name})")
+            circuit = get_circuit_breaker(provider['name'])
+            start_time = time.perf_counter()
+            try:
+                response = await run_gemini_call(
+                    provider['name'], model.generate_content, prompt,
+                    max_concurrency=provider.get('max_concurrency')
+                )
+            except asyncio.CancelledError:
+                # e.g. the client disconnected; Gemini may still have spent quota on the call
+                record_call(
+                    provider=provider['provider'], key_name=provider['name'], purpose="weekly_report", model=model_name,
+                    outcome="cancelled", latency=time.perf_counter() - start_time, prompt_tokens=estimate_tokens(prompt)
+                )
+                circuit.record_ignored()
+                reconcile_token_usage(provider['name'], reserved_tokens, estimate_tokens(prompt))
+                raise
+            except Exception as e:
+                error = gemini_error_to_provider_error(provider['name'], e)
+                if error.is_availability_failure:
+                    circuit.record_failure(time.perf_counter() - start_time)
+                else:
+                    circuit.record_ignored()
+                if error.is_rate_limited:
+                    get_adaptive_limit(provider['name']).record_rate_limited()
+                record_call(
+                    provider=provider['provider'], key_name=provider['name'], purpose="weekly_report", model=model_name,
+                    outcome="rate_limited" if error.is_rate_limited else "error", status_code=error.status_code,
+                    latency=time.perf_counter() - start_time, prompt_tokens=estimate_tokens(prompt)
+                )
+                reconcile_token_usage(provider['name'], reserved_tokens, 0)
+                raise
+            
+            latency = time.perf_counter() - start_time
+            circuit.record_success(latency)
+            get_adaptive_limit(provider['name']).record_success()
+            usage: Dict[str, int] = {}
+            read_gemini_usage(response, usage)
+            record_call(
+                provider=provider['provider'], key_name=provider['name'], purpose="weekly_report", model=model_name,
+                outcome="ok", latency=latency,
+                prompt_tokens=usage.get("prompt_tokens", estimate_tokens(prompt)),
+                response_tokens=usage.get("completion_tokens", 0)
+            )
+            reconcile_token_usage(
+                provider['name'], reserved_tokens,
+                usage.get("prompt_tokens", estimate_tokens(prompt)) + usage.get("completion_tokens", 0)
+            )
             
             if response.text and response.text.strip():
                 return {
@@ -211,7 +778,8 @@ class AIFollowupService:
                         "work_updates_count": len(weekly_data["work_updates"]),
                         "followup_sessions_count": len(weekly_data["followup_sessions"]),
                         "date_range": f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}",
-                        "provider_used": provider['name']
+                        "provider_used": provider['name'],
+                        "model_used": model_name
                     }
                 }
             else:
@@ -229,8 +797,126 @@ class AIFollowupService:
                 "report": None
             }
     
-    async def test_ai_connection(self) -> Dict[str, Any]:
-        """Test all AI provider connections"""
+    def get_generation_metrics(self) -> Dict[str, Any]:
+        """Get generation metrics (coalescing, batching, latency budget, hedging, streaming, parsing, retries, routing, compaction, cache, tokens, health)"""
+        parsed = self.parse_stats["responses_parsed"]
+        return {
+            "single_flight": {
+                "enabled": self.config.SINGLE_FLIGHT_ENABLED,
+                **self.followup_single_flight.get_stats()
+            },
+            "batching": {
+                "enabled": self.config.FOLLOWUP_BATCHING_ENABLED,
+                **self.followup_batcher.get_stats()
+            },
+            "latency_budget": {
+                "budget_seconds": self.config.FOLLOWUP_LATENCY_BUDGET_SECONDS,
+                **self.upgrade_stats,
+                "upgrades_in_flight": len(self.upgrade_tasks)
+            },
+            "hedging": {
+                "enabled": self.config.HEDGING_ENABLED,
+                **self.hedge_stats
+            },
+            "streaming": {
+                "enabled": self.config.STREAMING_ENABLED,
+                **self.streaming_stats
+            },
+            "parsing": {
+                "structured_output_enabled": self.config.STRUCTURED_OUTPUT_ENABLED,
+                **self.parse_stats,
+                "padding_rate_percentage": round(self.parse_stats["padded_with_defaults"] / parsed * 100, 1) if parsed else 0.0
+            },
+            "retries": {
+                **self.retry_stats,
+                "budget": get_retry_budget().get_status()
+            },
+            "model_routing": self.model_router.get_stats(),
+            "prompt_compaction": self.history_compactor.get_stats(),
+            "question_cache": {
+                "enabled": self.config.FOLLOWUP_CACHE_ENABLED,
+                "history_depth": self.config.FOLLOWUP_CACHE_HISTORY_DEPTH,
+                "per_intern": self.config.FOLLOWUP_CACHE_PER_INTERN,
+                **self.question_cache.get_stats()
+            },
+            "token_usage": self.provider_manager.get_token_usage(),
+            "recordings": get_recording_store().get_stats(),
+            "provider_health": self.provider_manager.get_health_status()
+        }
+    
+    def _get_weekly_model(self, provider: Dict[str, Any], model_name: Optional[str] = None):
+        """Get the cached Gemini model for a weekly report key"""
+        model_name = model_name or provider['model']
+        model = self.weekly_models.get((provider['name'], model_name))
+        if model is None:
+            model = create_gemini_model(provider['name'], provider['api_key'], model_name)
+            self.weekly_models[(provider['name'], model_name)] = model
+        return model
+    
+    async def test_ai_connection(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get AI provider connectivity from the cached check results
+        
+        Results older than PROVIDER_PROBE_TTL_SECONDS (or force_refresh) are
+        checked again first; the background refresh normally keeps them fresh.
+        """
+        checked_at = self.connection_checked_at
+        if force_refresh or checked_at is None or time.monotonic() - checked_at > Config.PROVIDER_PROBE_TTL_SECONDS:
+            await self.refresh_connection_status()
+        
+        return {
+            **self.connection_status,
+            "cache": {
+                "age_seconds": round(time.monotonic() - self.connection_checked_at, 1),
+                "ttl_seconds": Config.PROVIDER_PROBE_TTL_SECONDS
+            }
+        }
+    
+    async def refresh_connection_status(self) -> Dict[str, Any]:
+        """Run the connectivity checks now (concurrent callers share one check)"""
+        return await self.connection_check_flight.do("connection_checks", self._check_ai_connections)
+    
+    async def connection_refresh_loop(self):
+        """Keep the cached connectivity results fresh (background task)"""
+        while True:
+            try:
+                await self.refresh_connection_status()
+            except Exception as e:
+                logger.error(f"Background AI connection check failed: {e}")
+            
+            await asyncio.sleep(Config.PROVIDER_PROBE_REFRESH_SECONDS)
+    
+    async def _check_weekly_provider(self) -> Dict[str, Any]:
+        """Probe the weekly report key with a model metadata call"""
+        try:
+            weekly_provider = await self.weekly_rate_limiter.get_available_provider(record_call=False)
+            if not weekly_provider:
+                return {
+                    "status": "error",
+                    "error": "No weekly report provider available"
+                }
+            
+            start_time = time.perf_counter()
+            await probe_gemini_key(
+                weekly_provider['name'], weekly_provider['api_key'], weekly_provider['model'],
+                weekly_provider.get('max_concurrency')
+            )
+            return {
+                "status": "working",
+                "name": weekly_provider['name'],
+                "model": weekly_provider['model'],
+                "probe": "model_metadata",
+                "latency_ms": round((time.perf_counter() - start_time) * 1000, 1)
+            }
+            
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+    
+    async def _check_ai_connections(self) -> Dict[str, Any]:
+        """Probe all AI providers concurrently and cache the results"""
         results = {
             "followup_providers": {},
             "weekly_report_provider": {},
@@ -238,47 +924,18 @@ class AIFollowupService:
         }
         
         try:
-            # Test followup providers
-            followup_results = await self.provider_manager.test_all_connections()
+            followup_results, weekly_result = await asyncio.gather(
+                self.provider_manager.test_all_connections(),
+                self._check_weekly_provider()
+            )
             results["followup_providers"] = followup_results
+            results["weekly_report_provider"] = weekly_result
             
             working_providers = sum(1 for result in followup_results.values() if result.get("status") == "working")
             
-            # Test weekly report provider (Gemini)
-            try:
-                weekly_provider = await self.weekly_rate_limiter.get_available_provider(record_call=False)
-                if weekly_provider:
-                    genai.configure(api_key=weekly_provider['api_key'])
-                    model = genai.GenerativeModel(weekly_provider['model'])
-                    response = model.generate_content('Generate a test weekly report header: "Weekly Report Test"')
-                    
-                    if response.text and "report" in response.text.lower():
-                        results["weekly_report_provider"] = {
-                            "status": "working",
-                            "name": weekly_provider['name'],
-                            "response": response.text[:50] + "..."
-                        }
-                    else:
-                        results["weekly_report_provider"] = {
-                            "status": "failed",
-                            "name": weekly_provider['name'],
-                            "error": "Invalid response"
-                        }
-                else:
-                    results["weekly_report_provider"] = {
-                        "status": "error",
-                        "error": "No weekly report provider available"
-                    }
-                    
-            except Exception as e:
-                results["weekly_report_provider"] = {
-                    "status": "error",
-                    "error": str(e)
-                }
-            
             # Summary
             total_followup_providers = len(followup_results)
-            weekly_working = results["weekly_report_provider"].get("status") == "working"
+            weekly_working = weekly_result.get("status") == "working"
             
             results["summary"] = {
                 "total_followup_providers": total_followup_providers,
@@ -296,17 +953,20 @@ class AIFollowupService:
             logger.info(f"AI Connection Test: {working_providers}/{total_followup_providers} followup providers working, "
                        f"weekly provider: {'working' if weekly_working else 'failed'}")
             
-            return results
-            
         except Exception as e:
             logger.error(f"AI connection test failed: {e}")
-            return {
+            results = {
                 "error": str(e),
                 "summary": {
                     "overall_status": "error",
                     "fallback_available": True
                 }
             }
+        
+        results["checked_at"] = datetime.now().isoformat()
+        self.connection_status = results
+        self.connection_checked_at = time.monotonic()
+        return results
     
     # CORRECTED: Fetch weekly data from dailyrecords collection
     async def _fetch_weekly_data(
@@ -405,35 +1065,13 @@ Follow-up Session {i} ({created_date}) - Status: {status}
 {chr(10).join(qa_pairs)}
 """)
         
-        prompt = f"""You are generating a comprehensive weekly report for an intern's progress and performance.
-
-**Intern ID:** {intern_id}
-**Week Period:** {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}
-
-**WORK UPDATES THIS WEEK:**
-{''.join(work_summary)}
-
-**FOLLOW-UP SESSIONS THIS WEEK:**
-{''.join(followup_summary) if followup_summary else "No follow-up sessions this week."}
-
-Generate a professional weekly report that includes:
-
-1. **Executive Summary** - Overall performance and progress
-2. **Daily Work Breakdown** - What was accomplished each day
-3. **Key Achievements** - Major completions and successes
-4. **Challenges & Blockers** - Issues faced and how they were addressed
-5. **Areas for Improvement** - Constructive feedback based on work quality
-6. **Plans for Next Week** - Recommendations and expected outcomes
-7. **Manager Notes** - Any concerns or praise worth highlighting
-
-Make the report:
-- Professional but supportive in tone
-- Specific with examples from the work updates
-- Constructive in feedback
-- Actionable in recommendations
-- Suitable for sharing with managers and the intern
-
-Format the report in clear sections with appropriate headings."""
+        prompt = WEEKLY_REPORT_PROMPT_TEMPLATE.format(
+            intern_id=intern_id,
+            start_date=start_date.strftime('%Y-%m-%d'),
+            end_date=end_date.strftime('%Y-%m-%d'),
+            work_summary=''.join(work_summary),
+            followup_summary=''.join(followup_summary) if followup_summary else "No follow-up sessions this week."
+        )
         
         return prompt
     
@@ -535,24 +1173,27 @@ Format the report in clear sections with appropriate headings."""
         return '\n'.join(context_lines)
     
     def _build_work_history_context(self, docs: List[Dict[str, Any]]) -> str:
-        """Build context string from work update history"""
-        context_lines = ["RECENT WORK HISTORY:"]
-        
+        """Build context string from work update history, compacted to the history token budget"""
+        entries = []
         for doc in docs:
             date_time = self._extract_timestamp(doc)
-            description = doc.get('description', '').strip() or doc.get('task', '').strip()
-            challenges = doc.get('challenges', '').strip() or doc.get('progress', '').strip()
-            plans = doc.get('plans', '').strip() or doc.get('blockers', '').strip()
-            
-            date_str = date_time.strftime('%Y-%m-%d') if date_time else 'Unknown'
-            
-            context_lines.append(f"Date: {date_str}")
-            if description:
-                context_lines.append(f"Work: {description}")
-            if challenges:
-                context_lines.append(f"Challenges: {challenges}")
-            if plans:
-                context_lines.append(f"Plans: {plans}")
+            entries.append({
+                "date": date_time.strftime('%Y-%m-%d') if date_time else 'Unknown',
+                "work": doc.get('description', '').strip() or doc.get('task', '').strip(),
+                "challenges": doc.get('challenges', '').strip() or doc.get('progress', '').strip(),
+                "plans": doc.get('plans', '').strip() or doc.get('blockers', '').strip()
+            })
+        
+        context_lines = ["RECENT WORK HISTORY:"]
+        
+        for entry in self.history_compactor.compact(entries):
+            context_lines.append(f"Date: {entry['date']}")
+            if entry.get("work"):
+                context_lines.append(f"Work: {entry['work']}")
+            if entry.get("challenges"):
+                context_lines.append(f"Challenges: {entry['challenges']}")
+            if entry.get("plans"):
+                context_lines.append(f"Plans: {entry['plans']}")
             context_lines.append("---")
         
         return '\n'.join(context_lines)
@@ -561,33 +1202,19 @@ Format the report in clear sections with appropriate headings."""
         """Build AI prompt for question generation - SAME FOR ALL PROVIDERS"""
         
         today_work_update = current_context
-        yesterday_plans = self._extract_yesterday_plans_from_recent_docs(recent_docs)
+        yesterday_plans = truncate_to_tokens(
+            self._extract_yesterday_plans_from_recent_docs(recent_docs), self.config.PROMPT_FIELD_MAX_TOKENS
+        )
         current_challenges = self._extract_current_challenges(current_context)
         seven_day_history = history_context
 
-        prompt = f"""You're helping a supervisor create simple, easy-to-answer follow-up questions for an intern's daily work update.
-
-**Today's Work:** {today_work_update}
-**What They Planned (from yesterday):** {yesterday_plans}
-**Current Challenges:** {current_challenges}
-**Recent Work History:** {seven_day_history}
-
-Generate exactly 3 simple questions that:
-1. Are easy to answer with 1-2 sentences
-2. Sound friendly and conversational to understand progress without being demanding
-3. Focus on today's work specifically 
-4. When says they completed a task,ask them to describe the steps they followed in a general but specific-enough way, so we can understand how the work was approached and verify it was actually done
-7. If {yesterday_plans} exists verify {today_work_update} matches {yesterday_plans} naturally .
-
-Avoid questions about:
-- Feelings or emotions
-- Complex technical details
-- Long explanations
-
-Format your response as:
-1. [First simple question] 
-2. [Second simple question]
-3. [Third simple question]"""
+        template = FOLLOWUP_JSON_PROMPT_TEMPLATE if self.config.STRUCTURED_OUTPUT_ENABLED else FOLLOWUP_PROMPT_TEMPLATE
+        prompt = template.format(
+            today_work_update=today_work_update,
+            yesterday_plans=yesterday_plans,
+            current_challenges=current_challenges,
+            seven_day_history=seven_day_history
+        )
 
         return prompt
     
@@ -630,6 +1257,20 @@ Format your response as:
         
         return challenges
     
+    def _parse_questions(self, response: str) -> List[str]:
+        """Parse questions, trying the strict JSON decoder first in structured output mode"""
+        self.parse_stats["responses_parsed"] += 1
+        
+        if self.config.STRUCTURED_OUTPUT_ENABLED:
+            questions = parse_questions_json(response)
+            if questions:
+                self.parse_stats["json_parsed"] += 1
+                return questions
+            self.parse_stats["text_parser_fallbacks"] += 1
+            logger.warning("Structured response was not valid question JSON - falling back to text parser")
+        
+        return self._parse_questions_from_response(response)
+    
     def _parse_questions_from_response(self, response: str) -> List[str]:
         """Parse questions from AI response - WORKS FOR ALL PROVIDERS"""
         questions = []
@@ -637,12 +1278,9 @@ Format your response as:
         lines = response.split('\n')
         
         for line in lines:
-            trimmed = line.strip()
-            if re.match(r'^\d+[.\)]\s*', trimmed):
-                question = re.sub(r'^\d+[.\)]\s*', '', trimmed).strip()
-                question = re.sub(r'\*\*.*?\*\*:\s*', '', question)
-                if question and len(question) > 10:
-                    questions.append(question)
+            question = parse_numbered_question(line)
+            if question:
+                questions.append(question)
         
         if len(questions) < 3:
             for line in lines:
@@ -664,6 +1302,7 @@ Format your response as:
         if len(questions) > 3:
             questions = questions[:3]
         elif len(questions) < 3:
+            self.parse_stats["padded_with_defaults"] += 1
             defaults = self._get_default_questions()
             while len(questions) < 3 and len(questions) < len(defaults):
                 questions.append(defaults[len(questions)])
@@ -761,4 +1400,20 @@ Format your response as:
             
         except Exception as e:
             logger.error(f"Error getting pending follow-up session: {e}")
-            return None
\ No newline at end of file
+            return None
+
+# Global AI service instance (shared by all requests)
+ai_followup_service: Optional[AIFollowupService] = None
+
+def initialize_ai_service():
+    """Initialize the global AI followup service"""
+    global ai_followup_service
+    
+    ai_followup_service = AIFollowupService()
+    logger.info("Global AI followup service initialized")
+
+def get_ai_followup_service() -> AIFollowupService:
+    """Get the global AI followup service instance"""
+    if ai_followup_service is None:
+        raise RuntimeError("AI service not initialized. Call initialize_ai_service() first")
+    return ai_followup_service
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Offline Follow-up Generation Benchmark
+
+Drives the follow-up generation path (provider selection, rate limiting,
+retries, hedging, single-flight, streaming, parsing) against mock AI
+providers, so throughput and latency can be measured without API keys or
+network access. With a fixed MOCK_SEED every provider draws the same
+latencies and failures on every run; with --concurrency 1 the whole run
+is reproducible call for call.
+
+Mock behaviour is set through the usual environment variables, e.g.:
+
+    MOCK_LATENCY_MEDIAN_MS=600 MOCK_RATE_LIMIT_RATE=0.05 python benchmark_offline.py --requests 300
+
+Set FOLLOWUP_BATCHING_ENABLED=True to measure micro-batching. Recorded
+live responses can be replayed instead of mock responses with
+AI_RECORD_MODE=replay (record them first with AI_RECORD_MODE=record).
+"""
+
+import os
+
+# Mock-only provider setup unless overridden by the caller
+os.environ.setdefault("MOCK_PROVIDER_COUNT", "3")
+os.environ.setdefault("MOCK_PROVIDERS_ONLY", "True")
+os.environ.setdefault("MOCK_SEED", "42")
+os.environ.setdefault("MOCK_RATE_LIMIT_PER_MINUTE", "100000")
+os.environ.setdefault("WEEKLY_REPORT_API_KEY", "benchmark-weekly-key")
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List
+
+logging.disable(logging.CRITICAL)
+
+from rate_limiter import initialize_rate_limiters
+from quality_score import initialize_quality_scorer
+from ai_service import initialize_ai_service, get_ai_followup_service
+
+TASKS = ["login page", "API endpoint", "database schema", "unit tests", "dashboard chart", "bug in signup form"]
+VERBS = ["worked on", "fixed", "started", "reviewed", "refactored", "tested"]
+
+
+def build_prompts(count: int, seed: int) -> List[str]:
+    """Build a fixed set of follow-up prompts from synthetic work updates"""
+    service = get_ai_followup_service()
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(count):
+        description = f"{rng.choice(VERBS)} the {rng.choice(TASKS)}"
+        current_context = f"CURRENT WORK UPDATE:\nWork Description: {description}\n---"
+        prompts.append(service._build_ai_prompt(current_context, "", []))
+    return prompts
+
+
+def percentile(ordered: List[float], value: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+
+async def run(requests: int, concurrency: int, unique_prompts: int, seed: int) -> Dict:
+    service = get_ai_followup_service()
+    prompts = build_prompts(unique_prompts, seed)
+    rng = random.Random(seed)
+    workload = [rng.choice(prompts) for _ in range(requests)]
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = Counter()
+    providers = Counter()
+    
+    async def one(prompt: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                generation = await service._generate_followup(prompt)
+                if generation:
+                    outcomes["ai_generated"] += 1
+                    providers[generation[1]["name"]] += 1
+                else:
+                    outcomes["rate_limited_fallback"] += 1
+            except Exception:
+                outcomes["default_fallback"] += 1
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(prompt) for prompt in workload))
+    duration = time.perf_counter() - start
+    
+    ordered = sorted(latencies)
+    return {
+        "duration": duration,
+        "throughput": requests / duration,
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "outcomes": dict(outcomes),
+        "providers": dict(providers),
+        "metrics": service.get_generation_metrics()
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline follow-up generation benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--unique-prompts", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=int(os.environ["MOCK_SEED"]))
+    args = parser.parse_args()
+    
+    initialize_rate_limiters()
+    initialize_quality_scorer()
+    initialize_ai_service()
+    
+    print("🚀 Offline Follow-up Generation Benchmark")
+    print("=" * 60)
+    print(f"Requests: {args.requests} | Concurrency: {args.concurrency} | "
+          f"Unique prompts: {args.unique_prompts} | Seed: {args.seed}")
+    
+    result = await run(args.requests, args.concurrency, args.unique_prompts, args.seed)
+    
+    print(f"\n⏱️ Duration: {result['duration']:.2f}s ({result['throughput']:.1f} req/s)")
+    print(f"   Mean: {result['mean_ms']:.0f} ms")
+    print(f"   P50:  {result['p50_ms']:.0f} ms")
+    print(f"   P95:  {result['p95_ms']:.0f} ms")
+    print(f"   P99:  {result['p99_ms']:.0f} ms")
+    
+    print("\n📊 Outcomes:")
+    for outcome, count in sorted(result["outcomes"].items()):
+        print(f"   {outcome}: {count} ({count / args.requests * 100:.1f}%)")
+    
+    print("\n🤖 Providers:")
+    for provider, count in sorted(result["providers"].items()):
+        print(f"   {provider}: {count}")
+    
+    metrics = result["metrics"]
+    print("\n🔁 Retries:", {k: v for k, v in metrics["retries"].items() if k != "budget"})
+    print("🔗 Single-flight:", {k: metrics["single_flight"][k] for k in ("upstream_calls", "coalesced_calls")})
+    if metrics["batching"]["enabled"]:
+        print("📦 Batching:", {k: metrics["batching"][k] for k in ("batches_sent", "batched_requests", "single_requests")})
+    print("🧩 Parsing:", {k: metrics["parsing"][k] for k in ("responses_parsed", "padding_rate_percentage")})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
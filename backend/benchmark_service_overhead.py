@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+AI Service Overhead Benchmark
+
+Measures the per-request cost of the get_ai_service dependency used by
+/api/work-updates, /api/followups/start and /api/reports/weekly:
+
+1. Per-request construction (the old behaviour): a new AIFollowupService,
+   Config, AIProviderManager and AIClientWrapper/GenerativeModel set per call
+2. App-scoped service (the current behaviour): the warm instance created in
+   the lifespan hook
+
+No network calls or database connection are needed - dummy API keys are used
+and nothing is sent to the providers.
+"""
+
+import os
+
+# Dummy keys so the benchmark never touches real credentials or quota
+os.environ["GOOGLE_API_KEY_1"] = "benchmark-gemini-key-1"
+os.environ["GOOGLE_API_KEY_2"] = "benchmark-gemini-key-2"
+os.environ["GROQ_API_KEY"] = "benchmark-groq-key"
+os.environ["WEEKLY_REPORT_API_KEY"] = "benchmark-weekly-key"
+
+import asyncio
+import logging
+import statistics
+import time
+from typing import Callable, Dict, List
+
+logging.disable(logging.CRITICAL)
+
+from rate_limiter import initialize_rate_limiters
+from quality_score import initialize_quality_scorer
+from ai_service import AIFollowupService, initialize_ai_service, get_ai_followup_service
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize timing samples in microseconds"""
+    ordered = sorted(samples)
+    return {
+        "mean_us": statistics.mean(ordered) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p99_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6,
+    }
+
+
+async def measure(factory: Callable[[], AIFollowupService], iterations: int) -> Dict[str, float]:
+    """Time how long the dependency takes to hand out a service"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        service = factory()
+        samples.append(time.perf_counter() - start)
+        # Build a prompt the way a request would, so both paths do equal work
+        service._build_ai_prompt("CURRENT WORK UPDATE:\nWork Description: Fixed bugs\n---", "", [])
+    return summarize(samples)
+
+
+async def main(iterations: int = 200):
+    initialize_rate_limiters()
+    initialize_quality_scorer()
+    initialize_ai_service()
+    
+    print("🚀 AI Service Overhead Benchmark")
+    print("=" * 60)
+    
+    per_request = await measure(AIFollowupService, iterations)
+    app_scoped = await measure(get_ai_followup_service, iterations)
+    
+    for label, result in (("Per-request construction", per_request), ("App-scoped service", app_scoped)):
+        print(f"\n{label}:")
+        print(f"   Mean: {result['mean_us']:.1f} µs")
+        print(f"   P50:  {result['p50_us']:.1f} µs")
+        print(f"   P99:  {result['p99_us']:.1f} µs")
+    
+    saved = per_request["mean_us"] - app_scoped["mean_us"]
+    print(f"\n📊 Overhead removed per request: {saved:.1f} µs (mean over {iterations} requests)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
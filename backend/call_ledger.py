@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo import ASCENDING
+from config import Config
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+class CallLedger:
+    """
+    Durable record of AI provider calls
+    
+    Calls are queued in memory and written to Mongo in batches by a
+    background task, so recording never waits on the database. Entries
+    expire through a TTL index. If the queue is full (e.g. Mongo is
+    unreachable) the oldest unwritten entries are dropped and counted.
+    """
+    
+    def __init__(
+        self,
+        collection_name: str = "ai_call_ledger",
+        ttl_days: float = 14,
+        flush_interval: float = 5.0,
+        batch_size: int = 200,
+        max_queue: int = 5000
+    ):
+        self.collection_name = collection_name
+        self.ttl_days = ttl_days
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        
+        self._queue: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+    
+    @property
+    def collection(self):
+        return get_database()[self.collection_name]
+    
+    async def setup_indexes(self):
+        """Create the TTL index (entry expiry) and the provider/time index used by aggregation"""
+        await self.collection.create_index(
+            "ts",
+            expireAfterSeconds=int(self.ttl_days * 86400),
+            name="ledger_ts_ttl"
+        )
+        await self.collection.create_index([("key", ASCENDING), ("ts", ASCENDING)], name="ledger_key_ts")
+        logger.info(f"AI call ledger ready ({self.collection_name}, entries expire after {self.ttl_days} days)")
+    
+    def start(self):
+        """Start the background writer"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the background writer and write what is still queued"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+    
+    def record(
+        self,
+        provider: str,
+        key_name: str,
+        purpose: str,
+        outcome: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        response_tokens: int = 0,
+        fallback: bool = False,
+        model: Optional[str] = None,
+        status_code: Optional[int] = None
+    ):
+        """Queue one call for writing (never blocks)"""
+        entry = {
+            "ts": datetime.utcnow(),
+            "provider": provider,
+            "key": key_name,
+            "purpose": purpose,
+            "model": model,
+            "outcome": outcome,
+            "statusCode": status_code,
+            "latencyMs": round(latency * 1000, 1),
+            "promptTokens": prompt_tokens,
+            "responseTokens": response_tokens,
+            "fallback": fallback
+        }
+        
+        self._queue.append(entry)
+        self.recorded += 1
+        if len(self._queue) > self.max_queue:
+            overflow = len(self._queue) - self.max_queue
+            del self._queue[:overflow]
+            self.dropped += overflow
+    
+    async def flush(self):
+        """Write queued entries to Mongo"""
+        while self._queue:
+            batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+            except Exception as e:
+                # Put the batch back; the queue cap bounds memory if Mongo stays down
+                self.write_errors += 1
+                self._queue[:0] = batch
+                logger.warning(f"Failed to write {len(batch)} AI call ledger entries: {e}")
+                return
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    async def aggregate(self, hours: int = 24, purpose: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per key and hour: call counts by outcome, latency percentiles and token totals
+        
+        Percentiles are computed from the hour's latencies after grouping in Mongo.
+        """
+        match: Dict[str, Any] = {"ts": {"$gte": datetime.utcnow() - timedelta(hours=hours)}}
+        if purpose:
+            match["purpose"] = purpose
+        
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "key": "$key",
+                    "provider": "$provider",
+                    "hour": {"$dateToString": {"format": "%Y-%m-%dT%H:00:00Z", "date": "$ts"}}
+                },
+                "calls": {"$sum": 1},
+                "outcomes": {"$push": "$outcome"},
+                "latencies": {"$push": "$latencyMs"},
+                "promptTokens": {"$sum": "$promptTokens"},
+                "responseTokens": {"$sum": "$responseTokens"},
+                "fallbackCalls": {"$sum": {"$cond": ["$fallback", 1, 0]}}
+            }},
+            {"$sort": {"_id.hour": 1, "_id.key": 1}}
+        ]
+        
+        results = []
+        async for group in self.collection.aggregate(pipeline):
+            latencies = sorted(group["latencies"])
+            outcomes: Dict[str, int] = defaultdict(int)
+            for outcome in group["outcomes"]:
+                outcomes[outcome] += 1
+            
+            results.append({
+                "hour": group["_id"]["hour"],
+                "key": group["_id"]["key"],
+                "provider": group["_id"]["provider"],
+                "calls": group["calls"],
+                "outcomes": dict(outcomes),
+                "fallback_calls": group["fallbackCalls"],
+                "latency_ms": {
+                    "p50": percentile(latencies, 50),
+                    "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99),
+                    "max": latencies[-1] if latencies else None
+                },
+                "prompt_tokens": group["promptTokens"],
+                "response_tokens": group["responseTokens"]
+            })
+        return results
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "recorded": self.recorded,
+            "written": self.written,
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "write_errors": self.write_errors
+        }
+
+def percentile(ordered: List[float], value: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+# Global call ledger (None until initialized, e.g. in offline benchmarks)
+call_ledger: Optional[CallLedger] = None
+
+async def initialize_call_ledger() -> Optional[CallLedger]:
+    """Create the call ledger, its indexes and background writer"""
+    global call_ledger
+    
+    if not Config.CALL_LEDGER_ENABLED:
+        logger.info("AI call ledger disabled")
+        return None
+    
+    call_ledger = CallLedger(
+        collection_name=Config.CALL_LEDGER_COLLECTION,
+        ttl_days=Config.CALL_LEDGER_TTL_DAYS,
+        flush_interval=Config.CALL_LEDGER_FLUSH_SECONDS
+    )
+    try:
+        await call_ledger.setup_indexes()
+    except Exception as e:
+        logger.warning(f"Failed to create AI call ledger indexes: {e}")
+    call_ledger.start()
+    return call_ledger
+
+async def close_call_ledger():
+    """Write remaining entries and stop the ledger"""
+    global call_ledger
+    
+    if call_ledger is not None:
+        await call_ledger.stop()
+        call_ledger = None
+
+def get_call_ledger() -> Optional[CallLedger]:
+    return call_ledger
+
+def record_call(**kwargs):
+    """Record a provider call if the ledger is running"""
+    if call_ledger is not None:
+        call_ledger.record(**kwargs)
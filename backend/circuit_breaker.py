@@ -0,0 +1,197 @@
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class ProviderCircuitBreaker:
+    """
+    Circuit breaker and health score for one AI provider key
+    
+    - CLOSED: requests flow; outcomes are tracked over a sliding window
+    - OPEN: requests are skipped after repeated failures or a high error rate
+    - HALF_OPEN: after the cool-down a limited number of probe requests are
+      let through; a success closes the circuit, a failure re-opens it
+    
+    Only availability failures (5xx, timeouts, connection errors) count;
+    429s are left to the learned rate limit and content errors are ignored.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 10,
+        open_seconds: float = 30.0,
+        half_open_max_probes: int = 1,
+        slow_call_seconds: float = 10.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_probes = half_open_max_probes
+        self.slow_call_seconds = slow_call_seconds
+        
+        # Recent outcomes: (success, latency_seconds)
+        self.outcomes = deque(maxlen=window_size)
+        self.consecutive_failures = 0
+        
+        self.state = CircuitState.CLOSED
+        self.opened_at: Optional[float] = None
+        self.probes_in_flight = 0
+        self.last_probe_at: Optional[float] = None
+        self.times_opened = 0
+    
+    def _refresh_state(self, current_time: float):
+        """Move OPEN to HALF_OPEN once the cool-down has passed"""
+        if self.state == CircuitState.OPEN and current_time - self.opened_at >= self.open_seconds:
+            self.state = CircuitState.HALF_OPEN
+            self.probes_in_flight = 0
+            logger.info(f"Circuit for {self.name} half-open - probing provider")
+        
+        # A probe that never reported back (e.g. cancelled) frees its slot after a cool-down
+        elif (self.state == CircuitState.HALF_OPEN and self.probes_in_flight
+              and current_time - self.last_probe_at >= self.open_seconds):
+            self.probes_in_flight = 0
+    
+    def is_available(self) -> bool:
+        """Check whether a request could be sent now (does not take a probe slot)"""
+        self._refresh_state(time.time())
+        
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.HALF_OPEN:
+            return self.probes_in_flight < self.half_open_max_probes
+        return False
+    
+    def allow_request(self) -> bool:
+        """Check and, in HALF_OPEN, take one of the probe slots"""
+        if not self.is_available():
+            return False
+        
+        if self.state == CircuitState.HALF_OPEN:
+            self.probes_in_flight += 1
+            self.last_probe_at = time.time()
+        return True
+    
+    def record_success(self, latency: float):
+        """Record a successful call"""
+        self.outcomes.append((True, latency))
+        self.consecutive_failures = 0
+        
+        if self.state == CircuitState.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self._close()
+    
+    def record_failure(self, latency: Optional[float] = None):
+        """Record a failed call and open the circuit if thresholds are crossed"""
+        self.outcomes.append((False, latency))
+        self.consecutive_failures += 1
+        
+        if self.state == CircuitState.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self._open("half-open probe failed")
+            return
+        
+        if self.state == CircuitState.CLOSED:
+            if self.consecutive_failures >= self.failure_threshold:
+                self._open(f"{self.consecutive_failures} consecutive failures")
+            elif len(self.outcomes) >= self.min_calls and self.error_rate() >= self.error_rate_threshold:
+                self._open(f"error rate {self.error_rate() * 100:.0f}%")
+    
+    def record_ignored(self):
+        """Record a call that says nothing about availability (429, bad content, cancelled) - only frees its probe slot"""
+        if self.state == CircuitState.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+    
+    def _open(self, reason: str):
+        self.state = CircuitState.OPEN
+        self.opened_at = time.time()
+        self.times_opened += 1
+        logger.warning(f"🔌 Circuit for {self.name} OPEN ({reason}) - "
+                      f"skipping provider for {self.open_seconds:.0f}s")
+    
+    def _close(self):
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.outcomes.clear()
+        logger.info(f"Circuit for {self.name} closed - provider healthy again")
+    
+    def error_rate(self) -> float:
+        """Failure ratio over the sliding window"""
+        if not self.outcomes:
+            return 0.0
+        failures = sum(1 for success, _ in self.outcomes if not success)
+        return failures / len(self.outcomes)
+    
+    def average_latency(self) -> Optional[float]:
+        """Average latency of successful calls in the window"""
+        latencies = [latency for success, latency in self.outcomes if success and latency is not None]
+        if not latencies:
+            return None
+        return sum(latencies) / len(latencies)
+    
+    def health_score(self) -> float:
+        """0-100 score combining success rate and latency (100 = healthy and fast)"""
+        if self.state == CircuitState.OPEN:
+            return 0.0
+        
+        score = (1 - self.error_rate()) * 100
+        average_latency = self.average_latency()
+        if average_latency and average_latency > self.slow_call_seconds:
+            score *= self.slow_call_seconds / average_latency
+        return round(score, 1)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get breaker state for status endpoints"""
+        current_time = time.time()
+        self._refresh_state(current_time)
+        
+        retry_in = 0.0
+        if self.state == CircuitState.OPEN:
+            retry_in = max(0.0, self.open_seconds - (current_time - self.opened_at))
+        
+        average_latency = self.average_latency()
+        
+        return {
+            "state": self.state,
+            "health_score": self.health_score(),
+            "error_rate_percentage": round(self.error_rate() * 100, 1),
+            "average_latency_seconds": round(average_latency, 3) if average_latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "calls_in_window": len(self.outcomes),
+            "times_opened": self.times_opened,
+            "half_open_probe_in": round(retry_in, 1)
+        }
+
+# Global breaker registry (one breaker per provider key name)
+circuit_breakers: Dict[str, ProviderCircuitBreaker] = {}
+
+def get_circuit_breaker(provider_name: str) -> ProviderCircuitBreaker:
+    """Get the circuit breaker for a provider, creating it from Config on first use"""
+    breaker = circuit_breakers.get(provider_name)
+    if breaker is None:
+        breaker = ProviderCircuitBreaker(
+            provider_name,
+            failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+            error_rate_threshold=Config.CIRCUIT_ERROR_RATE_THRESHOLD,
+            window_size=Config.CIRCUIT_WINDOW_SIZE,
+            min_calls=Config.CIRCUIT_MIN_CALLS,
+            open_seconds=Config.CIRCUIT_OPEN_SECONDS,
+            half_open_max_probes=Config.CIRCUIT_HALF_OPEN_MAX_PROBES,
+            slow_call_seconds=Config.CIRCUIT_SLOW_CALL_SECONDS
+        )
+        circuit_breakers[provider_name] = breaker
+    return breaker
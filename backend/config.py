@@ -1,6 +1,7 @@
 import os
+import re
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 load_dotenv()
 
@@ -10,13 +11,26 @@ class Config:
     DATABASE_NAME = os.getenv("DATABASE_NAME", "intern_progress")
     
     # AI Provider Configuration
-    # Gemini API Keys (2 keys)
+    # Gemini and Groq keys are discovered from GOOGLE_API_KEY_<n> and
+    # GROQ_API_KEY / GROQ_API_KEY_<n>; each key can set <KEY VAR>_RATE_LIMIT,
+    # <KEY VAR>_TOKENS_PER_MINUTE, <KEY VAR>_REQUESTS_PER_DAY, <KEY VAR>_MODEL
+    # and (Gemini) <KEY VAR>_MAX_CONCURRENCY
     GOOGLE_API_KEY_1 = os.getenv("GOOGLE_API_KEY_1")
     GOOGLE_API_KEY_2 = os.getenv("GOOGLE_API_KEY_2")
-    
-    # Groq API Key (1 key)
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     
+    # Default models and per-key requests per minute by provider type
+    GEMINI_DEFAULT_MODEL = os.getenv("GEMINI_DEFAULT_MODEL", "gemini-2.0-flash")
+    GROQ_DEFAULT_MODEL = os.getenv("GROQ_DEFAULT_MODEL", "llama-3.3-70b-versatile")
+    GEMINI_RATE_LIMIT_PER_MINUTE = int(os.getenv("GEMINI_RATE_LIMIT_PER_MINUTE", "15"))
+    GROQ_RATE_LIMIT_PER_MINUTE = int(os.getenv("GROQ_RATE_LIMIT_PER_MINUTE", "30"))
+    HUGGINGFACE_RATE_LIMIT_PER_MINUTE = int(os.getenv("HUGGINGFACE_RATE_LIMIT_PER_MINUTE", "10"))
+    # Per-key tokens per minute and requests per day (0 = not tracked); other types via <TYPE>_TOKENS_PER_MINUTE etc.
+    GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+    GEMINI_REQUESTS_PER_DAY = int(os.getenv("GEMINI_REQUESTS_PER_DAY", "1500"))
+    GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "12000"))
+    GROQ_REQUESTS_PER_DAY = int(os.getenv("GROQ_REQUESTS_PER_DAY", "1000"))
+    
     # Weekly Report API Key  
     WEEKLY_REPORT_API_KEY = os.getenv("WEEKLY_REPORT_API_KEY")
     
@@ -26,53 +40,261 @@ class Config:
     # Rate limiting configuration
     RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "12"))
     
+    # Where rate-limit windows live: "memory" (per process) or "mongo" (shared by all workers and replicas)
+    RATE_LIMITER_BACKEND = os.getenv("RATE_LIMITER_BACKEND", "memory")
+    RATE_LIMITER_COLLECTION = os.getenv("RATE_LIMITER_COLLECTION", "rate_limiter_windows")
+    # Per-key limits learned from 429s (AIMD): cut by DECREASE_FACTOR on a 429, +INCREASE_STEP/min
+    # per INCREASE_INTERVAL of successful calls, up to MAX_FACTOR x the configured limit
+    ADAPTIVE_LIMITS_ENABLED = os.getenv("ADAPTIVE_LIMITS_ENABLED", "True").lower() == "true"
+    ADAPTIVE_LIMIT_DECREASE_FACTOR = float(os.getenv("ADAPTIVE_LIMIT_DECREASE_FACTOR", "0.5"))
+    ADAPTIVE_LIMIT_INCREASE_STEP = float(os.getenv("ADAPTIVE_LIMIT_INCREASE_STEP", "1"))
+    ADAPTIVE_LIMIT_INCREASE_INTERVAL_SECONDS = float(os.getenv("ADAPTIVE_LIMIT_INCREASE_INTERVAL_SECONDS", "60"))
+    ADAPTIVE_LIMIT_DECREASE_COOLDOWN_SECONDS = float(os.getenv("ADAPTIVE_LIMIT_DECREASE_COOLDOWN_SECONDS", "10"))
+    ADAPTIVE_LIMIT_MIN_PER_MINUTE = float(os.getenv("ADAPTIVE_LIMIT_MIN_PER_MINUTE", "1"))
+    ADAPTIVE_LIMIT_MAX_FACTOR = float(os.getenv("ADAPTIVE_LIMIT_MAX_FACTOR", "1.0"))
+    
+    # How long a follow-up waits in line for a provider slot when every key is busy (0 = no waiting)
+    FOLLOWUP_SLOT_WAIT_SECONDS = float(os.getenv("FOLLOWUP_SLOT_WAIT_SECONDS", "2"))
+    # Back-to-back calls allowed per key, as a share of its per-minute limit (0 = evenly spaced calls);
+    # the rest of the minute refills more slowly, so no rolling minute exceeds the limit
+    RATE_LIMITER_BURST_FRACTION = float(os.getenv("RATE_LIMITER_BURST_FRACTION", "0.25"))
+    # Completion tokens reserved per call before the provider reports actual usage
+    QUOTA_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("QUOTA_COMPLETION_TOKENS_ESTIMATE", "300"))
+    # Daily quotas reset at midnight in this UTC offset (Gemini: Pacific time)
+    QUOTA_DAY_RESET_UTC_OFFSET_HOURS = float(os.getenv("QUOTA_DAY_RESET_UTC_OFFSET_HOURS", "-8"))
+    # Release each key's daily requests evenly over working hours (server local time) instead of first come first served
+    QUOTA_PACING_ENABLED = os.getenv("QUOTA_PACING_ENABLED", "False").lower() == "true"
+    QUOTA_WORKDAY_START_HOUR = float(os.getenv("QUOTA_WORKDAY_START_HOUR", "9"))
+    QUOTA_WORKDAY_END_HOUR = float(os.getenv("QUOTA_WORKDAY_END_HOUR", "18"))
+    QUOTA_PACING_BURST_FRACTION = float(os.getenv("QUOTA_PACING_BURST_FRACTION", "0.05"))
+    
+    # Shared HTTP connection pool for provider calls
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+    
+    # Gemini SDK calls run on a bounded thread pool, capped per API key
+    GEMINI_EXECUTOR_MAX_WORKERS = int(os.getenv("GEMINI_EXECUTOR_MAX_WORKERS", "16"))
+    GEMINI_MAX_CONCURRENCY_PER_KEY = int(os.getenv("GEMINI_MAX_CONCURRENCY_PER_KEY", "4"))
+    WEEKLY_REPORT_MAX_CONCURRENCY = int(os.getenv("WEEKLY_REPORT_MAX_CONCURRENCY", "2"))
+    
+    # /api/followups/start answers with default questions if AI questions take longer
+    # than this (0 = wait for the AI); late questions upgrade the session if still unanswered
+    FOLLOWUP_LATENCY_BUDGET_SECONDS = float(os.getenv("FOLLOWUP_LATENCY_BUDGET_SECONDS", "4"))
+    
+    # Hedged follow-up generation (second provider if the first is slow)
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "False").lower() == "true"
+    HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "3.0"))
+    HEDGE_DELAY_PERCENTILE = float(os.getenv("HEDGE_DELAY_PERCENTILE", "90"))
+    HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "10"))
+    LATENCY_WINDOW_SIZE = int(os.getenv("LATENCY_WINDOW_SIZE", "100"))
+    
+    # Stream follow-up generation and stop once three questions are parsed
+    STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "True").lower() == "true"
+    
+    # Ask providers for JSON follow-up questions (response schema / JSON mode);
+    # takes precedence over streaming
+    STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "False").lower() == "true"
+    
+    # Prompt-size-aware model routing (rules: JSON, see model_router.DEFAULT_ROUTING_RULES)
+    MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "False").lower() == "true"
+    MODEL_ROUTING_RULES = os.getenv("MODEL_ROUTING_RULES")
+    
+    # Follow-up prompt compaction: recent history is fitted into a token budget
+    # (override per provider type with e.g. GROQ_HISTORY_TOKEN_BUDGET)
+    PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", "600"))
+    PROMPT_FIELD_MAX_TOKENS = int(os.getenv("PROMPT_FIELD_MAX_TOKENS", "80"))
+    
+    # Cache of generated follow-up questions: in-process LRU plus a shared Mongo tier.
+    # The key is the normalized update and yesterday's plans plus the N most recent history entries (0 = none);
+    # per-intern scoping only serves cached questions back to the intern they were generated for
+    FOLLOWUP_CACHE_ENABLED = os.getenv("FOLLOWUP_CACHE_ENABLED", "True").lower() == "true"
+    FOLLOWUP_CACHE_TTL_SECONDS = float(os.getenv("FOLLOWUP_CACHE_TTL_SECONDS", "21600"))
+    FOLLOWUP_CACHE_MAX_ENTRIES = int(os.getenv("FOLLOWUP_CACHE_MAX_ENTRIES", "1000"))
+    FOLLOWUP_CACHE_SHARED_ENABLED = os.getenv("FOLLOWUP_CACHE_SHARED_ENABLED", "True").lower() == "true"
+    FOLLOWUP_CACHE_COLLECTION = os.getenv("FOLLOWUP_CACHE_COLLECTION", "followup_question_cache")
+    FOLLOWUP_CACHE_HISTORY_DEPTH = int(os.getenv("FOLLOWUP_CACHE_HISTORY_DEPTH", "0"))
+    FOLLOWUP_CACHE_PER_INTERN = os.getenv("FOLLOWUP_CACHE_PER_INTERN", "False").lower() == "true"
+    
+    # Identical concurrent follow-up prompts share one provider call
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+    
+    # Micro-batching: follow-up requests arriving within the window share one provider call
+    FOLLOWUP_BATCHING_ENABLED = os.getenv("FOLLOWUP_BATCHING_ENABLED", "False").lower() == "true"
+    FOLLOWUP_BATCH_WINDOW_MS = float(os.getenv("FOLLOWUP_BATCH_WINDOW_MS", "200"))
+    FOLLOWUP_BATCH_MAX_SIZE = int(os.getenv("FOLLOWUP_BATCH_MAX_SIZE", "5"))
+    
+    # /api/ai/test connectivity checks (cheap metadata probes, cached and refreshed in the background)
+    PROVIDER_PROBE_TTL_SECONDS = float(os.getenv("PROVIDER_PROBE_TTL_SECONDS", "60"))
+    PROVIDER_PROBE_REFRESH_SECONDS = float(os.getenv("PROVIDER_PROBE_REFRESH_SECONDS", "30"))  # 0 = no background refresh
+    PROVIDER_PROBE_TIMEOUT_SECONDS = float(os.getenv("PROVIDER_PROBE_TIMEOUT_SECONDS", "5"))
+    
+    # Persistent ledger of AI provider calls (Mongo collection, entries expire via TTL index)
+    CALL_LEDGER_ENABLED = os.getenv("CALL_LEDGER_ENABLED", "True").lower() == "true"
+    CALL_LEDGER_COLLECTION = os.getenv("CALL_LEDGER_COLLECTION", "ai_call_ledger")
+    CALL_LEDGER_TTL_DAYS = float(os.getenv("CALL_LEDGER_TTL_DAYS", "14"))
+    CALL_LEDGER_FLUSH_SECONDS = float(os.getenv("CALL_LEDGER_FLUSH_SECONDS", "5"))
+    
+    # Per-provider circuit breaker
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_ERROR_RATE_THRESHOLD = float(os.getenv("CIRCUIT_ERROR_RATE_THRESHOLD", "0.5"))
+    CIRCUIT_WINDOW_SIZE = int(os.getenv("CIRCUIT_WINDOW_SIZE", "20"))
+    CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+    CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    CIRCUIT_HALF_OPEN_MAX_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_PROBES", "1"))
+    CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "10"))
+    
+    # Retry with exponential backoff for provider calls
+    # (override per provider type with e.g. GROQ_RETRY_MAX_ATTEMPTS)
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+    RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "4"))
+    RETRY_MAX_RETRY_AFTER_SECONDS = float(os.getenv("RETRY_MAX_RETRY_AFTER_SECONDS", "10"))
+    RETRY_MAX_TOTAL_SECONDS = float(os.getenv("RETRY_MAX_TOTAL_SECONDS", "15"))
+    
+    # Global retry budget: retries allowed = min per second + ratio of requests
+    RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+    RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "0.1"))
+    RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("RETRY_BUDGET_WINDOW_SECONDS", "10"))
+    
+    # Self-hosted / OpenAI-compatible chat completions server (e.g. http://localhost:8000/v1)
+    OPENAI_COMPATIBLE_BASE_URL = os.getenv("OPENAI_COMPATIBLE_BASE_URL")
+    OPENAI_COMPATIBLE_API_KEY = os.getenv("OPENAI_COMPATIBLE_API_KEY", "not-needed")
+    OPENAI_COMPATIBLE_MODEL = os.getenv("OPENAI_COMPATIBLE_MODEL", "llama-3.1-8b-instruct")
+    OPENAI_COMPATIBLE_NAME = os.getenv("OPENAI_COMPATIBLE_NAME", "OpenAI_Compatible")
+    OPENAI_COMPATIBLE_RATE_LIMIT_PER_MINUTE = int(os.getenv("OPENAI_COMPATIBLE_RATE_LIMIT_PER_MINUTE", "0"))  # 0 = uncapped
+    
+    # Mock AI providers for offline benchmarking (no API keys or network needed)
+    MOCK_PROVIDER_COUNT = int(os.getenv("MOCK_PROVIDER_COUNT", "0"))
+    MOCK_PROVIDERS_ONLY = os.getenv("MOCK_PROVIDERS_ONLY", "False").lower() == "true"
+    MOCK_LATENCY_MEDIAN_MS = float(os.getenv("MOCK_LATENCY_MEDIAN_MS", "800"))
+    MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.4"))
+    MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0.0"))
+    MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0.0"))
+    MOCK_RETRY_AFTER_SECONDS = float(os.getenv("MOCK_RETRY_AFTER_SECONDS", "1.0"))
+    MOCK_RATE_LIMIT_PER_MINUTE = int(os.getenv("MOCK_RATE_LIMIT_PER_MINUTE", "60"))
+    MOCK_SEED = os.getenv("MOCK_SEED")
+    MOCK_RESPONSES_FILE = os.getenv("MOCK_RESPONSES_FILE")
+    
+    # Record/replay of provider responses: off, record or replay
+    AI_RECORD_MODE = os.getenv("AI_RECORD_MODE", "off").lower()
+    AI_RECORDINGS_FILE = os.getenv("AI_RECORDINGS_FILE", "ai_recordings.jsonl")
+    AI_REPLAY_LATENCY = os.getenv("AI_REPLAY_LATENCY", "False").lower() == "true"
+    
     @property
     def AI_PROVIDERS_CONFIG(self) -> List[Dict[str, str]]:
         """Get list of all available AI provider configurations"""
         providers = []
         
-        # Add Gemini providers
-        if self.GOOGLE_API_KEY_1:
-            providers.append({
-                "provider": "gemini",
-                "api_key": self.GOOGLE_API_KEY_1,
-                "model": "gemini-2.0-flash",
-                "name": "Gemini_1"
-            })
-        
-        if self.GOOGLE_API_KEY_2:
-            providers.append({
-                "provider": "gemini",
-                "api_key": self.GOOGLE_API_KEY_2,
-                "model": "gemini-2.0-flash",
-                "name": "Gemini_2"
-            })
+        # Add Gemini providers (GOOGLE_API_KEY_1 -> Gemini_1, ...)
+        for env_var, suffix, api_key in self.discover_api_keys("GOOGLE_API_KEY"):
+            providers.append(self._key_provider_config(
+                "gemini", env_var, api_key, f"Gemini_{suffix}", self.GEMINI_DEFAULT_MODEL,
+                max_concurrency=int(os.getenv(f"{env_var}_MAX_CONCURRENCY", self.GEMINI_MAX_CONCURRENCY_PER_KEY))
+            ))
         
-        # Add Groq provider
+        # Add Groq providers (GROQ_API_KEY -> Groq_Llama3, GROQ_API_KEY_2 -> Groq_2, ...)
         if self.GROQ_API_KEY:
+            providers.append(self._key_provider_config(
+                "groq", "GROQ_API_KEY", self.GROQ_API_KEY, "Groq_Llama3", self.GROQ_DEFAULT_MODEL
+            ))
+        for env_var, suffix, api_key in self.discover_api_keys("GROQ_API_KEY"):
+            providers.append(self._key_provider_config(
+                "groq", env_var, api_key, f"Groq_{suffix}", self.GROQ_DEFAULT_MODEL
+            ))
+        
+        # Add self-hosted OpenAI-compatible provider
+        if self.OPENAI_COMPATIBLE_BASE_URL:
             providers.append({
-                "provider": "groq",
-                "api_key": self.GROQ_API_KEY,
-                "model": "llama-3.3-70b-versatile",
-                "name": "Groq_Llama3"
+                "provider": "openai_compatible",
+                "api_key": self.OPENAI_COMPATIBLE_API_KEY,
+                "base_url": self.OPENAI_COMPATIBLE_BASE_URL,
+                "model": self.OPENAI_COMPATIBLE_MODEL,
+                "name": self.OPENAI_COMPATIBLE_NAME,
+                "rate_limit": self.OPENAI_COMPATIBLE_RATE_LIMIT_PER_MINUTE
             })
         
         # Fallback to legacy if no providers configured
         if not providers and self.GOOGLE_API_KEY:
+            providers.append(self._key_provider_config(
+                "gemini", "GOOGLE_API_KEY", self.GOOGLE_API_KEY, "Gemini_Legacy", self.GEMINI_DEFAULT_MODEL,
+                max_concurrency=int(os.getenv("GOOGLE_API_KEY_MAX_CONCURRENCY", self.GEMINI_MAX_CONCURRENCY_PER_KEY))
+            ))
+        
+        # Add mock providers (offline benchmarking)
+        if self.MOCK_PROVIDERS_ONLY:
+            providers = []
+        for i in range(1, self.MOCK_PROVIDER_COUNT + 1):
             providers.append({
-                "provider": "gemini",
-                "api_key": self.GOOGLE_API_KEY,
-                "model": "gemini-2.0-flash",
-                "name": "Gemini_Legacy"
+                "provider": "mock",
+                "api_key": "mock",
+                "model": "mock",
+                "name": f"Mock_{i}",
+                "latency_median_ms": self.MOCK_LATENCY_MEDIAN_MS,
+                "latency_sigma": self.MOCK_LATENCY_SIGMA,
+                "error_rate": self.MOCK_ERROR_RATE,
+                "rate_limit_rate": self.MOCK_RATE_LIMIT_RATE,
+                "retry_after_seconds": self.MOCK_RETRY_AFTER_SECONDS,
+                "seed": int(self.MOCK_SEED) if self.MOCK_SEED else None,
+                "responses_file": self.MOCK_RESPONSES_FILE
             })
             
         return providers
     
+    @staticmethod
+    def discover_api_keys(prefix: str) -> List[Tuple[str, str, str]]:
+        """
+        Find numbered API keys in the environment (e.g. GOOGLE_API_KEY_1, _2, ...)
+        
+        Returns (env var, number, key) tuples in numeric order; empty keys are skipped
+        """
+        pattern = re.compile(rf"^{re.escape(prefix)}_(\d+)$")
+        keys = []
+        for env_var, value in os.environ.items():
+            match = pattern.match(env_var)
+            if match and value.strip():
+                keys.append((int(match.group(1)), env_var, value.strip()))
+        return [(env_var, str(number), value) for number, env_var, value in sorted(keys)]
+    
+    @staticmethod
+    def _key_provider_config(
+        provider_type: str, 
+        env_var: str, 
+        api_key: str, 
+        name: str, 
+        default_model: str, 
+        **extra
+    ) -> Dict:
+        """Build a provider entry for one API key, applying its optional per-key settings"""
+        provider = {
+            "provider": provider_type,
+            "api_key": api_key,
+            "model": os.getenv(f"{env_var}_MODEL", default_model),
+            "name": name,
+            **extra
+        }
+        
+        # Per-key requests per minute (0 = uncapped); otherwise the provider type default applies
+        rate_limit = os.getenv(f"{env_var}_RATE_LIMIT")
+        if rate_limit:
+            provider["rate_limit"] = int(rate_limit)
+        
+        # Per-key token and daily quotas (0 = not tracked)
+        tokens_per_minute = os.getenv(f"{env_var}_TOKENS_PER_MINUTE")
+        if tokens_per_minute:
+            provider["tokens_per_minute"] = int(tokens_per_minute)
+        requests_per_day = os.getenv(f"{env_var}_REQUESTS_PER_DAY")
+        if requests_per_day:
+            provider["requests_per_day"] = int(requests_per_day)
+        return provider
+    
     @property
     def GOOGLE_API_KEYS(self) -> List[str]:
         """Get list of Gemini API keys for backward compatibility"""
-        keys = [self.GOOGLE_API_KEY_1, self.GOOGLE_API_KEY_2]
-        valid_keys = [key for key in keys if key]
+        valid_keys = [api_key for _, _, api_key in self.discover_api_keys("GOOGLE_API_KEY")]
         
         if not valid_keys and self.GOOGLE_API_KEY:
             valid_keys = [self.GOOGLE_API_KEY]
@@ -121,6 +343,31 @@ class Config:
     NEGATIVE_SENTIMENT_THRESHOLD = float(os.getenv("NEGATIVE_SENTIMENT_THRESHOLD", "-0.3"))
     POSITIVE_SENTIMENT_THRESHOLD = float(os.getenv("POSITIVE_SENTIMENT_THRESHOLD", "0.2"))
     
+    @classmethod
+    def get_retry_settings(cls, provider_type: str) -> Dict[str, float]:
+        """Retry settings for a provider type, with <TYPE>_RETRY_* env overrides"""
+        prefix = provider_type.upper()
+        return {
+            "max_attempts": int(os.getenv(f"{prefix}_RETRY_MAX_ATTEMPTS", cls.RETRY_MAX_ATTEMPTS)),
+            "base_delay": float(os.getenv(f"{prefix}_RETRY_BASE_DELAY_SECONDS", cls.RETRY_BASE_DELAY_SECONDS)),
+            "max_delay": float(os.getenv(f"{prefix}_RETRY_MAX_DELAY_SECONDS", cls.RETRY_MAX_DELAY_SECONDS)),
+            "max_retry_after": float(os.getenv(f"{prefix}_RETRY_MAX_RETRY_AFTER_SECONDS", cls.RETRY_MAX_RETRY_AFTER_SECONDS))
+        }
+    
+    @classmethod
+    def get_quota_settings(cls, provider_type: str) -> Dict[str, int]:
+        """Per-key token and daily quotas for a provider type (<TYPE>_TOKENS_PER_MINUTE / _REQUESTS_PER_DAY, 0 = not tracked)"""
+        prefix = provider_type.upper()
+        return {
+            "tokens_per_minute": int(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", getattr(cls, f"{prefix}_TOKENS_PER_MINUTE", 0))),
+            "requests_per_day": int(os.getenv(f"{prefix}_REQUESTS_PER_DAY", getattr(cls, f"{prefix}_REQUESTS_PER_DAY", 0)))
+        }
+    
+    @classmethod
+    def get_history_token_budget(cls, provider_type: str) -> int:
+        """Follow-up history token budget for a provider type (<TYPE>_HISTORY_TOKEN_BUDGET override)"""
+        return int(os.getenv(f"{provider_type.upper()}_HISTORY_TOKEN_BUDGET", cls.PROMPT_HISTORY_TOKEN_BUDGET))
+    
     @classmethod
     def validate_config_simplified(cls):
         """Validate required configuration"""
@@ -0,0 +1,92 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+from config import Config
+
+class DailyQuotaClock:
+    """
+    Day boundaries and pacing for requests-per-day quotas
+    
+    The quota day starts at midnight in the provider's reset time zone
+    (reset_utc_offset_hours; Gemini resets at midnight Pacific). With
+    pacing, the day's budget is released evenly over the working hours
+    (server local time) that fall inside the quota day, plus a small
+    burst allowance, so the keys do not run dry by mid-afternoon.
+    """
+    
+    def __init__(
+        self,
+        reset_utc_offset_hours: float = -8,
+        pacing: bool = False,
+        workday_start_hour: float = 9,
+        workday_end_hour: float = 18,
+        pacing_burst_fraction: float = 0.05
+    ):
+        self.reset_tz = timezone(timedelta(hours=reset_utc_offset_hours))
+        self.pacing = pacing
+        self.workday_start_hour = workday_start_hour
+        self.workday_end_hour = workday_end_hour
+        self.pacing_burst_fraction = pacing_burst_fraction
+    
+    def day_bounds(self, now: float) -> Tuple[str, float, float]:
+        """The current quota day's label, start and end (epoch seconds)"""
+        local = datetime.fromtimestamp(now, self.reset_tz)
+        start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.strftime('%Y-%m-%d'), start.timestamp(), (start + timedelta(days=1)).timestamp()
+    
+    def _working_intervals(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Working hours (server local time) between start and end"""
+        intervals = []
+        day = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        while day.timestamp() < end:
+            work_start = (day + timedelta(hours=self.workday_start_hour)).timestamp()
+            work_end = (day + timedelta(hours=self.workday_end_hour)).timestamp()
+            if work_end > start and work_start < end:
+                intervals.append((max(start, work_start), min(end, work_end)))
+            day += timedelta(days=1)
+        return intervals
+    
+    def allowed(self, requests_per_day: int, now: float) -> int:
+        """Requests that may have been made so far today"""
+        if not self.pacing:
+            return requests_per_day
+        
+        _, day_start, day_end = self.day_bounds(now)
+        intervals = self._working_intervals(day_start, day_end)
+        total = sum(end - start for start, end in intervals)
+        if total <= 0:
+            return requests_per_day
+        
+        elapsed = sum(max(0.0, min(end, now) - start) for start, end in intervals)
+        paced = math.ceil(requests_per_day * elapsed / total)
+        return min(requests_per_day, paced + self.pacing_burst(requests_per_day))
+    
+    def pacing_burst(self, requests_per_day: int) -> int:
+        return max(1, round(requests_per_day * self.pacing_burst_fraction))
+    
+    def seconds_until_allowed(self, requests_per_day: int, used: int, now: float) -> float:
+        """Seconds until one more request is allowed (at the latest, the next quota day)"""
+        _, day_start, day_end = self.day_bounds(now)
+        if used < self.allowed(requests_per_day, now):
+            return 0.0
+        if used >= requests_per_day or not self.pacing:
+            return day_end - now
+        
+        # The paced allowance passes `used` once this share of the working time has elapsed
+        intervals = self._working_intervals(day_start, day_end)
+        total = sum(end - start for start, end in intervals)
+        target = total * (used - self.pacing_burst(requests_per_day)) / requests_per_day
+        for start, end in intervals:
+            if target <= end - start:
+                return max(0.0, start + target - now) + 1.0
+            target -= end - start
+        return day_end - now
+
+def create_daily_quota_clock() -> DailyQuotaClock:
+    return DailyQuotaClock(
+        reset_utc_offset_hours=Config.QUOTA_DAY_RESET_UTC_OFFSET_HOURS,
+        pacing=Config.QUOTA_PACING_ENABLED,
+        workday_start_hour=Config.QUOTA_WORKDAY_START_HOUR,
+        workday_end_hour=Config.QUOTA_WORKDAY_END_HOUR,
+        pacing_burst_fraction=Config.QUOTA_PACING_BURST_FRACTION
+    )
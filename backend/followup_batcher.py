@@ -0,0 +1,188 @@
+import re
+import json
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marks the start of each follow-up request inside a batch prompt
+BATCH_ITEM_HEADER = "=== REQUEST {id} ==="
+BATCH_ITEM_PATTERN = re.compile(r'^=== REQUEST (\d+) ===$', re.MULTILINE)
+
+# Response schema for batched questions ({"results": [{"id": 1, "questions": [...]}, ...]})
+BATCH_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "questions": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    }
+                },
+                "required": ["id", "questions"]
+            }
+        }
+    },
+    "required": ["results"]
+}
+
+BATCH_PROMPT_HEADER = """You will receive {count} separate follow-up question requests, one per intern.
+Answer each request independently, following its instructions, but ignore the
+response format given inside the requests. Respond only with JSON in this format:
+{{"results": [{{"id": 1, "questions": ["First question", "Second question", "Third question"]}}, ...]}}
+Include exactly one result per request id, each with exactly {target} questions.
+
+"""
+
+def build_batch_prompt(prompts: List[str], target: int = 3) -> str:
+    """Combine follow-up prompts into one multi-request prompt (ids start at 1)"""
+    items = [
+        f"{BATCH_ITEM_HEADER.format(id=item_id)}\n{prompt.strip()}\n"
+        for item_id, prompt in enumerate(prompts, 1)
+    ]
+    return BATCH_PROMPT_HEADER.format(count=len(prompts), target=target) + "\n".join(items)
+
+def split_batch_response(response: str, count: int, target: int = 3) -> List[Optional[List[str]]]:
+    """
+    Split a batched response back into per-request questions
+    
+    Returns one entry per request, in order; entries the response did not
+    answer with target usable questions are None.
+    """
+    results: List[Optional[List[str]]] = [None] * count
+    try:
+        data = json.loads(response)
+    except ValueError:
+        return results
+    
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        return results
+    
+    for item in data["results"]:
+        if not isinstance(item, dict) or not isinstance(item.get("questions"), list):
+            continue
+        item_id = item.get("id")
+        if not isinstance(item_id, int) or not 1 <= item_id <= count or results[item_id - 1] is not None:
+            continue
+        
+        questions = [
+            question.strip() for question in item["questions"]
+            if isinstance(question, str) and len(question.strip()) > 10
+        ]
+        if len(questions) >= target:
+            results[item_id - 1] = questions[:target]
+    
+    return results
+
+class FollowupBatcher:
+    """
+    Collects follow-up requests for a short window and sends them as one call
+    
+    The first request in a window starts the timer; the batch is flushed
+    when the window ends or max_batch_size requests are waiting. run_batch
+    gets the prompts and returns one result per prompt, or None for
+    prompts it could not answer; those (and whole batches that fail) fall
+    back to run_single. A window holding a single request goes straight to
+    run_single.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[[List[str]], Awaitable[List[Optional[Any]]]],
+        run_single: Callable[[str], Awaitable[Any]],
+        window_seconds: float = 0.2,
+        max_batch_size: int = 5
+    ):
+        self.name = name
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        
+        self.batches_sent = 0
+        self.batched_requests = 0
+        self.single_requests = 0
+        self.split_fallbacks = 0
+        self.failed_batches = 0
+    
+    async def submit(self, prompt: str) -> Any:
+        """Queue a prompt for the current batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.window_seconds, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Send everything waiting as one batch (runs as its own task)"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+    
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        prompts = [prompt for prompt, _ in batch]
+        results: List[Optional[Any]] = [None] * len(batch)
+        
+        if len(batch) > 1:
+            self.batches_sent += 1
+            try:
+                results = await self.run_batch(prompts)
+            except Exception as e:
+                self.failed_batches += 1
+                logger.warning(f"{self.name}: batch of {len(batch)} failed, sending requests singly: {e}")
+            
+            answered = sum(1 for result in results if result is not None)
+            self.batched_requests += answered
+            self.split_fallbacks += len(batch) - answered
+            if answered:
+                logger.info(f"{self.name}: {answered}/{len(batch)} requests answered by one batched call")
+        
+        await asyncio.gather(*(
+            self._resolve(prompt, future, result)
+            for (prompt, future), result in zip(batch, results)
+        ))
+    
+    async def _resolve(self, prompt: str, future: asyncio.Future, result: Optional[Any]):
+        """Complete one request, falling back to a single call if the batch did not answer it"""
+        if result is None:
+            self.single_requests += 1
+            try:
+                result = await self.run_single(prompt)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+        
+        if not future.done():
+            future.set_result(result)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        return {
+            "batches_sent": self.batches_sent,
+            "batched_requests": self.batched_requests,
+            "single_requests": self.single_requests,
+            "split_fallbacks": self.split_fallbacks,
+            "failed_batches": self.failed_batches,
+            "average_batch_size": round(self.batched_requests / self.batches_sent, 2) if self.batches_sent else 0.0,
+            "waiting": len(self._pending)
+        }
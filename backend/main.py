@@ -6,7 +6,7 @@ from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 from bson import ObjectId
 import asyncio
@@ -18,12 +18,14 @@ from database import (
     create_temp_work_update, get_temp_work_update, delete_temp_work_update,
     cleanup_abandoned_temp_updates, get_database_stats, verify_ttl_index
 )
-from ai_service import AIFollowupService
+from ai_service import AIFollowupService, initialize_ai_service, get_ai_followup_service
+from ai_client import initialize_http_client, close_http_client, shutdown_gemini_executor
+from call_ledger import initialize_call_ledger, close_call_ledger, get_call_ledger
 from rate_limiter import initialize_rate_limiters, get_followup_rate_limiter, get_weekly_report_rate_limiter
 from quality_score import initialize_quality_scorer, get_quality_scorer
 from models import (
     GenerateQuestionsRequest, GenerateQuestionsResponse, 
-    FollowupAnswersUpdate, AnalysisResponse, TestAIResponse, 
+    FollowupAnswersUpdate, FollowupQuestionsLock, AnalysisResponse, TestAIResponse, 
     ErrorResponse, WorkUpdate, WorkUpdateCreate, FollowupSession, SessionStatus, WorkStatus,
     QualityAnalysisRequest, QualityAnalysisResponse, WeeklyReportRequest, WeeklyReportResponse,
     SystemHealthResponse, RateLimiterStatusResponse, CleanupStatusResponse
@@ -38,6 +40,7 @@ logger = logging.getLogger(__name__)
 
 # Global cleanup task
 cleanup_task = None
+connection_check_task = None
 
 async def scheduled_cleanup_task():
     """
@@ -72,7 +75,7 @@ async def scheduled_cleanup_task():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global cleanup_task
+    global cleanup_task, connection_check_task
     
  
     try:
@@ -83,6 +86,19 @@ async def lifespan(app: FastAPI):
         initialize_rate_limiters()
         initialize_quality_scorer()
         
+        # Shared connection pool for AI provider calls
+        initialize_http_client()
+        
+        # Durable per-call record of AI provider usage
+        await initialize_call_ledger()
+        
+        # One warm AI service (provider clients, prompt templates) for all requests
+        initialize_ai_service()
+        try:
+            await get_ai_followup_service().question_cache.setup_indexes()
+        except Exception as e:
+            logger.warning(f"Failed to create follow-up question cache index: {e}")
+        
         # Verify TTL index
         ttl_status = await verify_ttl_index()
         if ttl_status:
@@ -94,6 +110,11 @@ async def lifespan(app: FastAPI):
         cleanup_task = asyncio.create_task(scheduled_cleanup_task())
         logger.info("Background cleanup task started")
         
+        # Keep /api/ai/test results warm with cheap background provider probes
+        if Config.PROVIDER_PROBE_REFRESH_SECONDS > 0:
+            connection_check_task = asyncio.create_task(get_ai_followup_service().connection_refresh_loop())
+            logger.info("Background AI connection checks started")
+        
         # Log API key configuration
         key_summary = Config.get_api_key_summary()
         logger.info(f"API Keys configured: {key_summary['followup_keys']} followup, 1 weekly report")
@@ -114,6 +135,16 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             logger.info("Background cleanup task cancelled")
     
+    if connection_check_task:
+        connection_check_task.cancel()
+        try:
+            await connection_check_task
+        except asyncio.CancelledError:
+            logger.info("Background AI connection checks cancelled")
+    
+    await close_call_ledger()
+    await close_http_client()
+    shutdown_gemini_executor()
     await close_mongo_connection()
     logger.info("Application shutdown complete")
 
@@ -135,9 +166,9 @@ app.add_middleware(
 
 # Dependency to get AI service
 async def get_ai_service() -> AIFollowupService:
-    """Get AI service instance"""
+    """Get the app-scoped AI service instance"""
     try:
-        return AIFollowupService()
+        return get_ai_followup_service()
     except Exception as e:
         logger.error(f"Failed to initialize AI service: {e}")
         raise HTTPException(
@@ -426,13 +457,15 @@ async def start_followup_session(
         quality_result = await ai_service.process_work_update_with_quality_check(
             task_description,
             intern_id,
-            today_date
+            today_date,
+            latency_budget=Config.FOLLOWUP_LATENCY_BUDGET_SECONDS
         )
         
         # Get questions from quality result
         followup_data = quality_result.get("followup_data", {})
         questions = followup_data.get("questions", ai_service._get_default_questions())
         question_type = followup_data.get("type", "fallback")
+        pending_generation = quality_result.get("pending_generation")
         
         session_doc = {
             "_id": session_date_id,
@@ -446,9 +479,17 @@ async def start_followup_session(
             "completedAt": None,
             "questionType": question_type,
             "qualityScore": quality_result.get("quality_score", 0),
-            "fallbackUsed": quality_result.get("fallback_used", False)
+            "fallbackUsed": quality_result.get("fallback_used", False),
+            "upgradable": pending_generation is not None
         }
         await followup_collection.replace_one({"_id": session_date_id}, session_doc, upsert=True)
+        
+        if pending_generation is not None:
+            # AI questions missed the latency budget - swap them in when ready, if still unanswered
+            ai_service.schedule_question_upgrade(
+                pending_generation,
+                lambda late_data: upgrade_session_questions(session_date_id, questions, late_data)
+            )
 
         logger.info(f"Follow-up session started for user {intern_id} (type: {question_type}, score: {quality_result.get('quality_score')})")
 
@@ -462,6 +503,8 @@ async def start_followup_session(
             "questionType": question_type,
             "qualityScore": quality_result.get("quality_score", 0),
             "fallbackUsed": quality_result.get("fallback_used", False),
+            "questionsUpgradable": pending_generation is not None,
+            "questionsUrl": f"/api/followup/{session_date_id}/questions",
             "reminder": "Complete within 24 hours before auto-deletion",
             "next_step": f"Submit answers using PUT /api/followup/{session_date_id}/complete"
         }
@@ -475,6 +518,94 @@ async def start_followup_session(
             detail=f"Failed to start follow-up session: {str(e)}"
         )
 
+async def upgrade_session_questions(session_id: str, fallback_questions: List[str], followup_data: dict) -> bool:
+    """
+    Replace a session's default questions with late AI questions
+    
+    Only while the session is still upgradable: the client locks the
+    questions (PUT /api/followup/{id}/questions/lock) as soon as the intern
+    starts answering, and picks up an upgrade by polling
+    GET /api/followup/{id}/questions until then.
+    """
+    db = get_database()
+    followup_collection = db[Config.FOLLOWUP_SESSIONS_COLLECTION]
+    
+    session = await followup_collection.find_one({"_id": session_id}, {"questionType": 1})
+    result = await followup_collection.update_one(
+        {"_id": session_id, "status": SessionStatus.PENDING, "upgradable": True, "questions": fallback_questions},
+        {"$set": {
+            "questions": followup_data["questions"],
+            "answers": [""] * len(followup_data["questions"]),
+            "questionType": followup_data["type"],
+            "fallbackUsed": False,
+            "fallbackQuestions": fallback_questions,
+            "fallbackQuestionType": session.get("questionType", "fallback") if session else "fallback",
+            "upgradable": False,
+            "upgradedAt": datetime.now()
+        }}
+    )
+    return result.modified_count > 0
+
+async def get_owned_session(session_id: str, intern_id: str) -> dict:
+    """Get a follow-up session, checking it belongs to the intern"""
+    db = get_database()
+    session = await db[Config.FOLLOWUP_SESSIONS_COLLECTION].find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Follow-up session not found")
+    
+    if str(session.get("internId")) != str(intern_id):
+        raise HTTPException(
+            status_code=403,
+            detail="Access denied - session belongs to different user"
+        )
+    return session
+
+# Current Follow-up Questions (picks up late AI questions before the intern starts answering)
+@app.get("/api/followup/{session_id}/questions")
+async def get_followup_questions(session_id: str, user_id: str):
+    """Get a session's current questions and whether they may still be upgraded"""
+    try:
+        session = await get_owned_session(session_id, user_id.strip())
+        return {
+            "success": True,
+            "sessionId": session_id,
+            "questions": session.get("questions", []),
+            "questionType": session.get("questionType", "unknown"),
+            "questionsUpgradable": bool(session.get("upgradable")) and session.get("status") == SessionStatus.PENDING
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting follow-up questions: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get follow-up questions: {str(e)}"
+        )
+
+# Lock Follow-up Questions (the intern has started answering the shown questions)
+@app.put("/api/followup/{session_id}/questions/lock")
+async def lock_followup_questions(session_id: str, lock: FollowupQuestionsLock):
+    """Stop late AI questions from replacing the questions the intern is answering"""
+    try:
+        await get_owned_session(session_id, lock.user_id)
+        
+        db = get_database()
+        result = await db[Config.FOLLOWUP_SESSIONS_COLLECTION].update_one(
+            {"_id": session_id, "upgradable": True, "questions": lock.questions},
+            {"$set": {"upgradable": False}}
+        )
+        return {"success": True, "sessionId": session_id, "locked": result.modified_count > 0}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error locking follow-up questions: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to lock follow-up questions: {str(e)}"
+        )
+
 # Complete Follow-up Session
 @app.put("/api/followup/{session_id}/complete")
 async def complete_followup_session(
@@ -504,15 +635,22 @@ async def complete_followup_session(
         daily_records = db[Config.DAILY_RECORDS_COLLECTION]
         
         # Get the follow-up session and verify ownership
-        session = await followup_collection.find_one({"_id": session_id})
-        if not session:
-            raise HTTPException(status_code=404, detail="Follow-up session not found")
+        session = await get_owned_session(session_id, intern_id)
 
-        if str(session.get("internId")) != str(intern_id):
+        # Save the answers next to the questions they were given to: the shown
+        # defaults or the upgraded AI questions (clients that do not send them
+        # only ever showed the questions from the start response)
+        fallback_questions = session.get("fallbackQuestions")
+        answered_questions = answers_update.questions or fallback_questions or session.get("questions", [])
+        if answered_questions not in (session.get("questions"), fallback_questions):
             raise HTTPException(
-                status_code=403,
-                detail="Access denied - session belongs to different user"
+                status_code=409,
+                detail="Answered questions do not match this follow-up session"
             )
+        if answered_questions == session.get("questions"):
+            question_type = session.get("questionType", "unknown")
+        else:
+            question_type = session.get("fallbackQuestionType", "fallback")
 
         # Get the temporary work update
         temp_work_update = await get_temp_work_update(session["tempWorkUpdateId"])
@@ -524,6 +662,9 @@ async def complete_followup_session(
 
         # Complete the follow-up session
         session_update = {
+            "questions": answered_questions,
+            "questionType": question_type,
+            "upgradable": False,
             "answers": answers_update.answers,
             "status": SessionStatus.COMPLETED,
             "completedAt": datetime.now()
@@ -545,7 +686,8 @@ async def complete_followup_session(
             "status": temp_work_update["status"],
             "qualityScore": temp_work_update.get("qualityScore", 0),
             "followupCompleted": True,
-            "questionType": session.get("questionType", "unknown"),
+            "questionType": question_type,
+            "followupQuestions": answered_questions,
             "followupAnswers": answers_update.answers
         }
 
@@ -778,11 +920,10 @@ async def get_rate_limiter_status():
         )
 
 @app.get("/api/ai/test", response_model=TestAIResponse)
-async def test_ai_connections():
-    """Test all AI API keys and connections"""
+async def test_ai_connections(refresh: bool = False, ai_service: AIFollowupService = Depends(get_ai_service)):
+    """Test all AI API keys and connections (cached probe results; refresh=true checks now)"""
     try:
-        ai_service = AIFollowupService()
-        test_results = await ai_service.test_ai_connection()
+        test_results = await ai_service.test_ai_connection(force_refresh=refresh)
         
         return TestAIResponse(
             success=test_results.get("summary", {}).get("overall_status") == "healthy",
@@ -809,6 +950,53 @@ async def test_ai_connections():
             }
         )
 
+@app.get("/api/ai/calls/stats")
+async def get_ai_call_stats(hours: int = 24, purpose: Optional[str] = None):
+    """Per provider key and hour: AI call counts by outcome, latency percentiles and tokens"""
+    call_ledger = get_call_ledger()
+    if call_ledger is None:
+        raise HTTPException(status_code=503, detail="AI call ledger is disabled")
+    
+    try:
+        return {
+            "success": True,
+            "hours": hours,
+            "purpose": purpose,
+            "stats": await call_ledger.aggregate(hours=hours, purpose=purpose),
+            "ledger": call_ledger.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error aggregating AI call ledger: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get AI call stats: {str(e)}"
+        )
+
+@app.get("/api/ai/metrics")
+async def get_ai_generation_metrics(ai_service: AIFollowupService = Depends(get_ai_service)):
+    """
+    Get follow-up generation metrics: single-flight coalescing, batching,
+    latency budget and late upgrades, hedging, streaming, parsing, retries,
+    model routing, prompt compaction, question cache, token usage,
+    recordings and provider health
+    
+    Per-call ledger stats are at /api/ai/calls/stats; rate-limiter slots,
+    the acquire queue and quota headroom are at /api/rate-limiters/status.
+    """
+    try:
+        return {
+            "success": True,
+            "metrics": ai_service.get_generation_metrics(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error getting AI generation metrics: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get AI generation metrics: {str(e)}"
+        )
+
 @app.get("/stats")
 async def get_stats():
     """Get comprehensive database and system statistics"""
@@ -0,0 +1,202 @@
+import json
+import random
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from config import Config
+from followup_batcher import BATCH_ITEM_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Canned follow-up questions; one set is picked per prompt (stable for the same prompt)
+DEFAULT_MOCK_QUESTION_SETS = [
+    [
+        "What steps did you follow to complete today's main task?",
+        "Did anything slow you down or block your progress today?",
+        "What do you plan to work on next?"
+    ],
+    [
+        "How did you check that today's work was working as expected?",
+        "Which part of the task took the most time and why?",
+        "Is there anything you need help with for tomorrow?"
+    ],
+    [
+        "Can you briefly describe how you approached today's task?",
+        "Did today's work match what you planned yesterday?",
+        "What is the next step for this part of the project?"
+    ]
+]
+
+class MockOutcome:
+    OK = "ok"
+    ERROR = "error"
+    RATE_LIMITED = "rate_limited"
+
+class MockProfile:
+    """
+    Deterministic behaviour of a mock AI provider
+    
+    Latency is drawn from a log-normal distribution with the given median and
+    spread (sigma), and failures are injected at the configured rates. With
+    a seed, the same sequence of calls always gets the same latencies,
+    outcomes and responses, so benchmarks are reproducible offline.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        latency_median_ms: float = 800.0,
+        latency_sigma: float = 0.4,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_seconds: float = 1.0,
+        seed: Optional[int] = None,
+        responses_file: Optional[str] = None
+    ):
+        self.name = name
+        self.latency_median_ms = latency_median_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.random = random.Random(f"{seed}:{name}" if seed is not None else None)
+        self.question_sets = self._load_question_sets(responses_file)
+    
+    @classmethod
+    def from_config(cls, provider_config: Dict[str, Any]) -> "MockProfile":
+        return cls(
+            provider_config["name"],
+            latency_median_ms=provider_config.get("latency_median_ms", 800.0),
+            latency_sigma=provider_config.get("latency_sigma", 0.4),
+            error_rate=provider_config.get("error_rate", 0.0),
+            rate_limit_rate=provider_config.get("rate_limit_rate", 0.0),
+            retry_after_seconds=provider_config.get("retry_after_seconds", 1.0),
+            seed=provider_config.get("seed"),
+            responses_file=provider_config.get("responses_file")
+        )
+    
+    @staticmethod
+    def _load_question_sets(responses_file: Optional[str]) -> List[List[str]]:
+        """Load canned question sets (a JSON list of lists of questions) or use the defaults"""
+        if not responses_file:
+            return DEFAULT_MOCK_QUESTION_SETS
+        
+        with open(responses_file, encoding="utf-8") as f:
+            question_sets = json.load(f)
+        logger.info(f"Loaded {len(question_sets)} mock response sets from {responses_file}")
+        return question_sets
+    
+    def sample(self) -> Tuple[float, str]:
+        """Draw the latency (seconds) and outcome of the next call"""
+        latency = self.random.lognormvariate(0, self.latency_sigma) * self.latency_median_ms / 1000
+        
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return latency, MockOutcome.RATE_LIMITED
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, MockOutcome.ERROR
+        return latency, MockOutcome.OK
+    
+    def render(self, prompt: str, json_mode: bool = False) -> str:
+        """Build the response for a prompt, as numbered lines, question JSON or batched question JSON"""
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        questions = self.question_sets[digest[0] % len(self.question_sets)]
+        
+        item_ids = [int(item_id) for item_id in BATCH_ITEM_PATTERN.findall(prompt)]
+        if json_mode and item_ids:
+            return json.dumps({"results": [
+                {"id": item_id, "questions": self.question_sets[(digest[0] + item_id) % len(self.question_sets)]}
+                for item_id in item_ids
+            ]})
+        if json_mode:
+            return json.dumps({"questions": questions})
+        return "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+
+class RecordingStore:
+    """
+    Record/replay of provider prompt -> response pairs
+    
+    - record: live responses to new prompts are appended to a JSONL file
+    - replay: responses are served from the file and providers are never
+      called; prompts without a recording fail
+    """
+    
+    def __init__(self, mode: str = "off", path: str = "ai_recordings.jsonl", replay_latency: bool = False):
+        self.mode = mode
+        self.path = path
+        self.replay_latency = replay_latency
+        self.recordings: Dict[str, Dict[str, Any]] = {}
+        
+        self.replayed = 0
+        self.replay_misses = 0
+        self.recorded = 0
+        
+        if self.mode in ("record", "replay"):
+            self._load()
+    
+    @staticmethod
+    def make_key(prompt: str, json_mode: bool) -> str:
+        return hashlib.sha256(f"{int(json_mode)}:{prompt}".encode("utf-8")).hexdigest()
+    
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recordings[entry["key"]] = entry
+        except FileNotFoundError:
+            logger.warning(f"No AI recordings found at {self.path}")
+        logger.info(f"Loaded {len(self.recordings)} AI recordings from {self.path}")
+    
+    def lookup(self, prompt: str, json_mode: bool) -> Optional[Dict[str, Any]]:
+        """Find the recorded entry for a prompt"""
+        entry = self.recordings.get(self.make_key(prompt, json_mode))
+        if entry is None:
+            self.replay_misses += 1
+        else:
+            self.replayed += 1
+        return entry
+    
+    def record(self, provider_name: str, prompt: str, json_mode: bool, response: str, latency: float):
+        """Append a live prompt -> response pair (the first response per prompt is kept)"""
+        key = self.make_key(prompt, json_mode)
+        if key in self.recordings:
+            return
+        
+        entry = {
+            "key": key,
+            "provider": provider_name,
+            "json_mode": json_mode,
+            "prompt": prompt,
+            "response": response,
+            "latency_seconds": round(latency, 4)
+        }
+        self.recordings[entry["key"]] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.recorded += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "recordings": len(self.recordings),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "replay_misses": self.replay_misses
+        }
+
+# Global recording store
+recording_store: Optional[RecordingStore] = None
+
+def get_recording_store() -> RecordingStore:
+    """Get the record/replay store, creating it from Config on first use"""
+    global recording_store
+    if recording_store is None:
+        recording_store = RecordingStore(
+            mode=Config.AI_RECORD_MODE,
+            path=Config.AI_RECORDINGS_FILE,
+            replay_latency=Config.AI_REPLAY_LATENCY
+        )
+    return recording_store
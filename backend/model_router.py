@@ -0,0 +1,87 @@
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough token estimate: ~4 characters per token for English text
+CHARS_PER_TOKEN = 4
+
+# Per task, tiers are tried in order and the first one the prompt fits in
+# (max_prompt_tokens, null = no limit) picks the model for each provider type.
+# Provider types missing from a tier keep their configured model.
+DEFAULT_ROUTING_RULES = {
+    "followup": [
+        {"max_prompt_tokens": 1500, "models": {"gemini": "gemini-2.0-flash-lite", "groq": "llama-3.1-8b-instant"}},
+        {"max_prompt_tokens": None, "models": {"gemini": "gemini-2.0-flash", "groq": "llama-3.3-70b-versatile"}}
+    ],
+    "weekly": [
+        {"max_prompt_tokens": 8000, "models": {"gemini": "gemini-2.0-flash-lite"}},
+        {"max_prompt_tokens": None, "models": {"gemini": "gemini-2.0-flash"}}
+    ]
+}
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class ModelRouter:
+    """
+    Picks the model for a prompt by task and estimated size
+    
+    Routing only changes the model used on the key the rate limiter already
+    selected, so per-key quotas are unaffected.
+    """
+    
+    def __init__(self, enabled: bool = False, rules: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.enabled = enabled
+        self.rules = rules or DEFAULT_ROUTING_RULES
+        
+        # task -> "provider_type:model" -> count
+        self.decisions: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.estimated_tokens: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  # [total, count]
+    
+    @classmethod
+    def from_config(cls, enabled: bool, rules_json: Optional[str]) -> "ModelRouter":
+        """Build a router from MODEL_ROUTING_ENABLED / MODEL_ROUTING_RULES (JSON)"""
+        rules = None
+        if rules_json:
+            try:
+                rules = json.loads(rules_json)
+            except ValueError as e:
+                logger.error(f"Invalid MODEL_ROUTING_RULES, using defaults: {e}")
+        return cls(enabled=enabled, rules=rules)
+    
+    def route(self, task: str, provider_type: str, prompt: str) -> Optional[str]:
+        """
+        Choose the model for a prompt
+        
+        Returns the model name, or None to use the provider's configured model
+        """
+        tokens = estimate_tokens(prompt)
+        totals = self.estimated_tokens[task]
+        totals[0] += tokens
+        totals[1] += 1
+        
+        model = None
+        if self.enabled:
+            for tier in self.rules.get(task, []):
+                max_tokens = tier.get("max_prompt_tokens")
+                if max_tokens is None or tokens <= max_tokens:
+                    model = tier.get("models", {}).get(provider_type)
+                    break
+        
+        self.decisions[task][f"{provider_type}:{model or 'default'}"] += 1
+        if model:
+            logger.debug(f"Routing {task} prompt (~{tokens} tokens) to {provider_type}:{model}")
+        return model
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "decisions": {task: dict(counts) for task, counts in self.decisions.items()},
+            "average_estimated_prompt_tokens": {
+                task: round(total / count) for task, (total, count) in self.estimated_tokens.items() if count
+            }
+        }
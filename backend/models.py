@@ -76,6 +76,7 @@ class FollowupSession(FollowupSessionCreate):
 class FollowupAnswersUpdate(BaseModel):
     user_id: str = Field(..., description="User/Intern ID for session verification")
     answers: List[str] = Field(..., description="Answers to the follow-up questions")
+    questions: Optional[List[str]] = Field(default=None, description="The questions the answers were given to, as shown")
 
     @validator("user_id")
     def check_user_id_non_empty(cls, v):
@@ -92,6 +93,16 @@ class FollowupAnswersUpdate(BaseModel):
                 raise ValueError(f"Answer {i+1} cannot be empty")
         return [answer.strip() for answer in v]
 
+class FollowupQuestionsLock(BaseModel):
+    user_id: str = Field(..., description="User/Intern ID for session verification")
+    questions: List[str] = Field(..., description="The questions shown to the intern")
+    
+    @validator("user_id")
+    def check_user_id_non_empty(cls, v):
+        if not v or not v.strip():
+            raise ValueError("user_id cannot be empty")
+        return v.strip()
+
 class GenerateQuestionsRequest(BaseModel):
     user_id: str = Field(..., description="User/Intern ID for generating questions")
 
@@ -0,0 +1,105 @@
+import re
+import logging
+from typing import Any, Dict, List
+from model_router import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = ("work", "challenges", "plans")
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at a word boundary, marking the cut with '...'"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    
+    cut = text[:max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:.-") + "..."
+
+def normalize_text(text: str) -> str:
+    """Normalize text for duplicate detection (case, punctuation and spacing ignored)"""
+    return re.sub(r'[\W_]+', ' ', text.lower()).strip()
+
+class HistoryCompactor:
+    """
+    Fits recent work history into a token budget
+    
+    Entries come newest first and are kept in that order of priority. Each
+    field is truncated to max_field_tokens, text already included from a
+    more recent entry (e.g. the same plans repeated every day) is dropped,
+    and entries that no longer fit in the budget are left out.
+    """
+    
+    def __init__(self, token_budget: int = 600, max_field_tokens: int = 80):
+        self.token_budget = token_budget
+        self.max_field_tokens = max_field_tokens
+        
+        self.compactions = 0
+        self.entries_in = 0
+        self.entries_kept = 0
+        self.duplicates_dropped = 0
+        self.over_budget_dropped = 0
+        self.fields_truncated = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+    
+    def compact(self, entries: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Compact history entries ({"date", "work", "challenges", "plans"})
+        
+        Returns the kept entries with truncated, deduplicated fields.
+        """
+        kept = []
+        seen_fields = set()
+        used_tokens = 0
+        
+        for entry in entries:
+            self.tokens_in += sum(estimate_tokens(entry[field]) for field in HISTORY_FIELDS if entry.get(field))
+            
+            fields = {}
+            for field in HISTORY_FIELDS:
+                value = (entry.get(field) or "").strip()
+                normalized = normalize_text(value)
+                if not normalized or normalized in seen_fields:
+                    continue
+                seen_fields.add(normalized)
+                
+                truncated = truncate_to_tokens(value, self.max_field_tokens)
+                if truncated != value:
+                    self.fields_truncated += 1
+                fields[field] = truncated
+            
+            if not fields:
+                self.duplicates_dropped += 1
+                continue
+            
+            cost = estimate_tokens(entry.get("date", "")) + sum(estimate_tokens(value) for value in fields.values())
+            if used_tokens + cost > self.token_budget:
+                self.over_budget_dropped += 1
+                continue
+            
+            used_tokens += cost
+            kept.append({"date": entry.get("date", "Unknown"), **fields})
+        
+        self.compactions += 1
+        self.entries_in += len(entries)
+        self.entries_kept += len(kept)
+        self.tokens_out += used_tokens
+        
+        if len(kept) < len(entries):
+            logger.debug(f"History compacted: kept {len(kept)}/{len(entries)} entries (~{used_tokens} tokens)")
+        return kept
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get compaction statistics"""
+        return {
+            "token_budget": self.token_budget,
+            "max_field_tokens": self.max_field_tokens,
+            "compactions": self.compactions,
+            "entries_in": self.entries_in,
+            "entries_kept": self.entries_kept,
+            "duplicates_dropped": self.duplicates_dropped,
+            "over_budget_dropped": self.over_budget_dropped,
+            "fields_truncated": self.fields_truncated,
+            "estimated_history_tokens_in": self.tokens_in,
+            "estimated_history_tokens_out": self.tokens_out
+        }
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from database import get_database
+from prompt_compaction import normalize_text
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(
+    work_description: str,
+    yesterday_plans: str,
+    history_entries: List[str],
+    intern_id: Optional[str] = None
+) -> str:
+    """
+    Hash the normalized current update, yesterday's plans and the history
+    entries that belong in the key
+    
+    Without intern_id the key is shared, so the same update with the same
+    plans and history hits across interns and days; with it, cached
+    questions are only served back to that intern.
+    """
+    parts = [(intern_id or "").strip(), normalize_text(work_description), normalize_text(yesterday_plans)]
+    parts += [normalize_text(entry) for entry in history_entries]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class QuestionCache:
+    """
+    Two-tier cache of generated follow-up questions
+    
+    - local: in-process LRU with TTL
+    - shared: Mongo collection with a TTL index, shared by all workers
+    
+    Local misses fall through to the shared tier, and shared hits are copied
+    into the local tier. Stores go to both; the Mongo write runs in the
+    background so it never delays a response. The shared tier is skipped
+    when there is no database (e.g. offline benchmarks).
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 21600,
+        shared_enabled: bool = True,
+        collection_name: str = "followup_question_cache"
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_enabled = shared_enabled
+        self.collection_name = collection_name
+        
+        # key -> (expires_at, questions, provider)
+        self._local: "OrderedDict[str, Tuple[float, List[str], Dict[str, str]]]" = OrderedDict()
+        self._pending_writes: Set[asyncio.Task] = set()
+        
+        self.lookups = 0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.stores = 0
+        self.shared_errors = 0
+    
+    @property
+    def collection(self):
+        db = get_database() if self.shared_enabled else None
+        return db[self.collection_name] if db is not None else None
+    
+    async def setup_indexes(self):
+        """Create the TTL index of the shared tier"""
+        collection = self.collection
+        if collection is None:
+            return
+        await collection.create_index(
+            "createdAt",
+            expireAfterSeconds=int(self.ttl_seconds),
+            name="question_cache_createdAt_ttl"
+        )
+        logger.info(f"Shared follow-up question cache ready ({self.collection_name}, TTL {self.ttl_seconds}s)")
+    
+    async def get(self, key: str) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Look up cached questions and the provider that generated them"""
+        self.lookups += 1
+        
+        entry = self._local.get(key)
+        if entry is not None:
+            expires_at, questions, provider = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return list(questions), provider
+            del self._local[key]
+        
+        collection = self.collection
+        if collection is None:
+            return None
+        
+        try:
+            # The TTL monitor only runs every minute, so check the age here too
+            doc = await collection.find_one({
+                "_id": key,
+                "createdAt": {"$gte": datetime.utcnow() - timedelta(seconds=self.ttl_seconds)}
+            })
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared question cache lookup failed: {e}")
+            return None
+        
+        if not doc:
+            return None
+        
+        provider = {"name": doc["providerName"], "provider": doc["provider"]}
+        remaining = self.ttl_seconds - (datetime.utcnow() - doc["createdAt"]).total_seconds()
+        self._store_local(key, doc["questions"], provider, remaining)
+        self.shared_hits += 1
+        return list(doc["questions"]), provider
+    
+    def put(self, key: str, questions: List[str], provider: Dict[str, str]):
+        """Cache questions in both tiers (only the provider's name and type are kept)"""
+        provider = {"name": provider["name"], "provider": provider["provider"]}
+        self._store_local(key, questions, provider, self.ttl_seconds)
+        self.stores += 1
+        
+        if self.collection is not None:
+            task = asyncio.create_task(self._store_shared(key, questions, provider))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+    
+    def _store_local(self, key: str, questions: List[str], provider: Dict[str, str], ttl: float):
+        self._local[key] = (time.monotonic() + ttl, list(questions), provider)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+    
+    async def _store_shared(self, key: str, questions: List[str], provider: Dict[str, str]):
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "questions": questions,
+                    "provider": provider["provider"],
+                    "providerName": provider["name"],
+                    "createdAt": datetime.utcnow()
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared question cache write failed: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit ratio and saved provider calls"""
+        hits = self.local_hits + self.shared_hits
+        return {
+            "lookups": self.lookups,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.lookups - hits,
+            "hit_ratio_percentage": round(hits / self.lookups * 100, 1) if self.lookups else 0.0,
+            "saved_calls": hits,
+            "stores": self.stores,
+            "local_entries": len(self._local),
+            "shared_enabled": self.collection is not None,
+            "shared_errors": self.shared_errors
+        }
@@ -0,0 +1,91 @@
+import re
+import json
+from typing import List, Optional
+
+NUMBERED_LINE_PATTERN = re.compile(r'^\d+[.\)]\s*')
+BOLD_LABEL_PATTERN = re.compile(r'\*\*.*?\*\*:\s*')
+
+# Response schema for structured output mode ({"questions": [...]})
+FOLLOWUP_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    },
+    "required": ["questions"]
+}
+
+def parse_numbered_question(line: str) -> Optional[str]:
+    """Extract the question from a numbered line ("1. ...", "2) ..."), or None"""
+    trimmed = line.strip()
+    if not NUMBERED_LINE_PATTERN.match(trimmed):
+        return None
+    
+    question = NUMBERED_LINE_PATTERN.sub('', trimmed).strip()
+    question = BOLD_LABEL_PATTERN.sub('', question)
+    if question and len(question) > 10:
+        return question
+    return None
+
+def parse_questions_json(response: str, target: int = 3) -> Optional[List[str]]:
+    """
+    Strictly decode a structured response into questions
+    
+    Returns the first target questions, or None if the response is not a
+    JSON object with at least target usable question strings.
+    """
+    try:
+        data = json.loads(response)
+    except ValueError:
+        return None
+    
+    if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+        return None
+    
+    questions = [
+        question.strip() for question in data["questions"]
+        if isinstance(question, str) and len(question.strip()) > 10
+    ]
+    if len(questions) < target:
+        return None
+    return questions[:target]
+
+class IncrementalQuestionParser:
+    """
+    Parses numbered questions from a streamed response as chunks arrive
+    
+    Only complete lines are parsed, so a question is never cut off
+    mid-stream. Once the target number of questions is found the caller
+    can stop the stream; the text received so far parses to the same
+    questions as the full response would.
+    """
+    
+    def __init__(self, target: int = 3):
+        self.target = target
+        self.questions: List[str] = []
+        self.chunks: List[str] = []
+        self._partial_line = ""
+    
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of streamed text; returns True once enough questions are parsed"""
+        self.chunks.append(chunk)
+        
+        lines = (self._partial_line + chunk).split('\n')
+        self._partial_line = lines.pop()
+        for line in lines:
+            question = parse_numbered_question(line)
+            if question:
+                self.questions.append(question)
+        
+        return self.is_complete
+    
+    @property
+    def is_complete(self) -> bool:
+        return len(self.questions) >= self.target
+    
+    @property
+    def text(self) -> str:
+        """All text received so far"""
+        return "".join(self.chunks)
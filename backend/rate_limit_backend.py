@@ -0,0 +1,289 @@
+import math
+import uuid
+import logging
+from typing import Dict, List, Optional, Tuple
+from pymongo import ReturnDocument
+from config import Config
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Period the per-minute rate limits refer to
+WINDOW_SECONDS = 60
+
+def gcra_params(limit: float, burst: float) -> Tuple[float, float]:
+    """
+    GCRA emission interval and burst tolerance for a per-minute limit
+    
+    Calls are spaced limit per minute on average, and up to burst calls
+    may go back to back.
+    """
+    interval = WINDOW_SECONDS / limit
+    return interval, (max(1, burst) - 1) * interval
+
+def gcra_refill_rate(limit: float, burst: float) -> float:
+    """
+    Per-minute rate at which a GCRA with this burst must refill to stay within limit
+    
+    A burst of b back to back plus the refill over the rest of the minute
+    is at most limit in any rolling minute, as providers count it.
+    """
+    return limit - min(max(1, burst), limit) + 1
+
+def gcra_usage(tat: Optional[float], limit: float, burst: int, now: float) -> Tuple[int, int, float]:
+    """
+    Read a provider's GCRA state: (units in use, units free now, seconds until the next unit)
+    
+    tat is the theoretical arrival time (None for providers never called).
+    """
+    interval, tolerance = gcra_params(limit, burst)
+    backlog = max(0.0, (tat or now) - now)
+    in_use = min(burst, math.ceil(backlog / interval - 1e-9))
+    return in_use, burst - in_use, max(0.0, backlog - tolerance)
+
+def gcra_slack(limit: float, burst: float, cost: float) -> float:
+    """
+    How far ahead of now the state may be for a call of this cost to conform
+    
+    Negative for a cost above the burst: such a call waits until the
+    excess has refilled, so it never borrows past the limit.
+    """
+    interval = WINDOW_SECONDS / limit
+    return (burst - cost) * interval
+
+class MemoryRateLimitBackend:
+    """
+    Per-process GCRA state and daily request counts (the default)
+    
+    Each process only sees its own calls, so with several uvicorn workers
+    every worker assumes it owns each key's full rate limit.
+    """
+    
+    shared = False
+    
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.tat: Dict[str, float] = {}
+        self.daily: Dict[str, Tuple[str, int]] = {}
+    
+    async def snapshot(self, names: List[str]) -> Dict[str, Optional[float]]:
+        """Theoretical arrival time per provider"""
+        return {name: self.tat.get(name) for name in names}
+    
+    async def reserve(
+        self,
+        name: str,
+        limit: float,
+        burst: float,
+        now: float,
+        max_wait: float = 0.0,
+        cost: float = 1
+    ) -> Tuple[bool, float]:
+        """
+        Reserve cost units (one request, or a number of tokens) if they are available within max_wait
+        
+        Returns (reserved, wait): the delay before the reserved call may
+        start, or, if not reserved, the time until enough units free up.
+        A cost above the burst also waits for the excess to refill.
+        """
+        start = max(self.tat.get(name, now), now)
+        wait = start - now - gcra_slack(limit, burst, cost)
+        if wait > max_wait:
+            return False, wait
+        
+        self.tat[name] = start + cost * WINDOW_SECONDS / limit
+        return True, max(0.0, wait)
+    
+    async def cancel(self, name: str, limit: float, cost: float = 1):
+        """Give back reserved units that will not be used"""
+        if name in self.tat:
+            self.tat[name] -= cost * WINDOW_SECONDS / limit
+    
+    async def daily_counts(self, names: List[str], day: str) -> Dict[str, int]:
+        """Requests counted today per provider"""
+        result = {}
+        for name in names:
+            counted_day, count = self.daily.get(name, (day, 0))
+            result[name] = count if counted_day == day else 0
+        return result
+    
+    async def reserve_daily(self, name: str, day: str, allowed: int) -> Tuple[bool, int]:
+        """Count a request for the day if fewer than allowed were counted; returns (reserved, count)"""
+        count = (await self.daily_counts([name], day))[name]
+        if count >= allowed:
+            return False, count
+        self.daily[name] = (day, count + 1)
+        return True, count + 1
+    
+    async def cancel_daily(self, name: str, day: str):
+        """Uncount a reserved request"""
+        counted_day, count = self.daily.get(name, (day, 0))
+        if counted_day == day and count > 0:
+            self.daily[name] = (day, count - 1)
+
+class MongoRateLimitBackend:
+    """
+    GCRA state and daily request counts shared by all workers and replicas through Mongo
+    
+    One document per provider (and one per token budget) holds its
+    theoretical arrival time and the day's request count. Reserving is a
+    single atomic pipeline update that only advances the state if the
+    call conforms, so concurrent workers can never oversubscribe a key.
+    Times come from each host's clock.
+    
+    If Mongo is unavailable the backend falls back to per-process
+    accounting until it recovers, so AI calls keep working.
+    """
+    
+    shared = True
+    
+    def __init__(self, namespace: str, collection_name: str = "rate_limiter_windows"):
+        self.namespace = namespace
+        self.collection_name = collection_name
+        self.fallback = MemoryRateLimitBackend(namespace)
+        self.errors = 0
+    
+    @property
+    def collection(self):
+        db = get_database()
+        return db[self.collection_name] if db is not None else None
+    
+    def _doc_id(self, name: str) -> str:
+        return f"{self.namespace}:{name}"
+    
+    def _failed(self, action: str, error: Exception):
+        self.errors += 1
+        logger.warning(f"Shared rate limiter {action} failed, using per-process accounting: {error}")
+    
+    async def snapshot(self, names: List[str]) -> Dict[str, Optional[float]]:
+        """Theoretical arrival time per provider"""
+        collection = self.collection
+        if collection is None:
+            return await self.fallback.snapshot(names)
+        
+        result: Dict[str, Optional[float]] = {name: None for name in names}
+        by_id = {self._doc_id(name): name for name in names}
+        try:
+            async for doc in collection.find({"_id": {"$in": list(by_id)}}):
+                result[by_id[doc["_id"]]] = doc.get("tat")
+        except Exception as e:
+            self._failed("read", e)
+            return await self.fallback.snapshot(names)
+        return result
+    
+    async def reserve(
+        self,
+        name: str,
+        limit: float,
+        burst: float,
+        now: float,
+        max_wait: float = 0.0,
+        cost: float = 1
+    ) -> Tuple[bool, float]:
+        """Atomically reserve cost units if they are available within max_wait"""
+        collection = self.collection
+        if collection is None:
+            return await self.fallback.reserve(name, limit, burst, now, max_wait, cost)
+        
+        slack = gcra_slack(limit, burst, cost)
+        advance = cost * WINDOW_SECONDS / limit
+        token = uuid.uuid4().hex
+        start = {"$max": [{"$ifNull": ["$tat", now]}, now]}
+        conforms = {"$lte": [{"$subtract": [start, now]}, slack + max_wait]}
+        try:
+            doc = await collection.find_one_and_update(
+                {"_id": self._doc_id(name)},
+                [{"$set": {
+                    "grant": {"$cond": [conforms, token, "$grant"]},
+                    "tat": {"$cond": [conforms, {"$add": [start, advance]}, {"$ifNull": ["$tat", now]}]}
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            self._failed("reserve", e)
+            return await self.fallback.reserve(name, limit, burst, now, max_wait, cost)
+        
+        if doc.get("grant") == token:
+            return True, max(0.0, doc["tat"] - advance - now - slack)
+        return False, doc["tat"] - now - slack
+    
+    async def cancel(self, name: str, limit: float, cost: float = 1):
+        """Give back reserved units that will not be used"""
+        collection = self.collection
+        if collection is None:
+            await self.fallback.cancel(name, limit, cost)
+            return
+        
+        try:
+            await collection.update_one(
+                {"_id": self._doc_id(name), "tat": {"$exists": True}},
+                {"$inc": {"tat": -cost * WINDOW_SECONDS / limit}}
+            )
+        except Exception as e:
+            self._failed("cancel", e)
+    
+    async def daily_counts(self, names: List[str], day: str) -> Dict[str, int]:
+        """Requests counted today per provider"""
+        collection = self.collection
+        if collection is None:
+            return await self.fallback.daily_counts(names, day)
+        
+        result = {name: 0 for name in names}
+        by_id = {self._doc_id(name): name for name in names}
+        try:
+            async for doc in collection.find({"_id": {"$in": list(by_id)}, "day": day}):
+                result[by_id[doc["_id"]]] = doc.get("dayCount", 0)
+        except Exception as e:
+            self._failed("daily read", e)
+            return await self.fallback.daily_counts(names, day)
+        return result
+    
+    async def reserve_daily(self, name: str, day: str, allowed: int) -> Tuple[bool, int]:
+        """Atomically count a request for the day if fewer than allowed were counted"""
+        collection = self.collection
+        if collection is None:
+            return await self.fallback.reserve_daily(name, day, allowed)
+        
+        token = uuid.uuid4().hex
+        count = {"$cond": [{"$eq": ["$day", day]}, {"$ifNull": ["$dayCount", 0]}, 0]}
+        under = {"$lt": [count, allowed]}
+        try:
+            doc = await collection.find_one_and_update(
+                {"_id": self._doc_id(name)},
+                [{"$set": {
+                    "dailyGrant": {"$cond": [under, token, "$dailyGrant"]},
+                    "dayCount": {"$cond": [under, {"$add": [count, 1]}, count]},
+                    "day": day
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            self._failed("daily reserve", e)
+            return await self.fallback.reserve_daily(name, day, allowed)
+        return doc.get("dailyGrant") == token, doc["dayCount"]
+    
+    async def cancel_daily(self, name: str, day: str):
+        """Uncount a reserved request"""
+        collection = self.collection
+        if collection is None:
+            await self.fallback.cancel_daily(name, day)
+            return
+        
+        try:
+            await collection.update_one(
+                {"_id": self._doc_id(name), "day": day, "dayCount": {"$gt": 0}},
+                {"$inc": {"dayCount": -1}}
+            )
+        except Exception as e:
+            self._failed("daily cancel", e)
+
+def create_rate_limit_backend(namespace: str):
+    """Create the configured rate-limit backend ("memory" or "mongo") for one limiter"""
+    backend = Config.RATE_LIMITER_BACKEND.lower()
+    if backend == "mongo":
+        return MongoRateLimitBackend(namespace, collection_name=Config.RATE_LIMITER_COLLECTION)
+    if backend != "memory":
+        logger.warning(f"Unknown RATE_LIMITER_BACKEND '{Config.RATE_LIMITER_BACKEND}', using memory")
+    return MemoryRateLimitBackend(namespace)
@@ -2,40 +2,139 @@ import asyncio
 import time
 import random
 import logging
-from typing import List, Dict, Optional, Tuple
-from collections import deque, defaultdict
-from datetime import datetime, timedelta
+from collections import deque
+from typing import Any, Deque, List, Dict, Optional, Set, Tuple
 from config import Config
+from circuit_breaker import get_circuit_breaker
+from adaptive_limits import get_adaptive_limit
+from daily_quota import create_daily_quota_clock
+from model_router import estimate_tokens
+from rate_limit_backend import create_rate_limit_backend, gcra_refill_rate, gcra_usage, gcra_slack
 
 logger = logging.getLogger(__name__)
 
+# Rate limit of providers configured without a cap
+UNCAPPED = float("inf")
+
+# How often the head of the acquire queue rechecks while every circuit is open
+ACQUIRE_POLL_SECONDS = 0.5
+
+# Daily allowance for calls that must go through regardless (fallbacks, recorded calls)
+FORCED_DAILY_ALLOWANCE = 10 ** 9
+
+def estimate_request_tokens(prompt: str) -> int:
+    """Tokens to reserve for a call: the prompt estimate plus the expected completion"""
+    return estimate_tokens(prompt) + Config.QUOTA_COMPLETION_TOKENS_ESTIMATE
+
+class SlotReservation:
+    """
+    A provider slot held for one call
+    
+    The slot (one request, its estimated tokens and one request of the
+    day's quota) counts against the provider's limits from the moment it
+    is reserved. commit() marks it used; cancel() gives it back. delay is
+    how long the caller must wait before making the call. Once the call
+    has finished, pass tokens to reconcile_token_usage with the actual
+    usage so the token budget is corrected by this call's own estimate.
+    request_rate is the GCRA rate the request was reserved at, so a
+    cancel gives back exactly what was taken even if the learned limit
+    has changed since.
+    """
+    
+    def __init__(
+        self,
+        limiter: "MultiProviderRateLimiter",
+        provider: Dict,
+        request_rate: float,
+        delay: float = 0.0,
+        tokens: int = 0,
+        reserved_at: Optional[float] = None
+    ):
+        self.limiter = limiter
+        self.provider = provider
+        self.request_rate = request_rate
+        self.delay = delay
+        self.tokens = tokens
+        self.reserved_at = reserved_at or time.time()
+        self.settled = False
+    
+    async def commit(self):
+        """Mark the slot as used"""
+        if not self.settled:
+            self.settled = True
+            self.limiter._record_commit(self.provider)
+    
+    async def cancel(self):
+        """Release the slot for other callers"""
+        if not self.settled:
+            self.settled = True
+            await self.limiter._release_slot(self.provider, self.request_rate, self.tokens, self.reserved_at)
+
 class MultiProviderRateLimiter:
     """
     Optimized rate limiter with TRUE round-robin distribution
+    
+    Each provider is limited by GCRA (generic cell rate algorithm): a
+    single theoretical arrival time per provider allows bursts of up to
+    burst calls, refilled at rate_limit - burst + 1 calls per minute, so
+    no rolling minute ever sees more than rate_limit calls. Checking or
+    reserving a slot is O(1) and gives the exact time until the next slot.
+    
+    Providers with a tokens-per-minute quota get a second, token-weighted
+    GCRA sized the same way, so no rolling minute uses more than
+    tokens_per_minute: calls reserve their estimated tokens, corrected by each call's own reservation once the
+    provider reports actual usage. Providers with a requests-per-day quota
+    also count requests per quota day, optionally paced over working hours.
     """
     
-    def __init__(self, providers_config: List[Dict], rate_limit_per_minute: int = 12):
+    def __init__(self, providers_config: List[Dict], rate_limit_per_minute: int = 12, namespace: str = "followup"):
         self.providers = [p for p in providers_config if p.get('api_key')]
         self.rate_limit_per_minute = rate_limit_per_minute
+        self.burst_fraction = Config.RATE_LIMITER_BURST_FRACTION
         
-        # Provider-specific rate limits
+        # Provider-type default rate limits (per key; a provider's own "rate_limit" overrides)
         self.provider_rate_limits = {
-            "gemini": 15,
-            "groq": 30,
-            "huggingface": 10
+            "gemini": Config.GEMINI_RATE_LIMIT_PER_MINUTE,
+            "groq": Config.GROQ_RATE_LIMIT_PER_MINUTE,
+            "huggingface": Config.HUGGINGFACE_RATE_LIMIT_PER_MINUTE,
+            "mock": Config.MOCK_RATE_LIMIT_PER_MINUTE
         }
         
-        # Track API call timestamps for each provider
-        self.call_history: Dict[str, deque] = defaultdict(lambda: deque())
+        # GCRA state and daily counts per provider (per process, or shared across workers)
+        self.backend = create_rate_limit_backend(namespace)
+        self.quota_clock = create_daily_quota_clock()
         
         # Track total calls
         self.total_calls_recorded = 0
         
+        # Reserved (estimated) vs actual tokens of reconciled calls
+        self.token_stats = {"reconciled_calls": 0, "estimated_tokens": 0, "actual_tokens": 0}
+        
+        # Providers told to back off (Retry-After): name -> time they can be used again
+        self.deferred_until: Dict[str, float] = {}
+        
         # FIXED: True round-robin counter
         self.round_robin_index = 0
         
-        # Lock for thread safety
-        self._lock = asyncio.Lock()
+        # Callers waiting in acquire(), in arrival order; only the head reserves
+        self._acquire_waiters: Deque[asyncio.Future] = deque()
+        self.acquire_stats = {
+            "immediate": 0,
+            "queued": 0,
+            "acquired_after_wait": 0,
+            "timed_out": 0,
+            "total_wait_seconds": 0.0
+        }
+        
+        # Learned (AIMD) limits start from the configured ones
+        if Config.ADAPTIVE_LIMITS_ENABLED:
+            for provider in self.providers:
+                configured = self._get_configured_rate_limit(provider)
+                if configured != UNCAPPED:
+                    get_adaptive_limit(provider['name']).configure(configured)
+        
+        for provider in self.providers:
+            limiters_by_provider[provider['name']] = self
         
         self._initialize_provider_weights()
         
@@ -45,281 +144,688 @@ class MultiProviderRateLimiter:
     def _initialize_provider_weights(self):
         """Initialize provider weights based on their rate limits"""
         for provider in self.providers:
-            provider_type = provider['provider']
-            rate_limit = self.provider_rate_limits.get(provider_type, self.rate_limit_per_minute)
-            logger.info(f"{provider['name']} capacity: {rate_limit}/min")
+            rate_limit = self._get_configured_rate_limit(provider)
+            tokens_per_minute, requests_per_day = self._get_provider_quotas(provider)
+            logger.info(f"{provider['name']} capacity: {rate_limit}/min (burst {self._get_provider_burst(provider)}), "
+                       f"{tokens_per_minute or 'untracked'} tokens/min, {requests_per_day or 'untracked'} requests/day")
+        
+        capped = [self._get_provider_rate_limit(p) for p in self.providers]
+        total = sum(limit for limit in capped if limit != UNCAPPED)
+        uncapped = sum(1 for limit in capped if limit == UNCAPPED)
+        logger.info(f"Aggregate capacity: {total:.0f} calls/min"
+                   f"{f' + {uncapped} uncapped provider(s)' if uncapped else ''}")
     
     def _log_provider_configuration(self):
         """Log detailed provider configuration"""
         for i, provider in enumerate(self.providers):
             provider_type = provider['provider']
-            rate_limit = self.provider_rate_limits.get(provider_type, self.rate_limit_per_minute)
+            rate_limit = self._get_provider_rate_limit(provider)
             api_key_masked = '***' + provider['api_key'][-4:] if provider.get('api_key') else 'None'
             
             logger.info(f"Provider {i}: {provider['name']} ({provider_type}) - "
                        f"{rate_limit} calls/min - API Key: {api_key_masked}")
     
-    def _get_provider_rate_limit(self, provider_type: str) -> int:
-        """Get provider-specific rate limit"""
-        return self.provider_rate_limits.get(provider_type, self.rate_limit_per_minute)
+    def _get_configured_rate_limit(self, provider: Dict) -> float:
+        """
+        Get provider-specific configured rate limit
+        
+        A "rate_limit" in the provider config overrides the per-type default;
+        0 means uncapped (e.g. a self-hosted server), returned as infinity.
+        """
+        if provider.get('rate_limit') is not None:
+            return provider['rate_limit'] or UNCAPPED
+        return self.provider_rate_limits.get(provider['provider'], self.rate_limit_per_minute)
     
-    async def record_api_call(self, provider_name: str = None):
-        """Record an API call"""
-        async with self._lock:
-            current_time = time.time()
-            
-            if not provider_name:
-                if self.providers:
-                    provider_name = random.choice(self.providers)['name']
-                else:
-                    logger.warning("No providers available to record call")
-                    return
-            
-            self.call_history[provider_name].append(current_time)
-            self.total_calls_recorded += 1
-            
-            provider_rate_limit = self.rate_limit_per_minute
-            for provider in self.providers:
-                if provider['name'] == provider_name:
-                    provider_rate_limit = self._get_provider_rate_limit(provider['provider'])
-                    break
-            
-            current_calls = len(self.call_history[provider_name])
-            logger.info(f"API call recorded for {provider_name} "
-                       f"({current_calls}/{provider_rate_limit} calls)")
+    def _get_provider_rate_limit(self, provider: Dict) -> float:
+        """Get the enforced rate limit: the learned one if adaptive limits are on, else the configured one"""
+        learned = get_adaptive_limit(provider['name']).limit if Config.ADAPTIVE_LIMITS_ENABLED else None
+        if learned is not None:
+            return learned
+        return self._get_configured_rate_limit(provider)
+    
+    def _get_provider_burst(self, provider: Dict) -> int:
+        """Calls a provider may take back to back (a share of its per-minute limit)"""
+        rate_limit = self._get_provider_rate_limit(provider)
+        if rate_limit == UNCAPPED:
+            return 1
+        return max(1, round(rate_limit * self.burst_fraction))
+    
+    def _get_request_rate(self, provider: Dict) -> float:
+        """GCRA refill rate of a provider's requests (per minute), leaving room for its burst"""
+        rate_limit = self._get_provider_rate_limit(provider)
+        if rate_limit == UNCAPPED:
+            return UNCAPPED
+        return gcra_refill_rate(rate_limit, self._get_provider_burst(provider))
     
-    async def get_available_provider(self, record_call: bool = True) -> Optional[Dict]:
+    def _get_provider_quotas(self, provider: Dict) -> Tuple[int, int]:
+        """Tokens per minute and requests per day of a provider (0 = not tracked)"""
+        defaults = Config.get_quota_settings(provider['provider'])
+        return (
+            provider.get('tokens_per_minute', defaults['tokens_per_minute']),
+            provider.get('requests_per_day', defaults['requests_per_day'])
+        )
+    
+    def _get_token_burst(self, tokens_per_minute: int) -> int:
+        """Tokens that may go back to back (the same share of the per-minute quota as requests)"""
+        return max(1, round(tokens_per_minute * self.burst_fraction))
+    
+    def _get_token_rate(self, tokens_per_minute: int) -> float:
+        """GCRA refill rate of a provider's tokens (per minute), leaving room for its burst"""
+        return gcra_refill_rate(tokens_per_minute, self._get_token_burst(tokens_per_minute))
+    
+    @staticmethod
+    def _tokens_key(provider_name: str) -> str:
+        return f"{provider_name}:tokens"
+    
+    async def _reserve_slot(
+        self,
+        provider: Dict,
+        current_time: float,
+        max_wait: float = 0.0,
+        tokens: int = 0,
+        force: bool = False,
+        request_rate: Optional[float] = None
+    ) -> Tuple[bool, float]:
         """
-        FIXED: Get available provider using TRUE round-robin distribution
+        Reserve one request, its tokens and one request of the day's quota
+        
+        Each dimension must be available within max_wait; if one is not,
+        the others are given back. Returns (reserved, wait) like the backend.
+        force takes the slot even past the limits. request_rate pins the
+        GCRA rate of the request (default: the current one).
         """
-        async with self._lock:
-            current_time = time.time()
+        provider_name = provider['name']
+        if request_rate is None:
+            request_rate = self._get_request_rate(provider)
+        tokens_per_minute, requests_per_day = self._get_provider_quotas(provider)
+        if force:
+            max_wait = UNCAPPED
+        
+        # What has been taken so far, given back if a later dimension fails or the caller is cancelled
+        held_requests = False
+        held_tokens = 0
+        
+        try:
+            wait = 0.0
+            if request_rate != UNCAPPED:
+                reserved, wait = await self.backend.reserve(
+                    provider_name, request_rate, self._get_provider_burst(provider), current_time, max_wait
+                )
+                if not reserved:
+                    return False, wait
+                held_requests = True
             
-            if not self.providers:
-                logger.error("No providers available")
-                return None
+            if tokens_per_minute and tokens:
+                reserved, token_wait = await self.backend.reserve(
+                    self._tokens_key(provider_name), self._get_token_rate(tokens_per_minute),
+                    self._get_token_burst(tokens_per_minute), current_time, max_wait, cost=tokens
+                )
+                if not reserved:
+                    held_requests = False
+                    await asyncio.shield(self._release_slot(provider, request_rate, 0, current_time, daily=False))
+                    return False, token_wait
+                held_tokens = tokens
+                wait = max(wait, token_wait)
             
-            # Clean old entries for all providers
-            for provider in self.providers:
-                self._clean_old_entries(provider['name'], current_time)
+            if requests_per_day:
+                day = self.quota_clock.day_bounds(current_time)[0]
+                allowed = FORCED_DAILY_ALLOWANCE if force else self.quota_clock.allowed(requests_per_day, current_time)
+                reserved, used = await self.backend.reserve_daily(provider_name, day, allowed)
+                if not reserved:
+                    held_requests, held_tokens = False, 0
+                    await asyncio.shield(self._release_slot(provider, request_rate, tokens, current_time, daily=False))
+                    return False, self.quota_clock.seconds_until_allowed(requests_per_day, used, current_time)
             
-            # Get available providers
-            available_providers = []
-            for provider in self.providers:
-                provider_name = provider['name']
-                provider_type = provider['provider']
-                rate_limit = self._get_provider_rate_limit(provider_type)
-                current_calls = len(self.call_history[provider_name])
-                
-                if current_calls < rate_limit:
-                    utilization = (current_calls / rate_limit) * 100
-                    available_providers.append({
-                        'provider': provider,
-                        'calls': current_calls,
-                        'limit': rate_limit,
-                        'utilization': utilization,
-                        'remaining': rate_limit - current_calls
-                    })
+            return True, wait
+        
+        except asyncio.CancelledError:
+            if held_requests or held_tokens:
+                await asyncio.shield(self._release_slot(
+                    provider, request_rate, held_tokens, current_time, requests=held_requests, daily=False
+                ))
+            raise
+    
+    async def _release_slot(
+        self,
+        provider: Dict,
+        request_rate: float,
+        tokens: int,
+        reserved_at: float,
+        requests: bool = True,
+        daily: bool = True
+    ):
+        """Give back what _reserve_slot took, at the request rate it was reserved at"""
+        provider_name = provider['name']
+        tokens_per_minute, requests_per_day = self._get_provider_quotas(provider)
+        
+        if request_rate != UNCAPPED and requests:
+            await self.backend.cancel(provider_name, request_rate)
+        if tokens_per_minute and tokens:
+            await self.backend.cancel(self._tokens_key(provider_name), self._get_token_rate(tokens_per_minute), cost=tokens)
+        if requests_per_day and daily:
+            await self.backend.cancel_daily(provider_name, self.quota_clock.day_bounds(reserved_at)[0])
+    
+    def _record_commit(self, provider: Dict):
+        self.total_calls_recorded += 1
+        logger.info(f"✅ Provider selected (round-robin): {provider['name']}")
+    
+    async def reconcile_tokens(self, provider_name: str, reserved_tokens: int, actual_tokens: int):
+        """
+        Correct the token budget of a finished call: charge or give back the
+        difference between the tokens its slot reserved and its actual usage
+        (provider-reported where available)
+        """
+        provider = next((p for p in self.providers if p['name'] == provider_name), None)
+        if provider is None:
+            return
+        tokens_per_minute = self._get_provider_quotas(provider)[0]
+        if not tokens_per_minute:
+            return
+        
+        self.token_stats["reconciled_calls"] += 1
+        self.token_stats["estimated_tokens"] += reserved_tokens
+        self.token_stats["actual_tokens"] += actual_tokens
+        
+        difference = actual_tokens - reserved_tokens
+        key = self._tokens_key(provider_name)
+        token_rate = self._get_token_rate(tokens_per_minute)
+        if difference > 0:
+            await self.backend.reserve(
+                key, token_rate, self._get_token_burst(tokens_per_minute), time.time(), UNCAPPED, cost=difference
+            )
+        elif difference < 0:
+            await self.backend.cancel(key, token_rate, cost=-difference)
+    
+    async def _usage(self, current_time: float, tokens: int = 1) -> Dict[str, Dict[str, Any]]:
+        """
+        Per provider, from one read of the limiter state:
+        
+        - requests / tokens: (in use, free now, seconds until the next unit)
+        - today: (requests counted, requests allowed so far), or None if untracked
+        - wait: seconds until a call of the given tokens conforms on every dimension
+        """
+        names = [p['name'] for p in self.providers]
+        state = await self.backend.snapshot(names + [self._tokens_key(name) for name in names])
+        day = self.quota_clock.day_bounds(current_time)[0]
+        daily_counts = await self.backend.daily_counts(names, day)
+        
+        usage = {}
+        for provider in self.providers:
+            provider_name = provider['name']
+            request_rate = self._get_request_rate(provider)
+            burst = self._get_provider_burst(provider)
+            tokens_per_minute, requests_per_day = self._get_provider_quotas(provider)
             
-            if not available_providers:
-                logger.warning("All AI providers at rate limit")
-                return None
+            if request_rate == UNCAPPED:
+                requests = (0, burst, 0.0)
+            else:
+                requests = gcra_usage(state[provider_name], request_rate, burst, current_time)
+            wait = requests[2]
             
-            # FIXED: Use true round-robin with skip-if-full logic
-            attempts = 0
-            max_attempts = len(self.providers) * 2  # Try all providers twice
+            token_usage = None
+            if tokens_per_minute:
+                tat = state[self._tokens_key(provider_name)]
+                token_rate = self._get_token_rate(tokens_per_minute)
+                token_burst = self._get_token_burst(tokens_per_minute)
+                token_usage = gcra_usage(tat, token_rate, token_burst, current_time)
+                backlog = max(0.0, (tat or current_time) - current_time)
+                wait = max(wait, backlog - gcra_slack(token_rate, token_burst, tokens))
             
-            while attempts < max_attempts:
-                # Get current provider in round-robin
-                current_index = self.round_robin_index % len(self.providers)
-                candidate_provider = self.providers[current_index]
-                
-                # Move to next provider for next call
-                self.round_robin_index = (self.round_robin_index + 1) % len(self.providers)
-                attempts += 1
-                
-                # Check if this provider is available
-                provider_name = candidate_provider['name']
-                provider_type = candidate_provider['provider']
-                rate_limit = self._get_provider_rate_limit(provider_type)
-                current_calls = len(self.call_history[provider_name])
-                
-                if current_calls < rate_limit:
-                    # This provider is available!
-                    selected = candidate_provider
-                    
-                    # Record the call if requested
-                    if record_call:
-                        self.call_history[provider_name].append(current_time)
-                        self.total_calls_recorded += 1
-                        
-                        utilization = ((current_calls + 1) / rate_limit) * 100
-                        
-                        logger.info(f"✅ Provider selected (round-robin): {provider_name} "
-                                   f"({current_calls + 1}/{rate_limit} calls, {utilization:.1f}% utilized)")
-                    
-                    return selected
-                else:
-                    logger.debug(f"⏭️ Skipping {provider_name} (at limit: {current_calls}/{rate_limit})")
+            today = None
+            if requests_per_day:
+                used = daily_counts[provider_name]
+                today = (used, self.quota_clock.allowed(requests_per_day, current_time))
+                wait = max(wait, self.quota_clock.seconds_until_allowed(requests_per_day, used, current_time))
             
-            # All providers exhausted
-            logger.warning("All providers at limit after round-robin attempts")
+            usage[provider_name] = {"requests": requests, "tokens": token_usage, "today": today, "wait": wait}
+        return usage
+    
+    async def record_api_call(self, provider_name: str = None):
+        """Record an API call (taking a slot even if the provider is at its limit)"""
+        if not provider_name:
+            if self.providers:
+                provider_name = random.choice(self.providers)['name']
+            else:
+                logger.warning("No providers available to record call")
+                return
+        
+        provider = next((p for p in self.providers if p['name'] == provider_name), None)
+        if provider is None:
+            logger.warning(f"Unknown provider {provider_name}, call not recorded")
+            return
+        
+        await self._reserve_slot(provider, time.time(), force=True)
+        self.total_calls_recorded += 1
+        logger.info(f"API call recorded for {provider_name}")
+    
+    async def reserve_provider(
+        self,
+        exclude: Optional[List[str]] = None,
+        max_wait: float = 0.0,
+        tokens: int = 0
+    ) -> Optional[SlotReservation]:
+        """
+        Reserve a slot on an available provider
+        
+        Providers with a free slot now are tried in round-robin order.
+        Otherwise, if max_wait allows, the provider whose next slot comes
+        soonest is reserved and the reservation's delay says how long to
+        wait. The caller must commit() or cancel() the reservation.
+        Providers named in exclude are skipped (e.g. the primary of a hedged
+        call); tokens is the call's estimated token use.
+        """
+        exclude = exclude or []
+        if not self.providers:
+            logger.error("No providers available")
             return None
+        
+        current_time = time.time()
+        
+        for _ in range(len(self.providers)):
+            candidate_provider = self.providers[self.round_robin_index % len(self.providers)]
+            self.round_robin_index = (self.round_robin_index + 1) % len(self.providers)
+            
+            reservation = await self._try_reserve(candidate_provider, exclude, current_time, 0.0, tokens)
+            if reservation:
+                return reservation
+        
+        if max_wait > 0:
+            waits = await self._waits_by_provider(exclude, current_time, tokens)
+            for provider in sorted(self.providers, key=lambda p: waits.get(p['name'], UNCAPPED)):
+                if waits.get(provider['name'], UNCAPPED) > max_wait:
+                    break
+                reservation = await self._try_reserve(provider, exclude, current_time, max_wait, tokens)
+                if reservation:
+                    return reservation
+        
+        logger.warning("All AI providers at rate limit or circuit open")
+        return None
     
-    def _clean_old_entries(self, provider_name: str, current_time: float):
-        """Remove entries older than 1 minute"""
-        cutoff_time = current_time - 60
+    async def acquire(
+        self,
+        timeout: float,
+        exclude: Optional[List[str]] = None,
+        tokens: int = 0
+    ) -> Optional[SlotReservation]:
+        """
+        Wait up to timeout seconds for a provider slot, first come first served
+        
+        A free slot is taken at once if nobody is queued. Otherwise callers
+        queue in arrival order and only the head reserves, so later callers
+        cannot jump ahead as slots free up. The returned reservation's slot
+        has started (delay 0) and must be committed or cancelled. Returns
+        None once the deadline passes or the next slot would come too late.
+        """
+        if not self._acquire_waiters:
+            reservation = await self.reserve_provider(exclude=exclude, tokens=tokens)
+            if reservation:
+                self.acquire_stats["immediate"] += 1
+                return reservation
+        
+        if timeout <= 0:
+            self.acquire_stats["timed_out"] += 1
+            return None
+        
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout
+        
+        self.acquire_stats["queued"] += 1
+        turn = loop.create_future()
+        self._acquire_waiters.append(turn)
+        if len(self._acquire_waiters) == 1:
+            turn.set_result(None)
+        
+        # No wait_for here: a timeout could drop a slot reserved just before it fired.
+        # _reserve_at_head enforces the deadline itself and returns None when it passes.
+        try:
+            reservation = await self._reserve_at_head(turn, exclude, deadline, tokens)
+        finally:
+            self._leave_acquire_queue(turn)
+        
+        if not reservation:
+            self.acquire_stats["timed_out"] += 1
+            logger.info(f"No provider slot within {timeout:.1f}s ({len(self._acquire_waiters)} still waiting)")
+            return None
         
-        initial_count = len(self.call_history[provider_name])
-        while self.call_history[provider_name] and self.call_history[provider_name][0] < cutoff_time:
-            self.call_history[provider_name].popleft()
+        # The slot is ours; the next caller can reserve the following one while we wait for it
+        if reservation.delay > 0:
+            try:
+                await asyncio.sleep(reservation.delay)
+            except asyncio.CancelledError:
+                await reservation.cancel()
+                raise
+            reservation.delay = 0.0
         
-        cleaned_count = initial_count - len(self.call_history[provider_name])
-        if cleaned_count > 0:
-            logger.debug(f"Cleaned {cleaned_count} old entries for {provider_name}")
+        waited = loop.time() - started
+        self.acquire_stats["acquired_after_wait"] += 1
+        self.acquire_stats["total_wait_seconds"] += waited
+        logger.info(f"Provider slot on {reservation.provider['name']} after waiting {waited:.2f}s")
+        return reservation
     
-    async def wait_if_needed(self) -> Dict:
-        """Wait if necessary and return an available provider"""
-        max_retries = 20
-        retry_count = 0
+    async def _reserve_at_head(
+        self,
+        turn: asyncio.Future,
+        exclude: Optional[List[str]],
+        deadline: float,
+        tokens: int
+    ) -> Optional[SlotReservation]:
+        """Wait for our turn, then reserve the soonest slot that starts before the deadline"""
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(asyncio.shield(turn), deadline - loop.time())
+        except asyncio.TimeoutError:
+            return None
         
-        while retry_count < max_retries:
-            provider = await self.get_available_provider(record_call=True)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
             
-            if provider:
-                logger.info(f"Provider ready: {provider['name']}")
-                return provider
+            reservation = await self.reserve_provider(exclude=exclude, max_wait=remaining, tokens=tokens)
+            if reservation:
+                return reservation
             
-            wait_time = await self._calculate_smart_wait_time()
+            wait = await self.time_until_available(exclude, tokens)
+            if wait is not None and wait > remaining:
+                return None
             
-            logger.info(f"Waiting {wait_time:.1f}s for availability (retry {retry_count + 1}/{max_retries})")
-            await asyncio.sleep(wait_time)
-            retry_count += 1
+            # A slot was taken by a caller outside the queue, or every circuit is open
+            await asyncio.sleep(min(remaining, max(wait or ACQUIRE_POLL_SECONDS, 0.05)))
+    
+    def _leave_acquire_queue(self, turn: asyncio.Future):
+        """Remove a caller from the acquire queue and hand the turn to the next one"""
+        was_head = bool(self._acquire_waiters) and self._acquire_waiters[0] is turn
+        try:
+            self._acquire_waiters.remove(turn)
+        except ValueError:
+            pass
         
-        # Fallback
-        fallback_provider = await self._get_fallback_provider()
-        return fallback_provider
+        if was_head and self._acquire_waiters and not self._acquire_waiters[0].done():
+            self._acquire_waiters[0].set_result(None)
     
-    async def _calculate_smart_wait_time(self) -> float:
-        """Calculate optimal wait time"""
-        async with self._lock:
-            current_time = time.time()
-            min_wait_times = []
-            
-            for provider in self.providers:
-                provider_name = provider['name']
-                provider_type = provider['provider']
-                rate_limit = self._get_provider_rate_limit(provider_type)
-                current_calls = len(self.call_history[provider_name])
-                
-                if current_calls >= rate_limit and self.call_history[provider_name]:
-                    oldest_call = self.call_history[provider_name][0]
-                    wait_time = 60 - (current_time - oldest_call)
-                    if wait_time > 0:
-                        min_wait_times.append(wait_time)
-                elif current_calls < rate_limit:
-                    return 0.1
-            
-            if not min_wait_times:
-                return 2.0
+    async def _try_reserve(
+        self,
+        provider: Dict,
+        exclude: List[str],
+        current_time: float,
+        max_wait: float,
+        tokens: int = 0
+    ) -> Optional[SlotReservation]:
+        """Reserve a slot on one provider unless it is excluded, backing off or circuit-open"""
+        provider_name = provider['name']
+        if provider_name in exclude:
+            return None
+        
+        deferred_for = self._deferred_for(provider_name, current_time)
+        if deferred_for > max_wait:
+            return None
+        
+        circuit = get_circuit_breaker(provider_name)
+        if not circuit.is_available():
+            logger.debug(f"⏭️ Skipping {provider_name} (circuit open)")
+            return None
+        
+        request_rate = self._get_request_rate(provider)
+        reserved, wait = await self._reserve_slot(provider, current_time, max_wait, tokens, request_rate=request_rate)
+        if not reserved:
+            logger.debug(f"⏭️ Skipping {provider_name} (next slot in {wait:.1f}s)")
+            return None
+        
+        # In HALF_OPEN only a limited number of probes may go through
+        if not circuit.allow_request():
+            await asyncio.shield(self._release_slot(provider, request_rate, tokens, current_time))
+            return None
+        
+        return SlotReservation(
+            self, provider, request_rate, delay=max(wait, deferred_for), tokens=tokens, reserved_at=current_time
+        )
+    
+    async def get_available_provider(
+        self,
+        record_call: bool = True,
+        exclude: Optional[List[str]] = None,
+        tokens: int = 0
+    ) -> Optional[Dict]:
+        """
+        FIXED: Get available provider using TRUE round-robin distribution
+        
+        With record_call the provider's slot is taken (with tokens, the
+        call's estimated token use); otherwise this only checks which
+        provider would be picked. Providers named in exclude are skipped
+        (e.g. the primary of a hedged call).
+        """
+        if record_call:
+            reservation = await self.reserve_provider(exclude=exclude, tokens=tokens)
+            if not reservation:
+                return None
+            await reservation.commit()
+            return reservation.provider
+        
+        exclude = exclude or []
+        if not self.providers:
+            logger.error("No providers available")
+            return None
+        
+        current_time = time.time()
+        usage = await self._usage(current_time, max(1, tokens))
+        for _ in range(len(self.providers)):
+            candidate_provider = self.providers[self.round_robin_index % len(self.providers)]
+            self.round_robin_index = (self.round_robin_index + 1) % len(self.providers)
             
-            min_wait = min(min_wait_times)
-            return max(0.5, min(15.0, min_wait + 0.5))
+            provider_name = candidate_provider['name']
+            if provider_name in exclude or self._deferred_for(provider_name, current_time) > 0:
+                continue
+            if usage[provider_name]["wait"] <= 0 and get_circuit_breaker(provider_name).is_available():
+                return candidate_provider
+        
+        logger.warning("All AI providers at rate limit or circuit open")
+        return None
+    
+    async def defer_provider(self, provider_name: str, seconds: float):
+        """Skip a provider for the given time (e.g. after a 429 with Retry-After)"""
+        until = time.time() + seconds
+        if until > self.deferred_until.get(provider_name, 0):
+            self.deferred_until[provider_name] = until
+            logger.info(f"⏸️ Deferring {provider_name} for {seconds:.1f}s")
+    
+    def _deferred_for(self, provider_name: str, current_time: float) -> float:
+        """Seconds a provider is still backing off (0 if it is not)"""
+        until = self.deferred_until.get(provider_name)
+        if until is None:
+            return 0.0
+        if current_time >= until:
+            del self.deferred_until[provider_name]
+            return 0.0
+        return until - current_time
+    
+    async def _waits_by_provider(self, exclude: List[str], current_time: float, tokens: int = 0) -> Dict[str, float]:
+        """Exact seconds until each usable provider has a slot (circuit-open providers are left out)"""
+        usage = await self._usage(current_time, max(1, tokens))
+        waits = {}
+        for provider in self.providers:
+            provider_name = provider['name']
+            if provider_name in exclude or not get_circuit_breaker(provider_name).is_available():
+                continue
+            waits[provider_name] = max(usage[provider_name]["wait"], self._deferred_for(provider_name, current_time))
+        return waits
+    
+    async def time_until_available(self, exclude: Optional[List[str]] = None, tokens: int = 0) -> Optional[float]:
+        """Seconds until any provider has a free slot (None if every circuit is open)"""
+        waits = await self._waits_by_provider(exclude or [], time.time(), tokens)
+        return min(waits.values()) if waits else None
+    
+    async def wait_if_needed(self, max_wait: float = 60.0, tokens: int = 0) -> Dict:
+        """
+        Return a provider, waiting for one if none is free now
+        
+        The soonest slot is reserved up front, so the caller sleeps exactly
+        once until it starts instead of polling.
+        """
+        reservation = await self.reserve_provider(max_wait=max_wait, tokens=tokens)
+        if not reservation:
+            return await self._get_fallback_provider(tokens)
+        
+        if reservation.delay > 0:
+            logger.info(f"Waiting {reservation.delay:.1f}s for {reservation.provider['name']}'s next slot")
+            try:
+                await asyncio.sleep(reservation.delay)
+            except asyncio.CancelledError:
+                await reservation.cancel()
+                raise
+        
+        await reservation.commit()
+        logger.info(f"Provider ready: {reservation.provider['name']}")
+        return reservation.provider
     
-    async def _get_fallback_provider(self) -> Dict:
+    async def _get_fallback_provider(self, tokens: int = 0) -> Dict:
         """Get fallback provider"""
-        async with self._lock:
-            current_time = time.time()
-            
-            if not self.providers:
-                raise Exception("No providers available")
-            
-            best_provider = self.providers[0]
-            
-            self.call_history[best_provider['name']].append(current_time)
-            self.total_calls_recorded += 1
-            
-            logger.warning(f"Using fallback provider: {best_provider['name']}")
-            
-            return best_provider
+        if not self.providers:
+            raise Exception("No providers available")
+        
+        best_provider = self.providers[0]
+        
+        await self._reserve_slot(best_provider, time.time(), tokens=tokens, force=True)
+        self._record_commit(best_provider)
+        
+        logger.warning(f"Using fallback provider: {best_provider['name']}")
+        
+        return best_provider
     
     async def get_rate_limit_status(self) -> Dict[str, Dict]:
         """Get current rate limit status for all providers"""
         try:
-            async with self._lock:
-                current_time = time.time()
-                status = {}
+            current_time = time.time()
+            status = {}
+            usage = await self._usage(current_time)
+            resets_in = self.quota_clock.day_bounds(current_time)[2] - current_time
+            
+            for provider in self.providers:
+                provider_name = provider['name']
+                provider_type = provider['provider']
+                rate_limit = self._get_provider_rate_limit(provider)
+                burst = self._get_provider_burst(provider)
+                tokens_per_minute, requests_per_day = self._get_provider_quotas(provider)
                 
-                for provider in self.providers:
-                    provider_name = provider['name']
-                    provider_type = provider['provider']
-                    rate_limit = self._get_provider_rate_limit(provider_type)
-                    
-                    self._clean_old_entries(provider_name, current_time)
-                    current_calls = len(self.call_history[provider_name])
-                    
-                    utilization = (current_calls / rate_limit) * 100 if rate_limit > 0 else 0
-                    available = current_calls < rate_limit
-                    
-                    next_available_in = 0
-                    if not available and self.call_history[provider_name]:
-                        oldest_call = self.call_history[provider_name][0]
-                        next_available_in = max(0, 60 - (current_time - oldest_call))
-                    
-                    status[provider_name] = {
-                        "provider_type": provider_type,
-                        "calls_last_minute": current_calls,
-                        "rate_limit": rate_limit,
-                        "utilization_percentage": round(utilization, 1),
-                        "available": available,
-                        "next_available_in_seconds": round(next_available_in, 1),
-                        "model": provider.get("model", "unknown"),
-                        "capacity_remaining": rate_limit - current_calls
-                    }
+                in_use, free, _ = usage[provider_name]["requests"]
+                utilization = (in_use / burst) * 100
                 
-                return status
+                circuit = get_circuit_breaker(provider_name).get_status()
+                deferred_for = self._deferred_for(provider_name, current_time)
+                next_available_in = usage[provider_name]["wait"]
                 
+                uncapped = rate_limit == UNCAPPED
+                configured = self._get_configured_rate_limit(provider)
+                status[provider_name] = {
+                    "provider_type": provider_type,
+                    "slots_in_use": in_use,
+                    "rate_limit": None if uncapped else round(rate_limit, 2),
+                    "configured_rate_limit": None if configured == UNCAPPED else configured,
+                    "adaptive_limit": get_adaptive_limit(provider_name).get_status() if not uncapped else None,
+                    "burst": None if uncapped else burst,
+                    "utilization_percentage": round(utilization, 1),
+                    "available": next_available_in <= 0 and circuit["state"] != "open" and not deferred_for,
+                    "next_available_in_seconds": round(max(next_available_in, deferred_for), 2),
+                    "model": provider.get("model", "unknown"),
+                    "capacity_remaining": None if uncapped else free,
+                    "tokens_per_minute": self._token_status(usage[provider_name]["tokens"], tokens_per_minute),
+                    "requests_per_day": self._daily_status(usage[provider_name]["today"], requests_per_day, resets_in),
+                    "circuit_breaker": circuit
+                }
+            
+            return status
+        
         except Exception as e:
             logger.error(f"Error in get_rate_limit_status: {e}")
             return {}
     
+    def _token_status(self, token_usage: Optional[Tuple[int, int, float]], tokens_per_minute: int) -> Optional[Dict]:
+        if token_usage is None:
+            return None
+        in_use, free, _ = token_usage
+        return {
+            "limit": tokens_per_minute,
+            "burst": self._get_token_burst(tokens_per_minute),
+            "tokens_in_use": in_use,
+            "tokens_available": free
+        }
+    
+    def _daily_status(self, today: Optional[Tuple[int, int]], requests_per_day: int, resets_in: float) -> Optional[Dict]:
+        if today is None:
+            return None
+        used, allowed = today
+        return {
+            "limit": requests_per_day,
+            "used_today": used,
+            "remaining_today": max(0, requests_per_day - used),
+            "remaining_percentage": round(max(0, requests_per_day - used) / requests_per_day * 100, 1),
+            "paced_allowance": allowed if self.quota_clock.pacing else None,
+            "resets_in_seconds": round(resets_in)
+        }
+    
     async def get_stats_summary(self) -> Dict:
         """Get summary statistics"""
         try:
-            async with self._lock:
-                current_time = time.time()
-                
-                total_active_calls = 0
-                total_capacity = 0
-                provider_utilizations = {}
+            current_time = time.time()
+            usage = await self._usage(current_time)
+            
+            total_active_calls = 0
+            total_capacity = 0
+            capped_in_use = 0
+            capped_burst = 0
+            uncapped_providers = 0
+            daily_limit = 0
+            daily_used = 0
+            provider_utilizations = {}
+            
+            for provider in self.providers:
+                provider_name = provider['name']
+                rate_limit = self._get_provider_rate_limit(provider)
+                burst = self._get_provider_burst(provider)
                 
-                for provider in self.providers:
-                    provider_name = provider['name']
-                    provider_type = provider['provider']
-                    rate_limit = self._get_provider_rate_limit(provider_type)
-                    
-                    self._clean_old_entries(provider_name, current_time)
-                    calls = len(self.call_history[provider_name])
-                    
-                    total_active_calls += calls
+                in_use = usage[provider_name]["requests"][0]
+                total_active_calls += in_use
+                if rate_limit == UNCAPPED:
+                    uncapped_providers += 1
+                else:
                     total_capacity += rate_limit
-                    
-                    utilization = (calls / rate_limit) * 100 if rate_limit > 0 else 0
-                    provider_utilizations[provider_name] = round(utilization, 1)
-                
-                overall_utilization = (total_active_calls / total_capacity) * 100 if total_capacity > 0 else 0
+                    capped_in_use += in_use
+                    capped_burst += burst
                 
-                return {
-                    "total_calls_recorded": self.total_calls_recorded,
-                    "total_active_calls": total_active_calls,
-                    "total_capacity": total_capacity,
-                    "overall_utilization_percentage": round(overall_utilization, 1),
-                    "total_providers": len(self.providers),
-                    "total_keys": len(self.providers),
-                    "provider_utilizations": provider_utilizations,
-                    "round_robin_position": self.round_robin_index % len(self.providers) if self.providers else 0
-                }
+                requests_per_day = self._get_provider_quotas(provider)[1]
+                if requests_per_day:
+                    daily_limit += requests_per_day
+                    daily_used += min(requests_per_day, usage[provider_name]["today"][0])
                 
+                provider_utilizations[provider_name] = round((in_use / burst) * 100, 1)
+            
+            overall_utilization = (capped_in_use / capped_burst) * 100 if capped_burst > 0 else 0
+            
+            return {
+                "total_calls_recorded": self.total_calls_recorded,
+                "total_active_calls": total_active_calls,
+                "total_capacity": total_capacity,
+                "uncapped_providers": uncapped_providers,
+                "overall_utilization_percentage": round(overall_utilization, 1),
+                "total_providers": len(self.providers),
+                "total_keys": len(self.providers),
+                "provider_utilizations": provider_utilizations,
+                "daily_requests": {
+                    "limit": daily_limit,
+                    "used_today": daily_used,
+                    "remaining_today": daily_limit - daily_used,
+                    "pacing": self.quota_clock.pacing
+                },
+                "token_reconciliation": dict(self.token_stats),
+                "shared_state": self.backend.shared,
+                "acquire_queue": {
+                    **self.acquire_stats,
+                    "total_wait_seconds": round(self.acquire_stats["total_wait_seconds"], 2),
+                    "waiting": len(self._acquire_waiters)
+                },
+                "round_robin_position": self.round_robin_index % len(self.providers) if self.providers else 0
+            }
+        
         except Exception as e:
             logger.error(f"Error in get_stats_summary: {e}")
             return {
@@ -333,6 +839,25 @@ class MultiProviderRateLimiter:
                 "round_robin_position": 0
             }
 
+# Limiter owning each provider key, for reconciling token usage reported by the AI clients
+limiters_by_provider: Dict[str, MultiProviderRateLimiter] = {}
+_reconcile_tasks: Set[asyncio.Task] = set()
+
+def reconcile_token_usage(provider_name: str, reserved_tokens: int, actual_tokens: int):
+    """
+    Report the tokens a call actually used to its provider's limiter (no-op for unknown providers)
+    
+    reserved_tokens is what the call's slot reserved (SlotReservation.tokens,
+    0 if it reserved none).
+    """
+    limiter = limiters_by_provider.get(provider_name)
+    if limiter is None:
+        return
+    task = asyncio.ensure_future(limiter.reconcile_tokens(provider_name, reserved_tokens, actual_tokens))
+    _reconcile_tasks.add(task)
+    task.add_done_callback(_reconcile_tasks.discard)
+
+
 # Global instances
 followup_rate_limiter: Optional[MultiProviderRateLimiter] = None
 weekly_report_rate_limiter: Optional[MultiProviderRateLimiter] = None
@@ -347,20 +872,7 @@ def initialize_rate_limiters():
     if not providers_config:
         raise ValueError("No AI providers configured")
     
-    logger.info("Initializing followup rate limiter with TRUE round-robin:")
-    
-    for i, provider in enumerate(providers_config):
-        provider_type = provider.get('provider', 'unknown')
-        if provider_type == 'gemini':
-            capacity = 15
-        elif provider_type == 'groq':
-            capacity = 30
-        elif provider_type == 'huggingface':
-            capacity = 10
-        else:
-            capacity = 12
-        
-        logger.info(f"  {i+1}. {provider.get('name')} ({provider_type}) - {capacity}/min")
+    logger.info(f"Initializing followup rate limiter with TRUE round-robin over {len(providers_config)} keys")
     
     followup_rate_limiter = MultiProviderRateLimiter(
         providers_config=providers_config,
@@ -374,15 +886,17 @@ def initialize_rate_limiters():
         "provider": "gemini",
         "api_key": config.WEEKLY_REPORT_API_KEY,
         "model": "gemini-2.0-flash",
-        "name": "Weekly_Gemini"
+        "name": "Weekly_Gemini",
+        "max_concurrency": config.WEEKLY_REPORT_MAX_CONCURRENCY
     }]
     
     weekly_report_rate_limiter = MultiProviderRateLimiter(
         providers_config=weekly_providers,
-        rate_limit_per_minute=config.RATE_LIMIT_PER_MINUTE
+        rate_limit_per_minute=config.RATE_LIMIT_PER_MINUTE,
+        namespace="weekly"
     )
     
-    logger.info("✅ Rate limiters initialized with round-robin distribution")
+    logger.info(f"✅ Rate limiters initialized with round-robin distribution ({config.RATE_LIMITER_BACKEND} backend)")
 
 def get_followup_rate_limiter() -> MultiProviderRateLimiter:
     if followup_rate_limiter is None:
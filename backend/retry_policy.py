@@ -0,0 +1,141 @@
+import time
+import random
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for one provider type
+    
+    The delay before retry n is a random value in [0, min(max_delay,
+    base_delay * 2^(n-1))]. A Retry-After hint from the provider replaces
+    the computed delay, as long as it is within max_retry_after.
+    """
+    
+    def __init__(
+        self,
+        provider_type: str,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 4.0,
+        max_retry_after: float = 10.0
+    ):
+        self.provider_type = provider_type
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+    
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Delay before the next attempt
+        
+        Args:
+            attempt: Number of the attempt that just failed (1-based)
+            retry_after: Provider's Retry-After hint in seconds, if any
+        
+        Returns:
+            Seconds to wait, or None if the Retry-After hint is too long to honour
+        """
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after
+        
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, backoff)
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "base_delay_seconds": self.base_delay,
+            "max_delay_seconds": self.max_delay,
+            "max_retry_after_seconds": self.max_retry_after
+        }
+
+class RetryBudget:
+    """
+    Global cap on retries so they cannot multiply load during an outage
+    
+    Over a sliding window, retries are allowed up to
+    min_per_second * window + ratio * requests.
+    """
+    
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.1, window_seconds: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        
+        self.requests = deque()
+        self.retries = deque()
+        
+        self.total_requests = 0
+        self.total_retries = 0
+        self.total_denied = 0
+    
+    def _prune(self, current_time: float):
+        cutoff = current_time - self.window_seconds
+        for history in (self.requests, self.retries):
+            while history and history[0] <= cutoff:
+                history.popleft()
+    
+    def record_request(self):
+        """Record a first attempt (not a retry)"""
+        current_time = time.time()
+        self._prune(current_time)
+        self.requests.append(current_time)
+        self.total_requests += 1
+    
+    def can_retry(self) -> bool:
+        """Take a retry from the budget if one is left"""
+        current_time = time.time()
+        self._prune(current_time)
+        
+        allowed = self.min_per_second * self.window_seconds + self.ratio * len(self.requests)
+        if len(self.retries) >= allowed:
+            self.total_denied += 1
+            logger.warning(f"Retry budget exhausted ({len(self.retries)} retries in {self.window_seconds:.0f}s) - not retrying")
+            return False
+        
+        self.retries.append(current_time)
+        self.total_retries += 1
+        return True
+    
+    def get_status(self) -> Dict[str, Any]:
+        self._prune(time.time())
+        return {
+            "ratio": self.ratio,
+            "window_seconds": self.window_seconds,
+            "requests_in_window": len(self.requests),
+            "retries_in_window": len(self.retries),
+            "total_requests": self.total_requests,
+            "total_retries": self.total_retries,
+            "total_denied": self.total_denied
+        }
+
+# Global policies (one per provider type) and the shared retry budget
+retry_policies: Dict[str, RetryPolicy] = {}
+retry_budget: Optional[RetryBudget] = None
+
+def get_retry_policy(provider_type: str) -> RetryPolicy:
+    """Get the retry policy for a provider type, creating it from Config on first use"""
+    policy = retry_policies.get(provider_type)
+    if policy is None:
+        policy = RetryPolicy(provider_type, **Config.get_retry_settings(provider_type))
+        retry_policies[provider_type] = policy
+    return policy
+
+def get_retry_budget() -> RetryBudget:
+    """Get the global retry budget"""
+    global retry_budget
+    if retry_budget is None:
+        retry_budget = RetryBudget(
+            ratio=Config.RETRY_BUDGET_RATIO,
+            min_per_second=Config.RETRY_BUDGET_MIN_PER_SECOND,
+            window_seconds=Config.RETRY_BUDGET_WINDOW_SECONDS
+        )
+    return retry_budget
@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one upstream call
+    
+    The first caller for a key starts the call; callers arriving while it is
+    still in flight await the same result (or exception) instead of starting
+    their own. The upstream call runs as its own task, so one caller being
+    cancelled does not cancel the result for the others.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        
+        self.total_calls = 0
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+    
+    @staticmethod
+    def make_key(content: str) -> str:
+        """Build a key from call content (e.g. a prompt)"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func once per key among concurrent callers and share its result"""
+        self.total_calls += 1
+        
+        task = self._in_flight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._on_done(key, finished))
+        else:
+            self.coalesced_calls += 1
+            logger.info(f"{self.name}: coalesced identical in-flight call ({key[:12]})")
+        
+        return await asyncio.shield(task)
+    
+    def _on_done(self, key: str, task: asyncio.Future):
+        """Forget a finished call so later callers start a fresh one"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        
+        # Mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing statistics"""
+        return {
+            "total_calls": self.total_calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": len(self._in_flight),
+            "coalesced_percentage": round(self.coalesced_calls / self.total_calls * 100, 1) if self.total_calls else 0.0
+        }
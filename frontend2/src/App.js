@@ -3,12 +3,59 @@ import React, { useState, useEffect } from 'react';
 const API_BASE_URL = 'http://127.0.0.1:8000/api';
 
 // Modal Component for Follow-up Questions
-const FollowupModal = ({ isOpen, onClose, onComplete, questions, sessionId, userId }) => {
+const FollowupModal = ({ isOpen, onClose, onComplete, questions: initialQuestions, questionsUpgradable, sessionId, userId }) => {
   const [answers, setAnswers] = useState(['', '', '']);
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
   const [isSubmitting, setIsSubmitting] = useState(false);
+  const [questions, setQuestions] = useState(initialQuestions);
+  const [upgradable, setUpgradable] = useState(questionsUpgradable);
+
+  useEffect(() => {
+    setQuestions(initialQuestions);
+    setUpgradable(questionsUpgradable);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [sessionId]);
+
+  // Late AI questions may replace the default ones until the intern starts answering
+  useEffect(() => {
+    if (!isOpen || !upgradable || !sessionId) return undefined;
+
+    const interval = setInterval(async () => {
+      try {
+        const response = await fetch(
+          `${API_BASE_URL}/followup/${sessionId}/questions?user_id=${encodeURIComponent(userId)}`
+        );
+        const data = await response.json();
+        if (data.success) {
+          setQuestions(data.questions);
+          setUpgradable(data.questionsUpgradable);
+        }
+      } catch (error) {
+        console.error('Error refreshing follow-up questions:', error);
+      }
+    }, 2000);
+
+    return () => clearInterval(interval);
+  }, [isOpen, upgradable, sessionId, userId]);
+
+  const lockQuestions = () => {
+    setUpgradable(false);
+    fetch(`${API_BASE_URL}/followup/${sessionId}/questions/lock`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        user_id: userId,
+        questions: questions
+      }),
+    }).catch(error => console.error('Error locking follow-up questions:', error));
+  };
 
   const handleAnswerChange = (value) => {
+    if (upgradable) {
+      lockQuestions();
+    }
     const newAnswers = [...answers];
     newAnswers[currentQuestionIndex] = value;
     setAnswers(newAnswers);
@@ -42,7 +89,8 @@ const FollowupModal = ({ isOpen, onClose, onComplete, questions, sessionId, user
         },
         body: JSON.stringify({
           user_id: userId,
-          answers: answers
+          answers: answers,
+          questions: questions
         }),
       });
 
@@ -1368,6 +1416,7 @@ const App = () => {
           onClose={() => setShowFollowup(false)}
           onComplete={handleFollowupComplete}
           questions={followupData?.questions || []}
+          questionsUpgradable={followupData?.questionsUpgradable || false}
           sessionId={followupData?.sessionId}
           userId={formData.user_id}
         />